@@ -0,0 +1,94 @@
+"""Check the preset format ranking against a corpus of format lists.
+
+Every file in corpus/formats/ holds the info dict of one video as yt-dlp
+extracts it (``extract_info(process=False)``, the same thing the engine
+ranks), a description and the formats each preset is expected to pick.
+For every preset this prints what the old static format string selects,
+what the ranking selects, and whether either means an audio transcode:
+
+    python benchmarks/format_ranking.py
+    python benchmarks/format_ranking.py -v
+    python benchmarks/format_ranking.py corpus/formats/vimeo_progressive.json
+
+yt-dlp resolves both format strings against the corpus offline, so the
+script needs yt-dlp but no network.  The exit status is 1 when a pick
+differs from the expected one; ``-v`` also prints the reasons.
+"""
+import argparse
+import copy
+import glob
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from downloader import ranking  # noqa: E402
+from downloader.engine import QUALITY_OPTIONS, RANKED_PRESETS  # noqa: E402
+from downloader.probe import is_mp4_audio  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus', 'formats')
+
+
+def select(info, format_spec):
+    """Format ids yt-dlp selects for ``format_spec``, and the audio codecs"""
+    import yt_dlp
+
+    with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'format': format_spec,
+                           'merge_output_format': 'mp4'}) as ydl:
+        selected = ydl.process_ie_result(copy.deepcopy(info), download=False)
+    formats = selected.get('requested_formats') or [selected]
+    return selected['format_id'], [ranking.codec(fmt, 'acodec') for fmt in formats]
+
+
+def audio_note(codecs):
+    if all(codec and is_mp4_audio(codec) for codec in codecs):
+        return 'copy'
+    if any(codec and not is_mp4_audio(codec) for codec in codecs):
+        return 'AAC transcode'
+    return 'probed'
+
+
+def check(path, verbose):
+    """Print the picks for one corpus file and return the number of mismatches"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    info = {key: value for key, value in data.items() if key not in ('description', 'expected')}
+    expected = data.get('expected', {})
+    print(f"{os.path.basename(path)}: {data.get('description', '')}")
+
+    failures = 0
+    for preset, limit in RANKED_PRESETS.items():
+        before, before_codecs = select(info, QUALITY_OPTIONS[preset])
+        choice = ranking.rank(info['formats'], limit)
+        if choice is None:
+            after, after_codecs = before, before_codecs
+        else:
+            after, after_codecs = select(info, f"{choice.spec}/{QUALITY_OPTIONS[preset]}")
+        mark = ''
+        if preset in expected and after != expected[preset]:
+            mark = f"  MISMATCH, expected {expected[preset]}"
+            failures += 1
+        print(f"  {preset:<21}{before} ({audio_note(before_codecs)}) -> {after} ({audio_note(after_codecs)}){mark}")
+        if verbose:
+            for reason in choice.reasons if choice else ["format list says too little, preset string used"]:
+                print(f"      {reason}")
+    print()
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the preset format ranking against recorded format lists.")
+    parser.add_argument('files', nargs='*', help=f"corpus files (default: all in {CORPUS})")
+    parser.add_argument('-v', '--verbose', action='store_true', help="print the reasons for every pick")
+    args = parser.parse_args(argv)
+
+    files = args.files or sorted(glob.glob(os.path.join(CORPUS, '*.json')))
+    failures = sum(check(path, args.verbose) for path in files)
+    print(f"{len(files)} format lists, {failures} mismatch(es)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""Synthetic test media and a local HTTP server that stands in for a video host.
+
+``generate_media`` renders a test pattern with a tone using ffmpeg and
+packages it three ways, the way real sites serve video:
+
+* ``progressive.mp4``: one file with its index at the front, fetched with
+  plain and ranged GETs,
+* ``hls/index.m3u8``: an HLS playlist of 4 second segments,
+* ``dash/manifest.mpd``: DASH with separate video and audio streams.
+
+``MediaServer`` serves that folder on localhost with byte-range support and
+can make the network worse on purpose: a fixed latency before every
+response, a bandwidth cap shared by all connections like a real link, and
+a share of requests answered with 503.  Manifests are never failed, since
+no client can do anything useful without them.  Random choices come from
+a seeded generator, so a run can be repeated.
+
+    python benchmarks/mediaserver.py --latency 50 --bandwidth 2M
+"""
+import argparse
+import http.server
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from downloader import cutting, toolchain  # noqa: E402
+from downloader.bandwidth import parse_rate  # noqa: E402
+
+PROGRESSIVE = 'progressive.mp4'
+HLS = 'hls/index.m3u8'
+DASH = 'dash/manifest.mpd'
+SEGMENT_SECONDS = 4
+GOP_SECONDS = 2
+FRAME_RATE = 30
+
+DEFAULT_FOLDER = os.path.join(tempfile.gettempdir(), 'video_downloader_benchmark_media')
+
+CONTENT_TYPES = {
+    '.mp4': 'video/mp4',
+    '.m4s': 'video/iso.segment',
+    '.ts': 'video/mp2t',
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.mpd': 'application/dash+xml',
+}
+MANIFEST_EXTENSIONS = ('.m3u8', '.mpd')
+# Bytes written per bandwidth check
+CHUNK_SIZE = 16 * 1024
+
+
+def _run(cmd):
+    result = subprocess.run(cmd, capture_output=True, text=True, errors='replace')
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd[:3])}... failed:\n{result.stderr[-2000:]}")
+
+
+def generate_media(folder, duration=120, size='1280x720', hls_segments='mpegts'):
+    """Render and package the test video into ``folder`` (skipped when the
+    folder already holds media made with the same settings)"""
+    settings = {'duration': duration, 'size': size, 'hls_segments': hls_segments}
+    stamp_path = os.path.join(folder, 'media.json')
+    if os.path.exists(stamp_path):
+        with open(stamp_path, encoding='utf-8') as f:
+            if json.load(f) == settings:
+                return
+    tools = toolchain.get()
+    if not tools.ffmpeg:
+        raise RuntimeError("ffmpeg not found")
+    ffmpeg = tools.ffmpeg
+    os.makedirs(os.path.join(folder, 'hls'), exist_ok=True)
+    os.makedirs(os.path.join(folder, 'dash'), exist_ok=True)
+
+    source = os.path.join(folder, PROGRESSIVE)
+    encoder = cutting.reencoder(tools)
+    _run([ffmpeg, '-y',
+          '-f', 'lavfi', '-i', f"testsrc2=size={size}:rate={FRAME_RATE}",
+          '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=48000',
+          '-t', str(duration),
+          '-c:v', encoder] + cutting.encoder_quality(encoder) + [
+          '-g', str(GOP_SECONDS * FRAME_RATE), '-pix_fmt', 'yuv420p',
+          '-c:a', 'aac', '-b:a', '128k',
+          '-movflags', '+faststart', source])
+
+    extension = 'ts' if hls_segments == 'mpegts' else 'm4s'
+    _run([ffmpeg, '-y', '-i', source, '-c', 'copy',
+          '-f', 'hls', '-hls_time', str(SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+          '-hls_segment_type', hls_segments,
+          '-hls_segment_filename', os.path.join(folder, 'hls', f"segment_%03d.{extension}"),
+          os.path.join(folder, HLS)])
+    _run([ffmpeg, '-y', '-i', source, '-map', '0:v', '-map', '0:a', '-c', 'copy',
+          '-f', 'dash', '-seg_duration', str(SEGMENT_SECONDS),
+          '-use_template', '1', '-use_timeline', '1',
+          '-adaptation_sets', 'id=0,streams=v id=1,streams=a',
+          os.path.join(folder, DASH)])
+
+    with open(stamp_path, 'w', encoding='utf-8') as f:
+        json.dump(settings, f)
+
+
+class Link:
+    """A bandwidth cap shared by every connection, like a real access link"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._free_at = time.monotonic()
+
+    def send(self, size):
+        """Sleep until ``size`` more bytes fit through the link"""
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._free_at = max(self._free_at, now) + size / self.rate
+            delay = self._free_at - now
+        time.sleep(delay)
+
+
+class MediaHandler(http.server.SimpleHTTPRequestHandler):
+    server_version = 'MediaServer'
+    extensions_map = dict(http.server.SimpleHTTPRequestHandler.extensions_map, **CONTENT_TYPES)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def _respond(self, send_body):
+        server = self.server
+        server.count('requests')
+        if server.latency:
+            time.sleep(server.latency)
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        if not path.endswith(MANIFEST_EXTENSIONS) and server.should_fail():
+            server.count('errors')
+            self.send_error(503, "Injected error")
+            return
+
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', self.headers.get('Range', '').strip())
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if not send_body:
+            return
+
+        remaining = end - start + 1
+        with open(path, 'rb') as f:
+            f.seek(start)
+            try:
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    server.link.send(len(chunk))
+                    self.wfile.write(chunk)
+                    server.count('bytes', len(chunk))
+                    remaining -= len(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                # Clients close early all the time (probing, seeking)
+                pass
+
+
+class MediaServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, folder, latency=0.0, bandwidth=None, error_rate=0.0, seed=0, port=0):
+        self.folder = folder
+        self.latency = latency
+        self.link = Link(bandwidth)
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {}
+        self.reset_stats()
+        super().__init__(('127.0.0.1', port),
+                         lambda *args: MediaHandler(*args, directory=folder))
+
+    def url(self, name):
+        return f"http://127.0.0.1:{self.server_address[1]}/{name}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {'requests': 0, 'errors': 0, 'bytes': 0}
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def should_fail(self):
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve synthetic test media on localhost.")
+    parser.add_argument('--folder', default=DEFAULT_FOLDER,
+                        help="where the media is generated and served from (kept between runs)")
+    parser.add_argument('--duration', type=int, default=120, help="video length in seconds (default: 120)")
+    parser.add_argument('--hls-segments', choices=('mpegts', 'fmp4'), default='mpegts')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0, metavar='MS', help="delay before every response")
+    parser.add_argument('--bandwidth', metavar='RATE', help='link capacity, e.g. "2M" bytes per second')
+    parser.add_argument('--error-rate', type=float, default=0, help="share of media requests answered with 503")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    generate_media(args.folder, args.duration, hls_segments=args.hls_segments)
+    server = MediaServer(args.folder, args.latency / 1000, parse_rate(args.bandwidth), args.error_rate,
+                         args.seed, args.port)
+    for name in (PROGRESSIVE, HLS, DASH):
+        print(server.url(name))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""Offline download and clip benchmark.
+
+Runs the engine's real code paths against synthetic media served from
+localhost (see mediaserver.py), so the numbers do not depend on YouTube,
+Google Drive or the network and can be compared between versions:
+
+* ``download-*``: full download of the progressive, HLS and DASH versions,
+* ``clip-*``: a URL clip from each of them in the default cut mode for
+  URLs (ranged reads for the progressive file, only the covering fragments
+  for the others),
+* ``local-*``: a local clip in every cut mode, and a convert.
+
+URL scenarios use the default quality preset, so the format ranking runs
+too.  The engine is set up like the CLI's, with a fragment cache, and every
+run gets a fresh data folder, so caches and keyframe indexes start cold.
+Results (wall time, what the server sent, the job's own metrics) are
+written as JSON; ``--compare`` prints the change against an earlier file.
+
+    python benchmarks/offline.py
+    python benchmarks/offline.py --latency 80 --bandwidth 4M --error-rate 0.02
+    python benchmarks/offline.py --scenario clip-progressive --scenario local-smart --runs 5
+    python benchmarks/offline.py --compare offline-abc1234.json --max-slowdown 10
+
+With ``--max-slowdown`` the exit status is 1 when a scenario's median got
+more than that many percent slower than in the compared file.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# mediaserver puts this checkout on sys.path, so import it first
+from mediaserver import DASH, DEFAULT_FOLDER, HLS, PROGRESSIVE, ROOT, MediaServer, generate_media
+
+from downloader import cutting
+from downloader.bandwidth import parse_rate
+from downloader.engine import DEFAULT_QUALITY, DownloadError, Engine, Job
+from downloader.fragcache import FragmentCache
+from downloader.fragcache import default_folder as default_fragment_folder
+
+# name -> (job kind, served file or None for the local file, cut mode)
+SCENARIOS = {
+    'download-progressive': (Job.DOWNLOAD, PROGRESSIVE, None),
+    'download-hls': (Job.DOWNLOAD, HLS, None),
+    'download-dash': (Job.DOWNLOAD, DASH, None),
+    'clip-progressive': (Job.CLIP, PROGRESSIVE, cutting.URL_DEFAULT),
+    'clip-hls': (Job.CLIP, HLS, cutting.URL_DEFAULT),
+    'clip-dash': (Job.CLIP, DASH, cutting.URL_DEFAULT),
+    'local-copy': (Job.LOCAL_CLIP, None, cutting.COPY),
+    'local-fast': (Job.LOCAL_CLIP, None, cutting.FAST),
+    'local-smart': (Job.LOCAL_CLIP, None, cutting.SMART),
+    'local-convert': (Job.CONVERT, None, None),
+}
+
+# Job metrics kept in the results
+METRIC_FIELDS = ('stages', 'bytes', 'retries', 'ffmpeg_runs', 'ffmpeg_wall_seconds', 'ffmpeg_cpu_seconds')
+
+
+def make_job(name, server, media_folder, save_path, args):
+    kind, served, cut_mode = SCENARIOS[name]
+    source = server.url(served) if served else os.path.join(media_folder, PROGRESSIVE)
+    if kind == Job.DOWNLOAD:
+        return Job(kind, source, save_path, args.quality)
+    if kind == Job.CONVERT:
+        return Job(kind, source, save_path)
+    return Job(kind, source, save_path, args.quality, args.clip[0], args.clip[1], cut_mode=cut_mode)
+
+
+def run_once(name, server, media_folder, args):
+    """Run one scenario with a cold data folder and return its result dict"""
+    home = tempfile.mkdtemp(prefix='offline_benchmark_home_')
+    os.environ['VIDEO_DOWNLOADER_HOME'] = home
+    save_path = os.path.join(home, 'output')
+    os.makedirs(save_path)
+    job = make_job(name, server, media_folder, save_path, args)
+    fragment_cache = FragmentCache(default_fragment_folder())
+    engine = Engine(use_info_cache=False, fragment_cache=fragment_cache)
+    server.reset_stats()
+    started = time.monotonic()
+    error = None
+    try:
+        engine.run(job)
+    except DownloadError as e:
+        error = str(e)[-500:]
+    finally:
+        engine.close()
+        fragment_cache.close()
+    seconds = time.monotonic() - started
+
+    metrics = job.metrics.to_dict()
+    result = {
+        'status': Job.FAILED if error else Job.DONE,
+        'error': error,
+        'seconds': round(seconds, 3),
+        'output_bytes': sum(os.path.getsize(path) for path in job.outputs if os.path.exists(path)),
+        'server': dict(server.stats),
+    }
+    result.update({field: metrics[field] for field in METRIC_FIELDS})
+    shutil.rmtree(home, ignore_errors=True)
+    return result
+
+
+def summarize(runs):
+    times = [run['seconds'] for run in runs if run['status'] == Job.DONE]
+    summary = {'runs': runs, 'failures': len(runs) - len(times)}
+    if times:
+        summary.update(min=min(times), median=round(statistics.median(times), 3), max=max(times))
+    return summary
+
+
+def version_label():
+    try:
+        result = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT,
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return 'unknown'
+    return result.stdout.strip() or 'unknown'
+
+
+def compare(old, new, max_slowdown):
+    """Print old vs new medians; return 1 if a scenario slowed down more than allowed"""
+    print(f"\nCompared with {old.get('label', '?')}:")
+    print(f"{'scenario':<22}{'before':>9}{'after':>9}{'change':>9}")
+    status = 0
+    for name, summary in new['scenarios'].items():
+        before = old.get('scenarios', {}).get(name, {}).get('median')
+        after = summary.get('median')
+        if before is None or after is None:
+            print(f"{name:<22}{'-' if before is None else f'{before:.3f}s':>9}"
+                  f"{'-' if after is None else f'{after:.3f}s':>9}")
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{name:<22}{before:>8.3f}s{after:>8.3f}s{change:>+8.1f}%")
+        if max_slowdown is not None and change > max_slowdown:
+            print(f"  {name} is {change:.1f}% slower, over the {max_slowdown:.1f}% limit")
+            status = 1
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark downloads and clips against a local media server.")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="scenario to run, may be repeated (default: all)")
+    parser.add_argument('--runs', type=int, default=3, help="runs per scenario (default: 3)")
+    parser.add_argument('--duration', type=int, default=120, help="test video length in seconds (default: 120)")
+    parser.add_argument('--clip', type=float, nargs=2, default=(30.0, 50.0), metavar=('START', 'END'),
+                        help="clip range in seconds (default: 30 50)")
+    parser.add_argument('--quality', default=DEFAULT_QUALITY,
+                        help=f'quality preset or raw yt-dlp format for URL scenarios (default: "{DEFAULT_QUALITY}")')
+    parser.add_argument('--hls-segments', choices=('mpegts', 'fmp4'), default='mpegts')
+    parser.add_argument('--media', default=DEFAULT_FOLDER, help="folder for the generated media (kept between runs)")
+    parser.add_argument('--latency', type=float, default=0, metavar='MS', help="server delay before every response")
+    parser.add_argument('--bandwidth', metavar='RATE', help='server link capacity, e.g. "4M" bytes per second')
+    parser.add_argument('--error-rate', type=float, default=0, help="share of media requests answered with 503")
+    parser.add_argument('--seed', type=int, default=0, help="seed for error injection (default: 0)")
+    parser.add_argument('--label', help="name of this version in the results (default: git describe)")
+    parser.add_argument('--output', metavar='FILE', help="results file (default: offline-<label>.json)")
+    parser.add_argument('--compare', metavar='FILE', help="earlier results file to compare against")
+    parser.add_argument('--max-slowdown', type=float, metavar='PERCENT',
+                        help="with --compare, fail if a median got slower by more than this")
+    args = parser.parse_args(argv)
+
+    label = args.label or version_label()
+    print(f"Generating test media in {args.media}...")
+    generate_media(args.media, args.duration, hls_segments=args.hls_segments)
+    server = MediaServer(args.media, args.latency / 1000, parse_rate(args.bandwidth), args.error_rate,
+                         args.seed).start()
+
+    results = {
+        'label': label,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'settings': {name: getattr(args, name) for name in
+                     ('runs', 'duration', 'clip', 'quality', 'hls_segments', 'latency', 'bandwidth',
+                      'error_rate', 'seed')},
+        'scenarios': {},
+    }
+    try:
+        for name in args.scenario or SCENARIOS:
+            runs = []
+            for run in range(1, args.runs + 1):
+                result = run_once(name, server, args.media, args)
+                runs.append(result)
+                detail = (f"{result['seconds']:.3f}s, {result['server']['bytes'] / 1e6:.1f} MB served, "
+                          f"{result['server']['requests']} requests")
+                if result['error']:
+                    detail = f"failed: {result['error'].splitlines()[-1]}"
+                print(f"{name} run {run}: {detail}")
+            results['scenarios'][name] = summarize(runs)
+    finally:
+        server.shutdown()
+
+    print()
+    print(f"{'scenario':<22}{'min':>9}{'median':>9}{'max':>9}{'failed':>8}")
+    for name, summary in results['scenarios'].items():
+        if 'median' in summary:
+            print(f"{name:<22}{summary['min']:>8.3f}s{summary['median']:>8.3f}s{summary['max']:>8.3f}s"
+                  f"{summary['failures']:>8}")
+        else:
+            print(f"{name:<22}{'-':>9}{'-':>9}{'-':>9}{summary['failures']:>8}")
+
+    output = args.output or f"offline-{label}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            return compare(json.load(f), results, args.max_slowdown)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""Startup benchmark for the desktop app.
+
+Starts the app several times and reports how long it takes until
+
+* ``first_window``: the main window has been drawn, and
+* ``first_download``: a download started right then has finished (this
+  includes loading yt-dlp, which the app imports on first use).
+
+Times are measured from the moment the process is spawned, so they include
+interpreter start-up and, for a frozen build, unpacking.  Every run gets a
+fresh data folder.  By default the download is a small file served from a
+local HTTP server, so the numbers do not depend on the network.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --app dist/VideoDownloader/VideoDownloader.exe --runs 10
+    python benchmarks/startup.py --max-first-window 1.5 --max-first-download 4
+
+With ``--max-*`` limits the exit status is 1 when a median is over its
+limit, so the script can guard against regressions.
+"""
+import argparse
+import functools
+import http.server
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MILESTONES = ('first_window', 'first_download')
+BENCHMARK_ENV = 'VIDEO_DOWNLOADER_BENCHMARK'
+BENCHMARK_URL_ENV = 'VIDEO_DOWNLOADER_BENCHMARK_URL'
+DOWNLOAD_SIZE = 4 * 1024 * 1024
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_file(size):
+    """Serve a file of ``size`` bytes on localhost; returns (url, server)"""
+    folder = tempfile.mkdtemp(prefix='startup_benchmark_serve_')
+    with open(os.path.join(folder, 'sample.mp4'), 'wb') as f:
+        f.write(os.urandom(size))
+    handler = functools.partial(_QuietHandler, directory=folder)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/sample.mp4", server
+
+
+def run_once(command, url, timeout):
+    """Launch the app once and return {milestone: seconds since spawn}"""
+    home = tempfile.mkdtemp(prefix='startup_benchmark_home_')
+    report_path = os.path.join(home, 'startup.txt')
+    env = dict(os.environ, VIDEO_DOWNLOADER_HOME=home)
+    env[BENCHMARK_ENV] = report_path
+    if url:
+        env[BENCHMARK_URL_ENV] = url
+
+    started = time.time()
+    process = subprocess.Popen(command, env=env, cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        _, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        raise RuntimeError(f"the app did not quit within {timeout}s")
+    if process.returncode != 0:
+        raise RuntimeError(f"the app exited with {process.returncode}:\n{stderr}")
+
+    results = {}
+    if os.path.exists(report_path):
+        with open(report_path, encoding='utf-8') as f:
+            for line in f:
+                name, stamp = line.split()
+                results[name] = float(stamp) - started
+    if 'download_failed' in results:
+        raise RuntimeError(f"the benchmark download failed:\n{stderr}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure time to first window and first download.")
+    parser.add_argument('--app', metavar='COMMAND',
+                        help="command line that starts the app (default: this checkout's video_downloader.py)")
+    parser.add_argument('--runs', type=int, default=5, help="number of launches (default: 5)")
+    parser.add_argument('--url', help="video to download instead of the local test file")
+    parser.add_argument('--no-download', action='store_true', help="only measure the first window")
+    parser.add_argument('--timeout', type=float, default=120, help="seconds per launch (default: 120)")
+    parser.add_argument('--max-first-window', type=float, metavar='SECONDS',
+                        help="fail if the median time to first window is higher")
+    parser.add_argument('--max-first-download', type=float, metavar='SECONDS',
+                        help="fail if the median time to first download is higher")
+    args = parser.parse_args(argv)
+
+    if args.app:
+        command = shlex.split(args.app, posix=os.name != 'nt')
+    else:
+        command = [sys.executable, os.path.join(ROOT, 'video_downloader.py')]
+    server = None
+    url = None
+    if not args.no_download:
+        url = args.url
+        if not url:
+            url, server = serve_file(DOWNLOAD_SIZE)
+
+    samples = {name: [] for name in MILESTONES}
+    try:
+        for run in range(1, args.runs + 1):
+            results = run_once(command, url, args.timeout)
+            print(f"run {run}: " + "  ".join(f"{name} {results[name]:.3f}s"
+                                             for name in MILESTONES if name in results))
+            for name in MILESTONES:
+                if name in results:
+                    samples[name].append(results[name])
+    except RuntimeError as e:
+        print(f"Benchmark failed: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print()
+    print(f"{'milestone':<16}{'min':>9}{'median':>9}{'max':>9}")
+    limits = {'first_window': args.max_first_window, 'first_download': args.max_first_download}
+    status = 0
+    for name in MILESTONES:
+        values = samples[name]
+        if not values:
+            continue
+        median = statistics.median(values)
+        print(f"{name:<16}{min(values):>8.3f}s{median:>8.3f}s{max(values):>8.3f}s")
+        if limits[name] is not None and median > limits[name]:
+            print(f"  {name} median {median:.3f}s is over the {limits[name]:.3f}s limit")
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,12 +3,18 @@ import PyInstaller.__main__
 PyInstaller.__main__.run([
     'video_downloader.py',
     '--name=VideoDownloader',
-    '--onefile',
+    # A folder instead of a single exe: a --onefile build unpacks itself to
+    # a temp folder on every launch, which dominated startup time.  The
+    # installer ships the whole dist/VideoDownloader folder.
+    '--onedir',
+    '--noconfirm',
     '--windowed',
     '--add-data=logo.png;.',
     '--hidden-import=ssl',
     '--hidden-import=_ssl',
     '--hidden-import=yt_dlp',
+    # yt-dlp's keep-alive HTTP handler, which it only loads if present
+    '--hidden-import=requests',
     '--hidden-import=tkinterdnd2',
     '--hidden-import=PIL',
 ])
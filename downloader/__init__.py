@@ -0,0 +1,7 @@
+"""Download and clip engine used by the Video Downloader GUI and CLI.
+
+Nothing in this package imports tkinter, so it can run on headless machines.
+"""
+from .engine import QUALITY_OPTIONS, DownloadError, Engine, Job
+
+__all__ = ['QUALITY_OPTIONS', 'DownloadError', 'Engine', 'Job']
@@ -0,0 +1,221 @@
+"""Download archive with content-addressed dedupe.
+
+Finished outputs are indexed by what produced them: extractor, video id,
+selected format and clip ranges for downloads; a content fingerprint of the
+source file, ranges and cut settings for local clips.  A later job with the
+same key gets a hardlink (or reflink, or as a last resort a copy) of the
+existing file instead of downloading or cutting it again.
+
+Every output also has its SHA-256 recorded, so byte-identical files that
+were produced by different jobs end up sharing storage too.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+from .engine import unique_path
+from .paths import data_dir, file_key
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outputs (
+    key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (key, position)
+);
+CREATE INDEX IF NOT EXISTS outputs_sha256 ON outputs (sha256);
+'''
+
+CHUNK_SIZE = 1024 * 1024
+FINGERPRINT_BYTES = 4 * 1024 * 1024
+
+# Linux FICLONE ioctl: share extents on btrfs/xfs without copying data
+FICLONE = 0x40049409
+
+
+def default_path():
+    return os.path.join(data_dir(), 'archive.sqlite3')
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reflink(src, dst):
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl
+    try:
+        with open(src, 'rb') as source, open(dst, 'wb') as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        return True
+    except OSError:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        return False
+
+
+def link_or_copy(src, dst):
+    """Make ``dst`` share ``src``'s data: hardlink, else reflink, else copy"""
+    try:
+        os.link(src, dst)
+        return 'hardlink'
+    except OSError:
+        pass
+    if reflink(src, dst):
+        return 'reflink'
+    shutil.copy2(src, dst)
+    return 'copy'
+
+
+def ranges_key(ranges, chapters):
+    if chapters:
+        return 'chapters'
+    if not ranges:
+        return 'full'
+    return json.dumps([[float(start), float(end)] for start, end in ranges])
+
+
+class Archive:
+    def __init__(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._fingerprints = {}
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+
+    # Keys
+
+    @staticmethod
+    def download_key(info, job):
+        """Key for a processed yt-dlp info dict, or None if it can't be identified"""
+        if not info or not info.get('id') or not info.get('format_id'):
+            return None
+        extractor = info.get('extractor_key') or info.get('extractor') or 'generic'
+        key = f"url|{extractor}:{info['id']}|{info['format_id']}|{ranges_key(job.ranges, job.chapters)}"
+        if job.ranges or job.chapters:
+            # A fast clip starts on the keyframe before the range, a smart
+            # one on the exact frame: not interchangeable
+            key += f"|{job.cut_mode}"
+        return key
+
+    def local_key(self, file_path, job, audio_args):
+        return (f"local|{self.fingerprint(file_path)}|{ranges_key(job.ranges, job.chapters)}"
+                f"|{job.cut_mode}|{' '.join(audio_args)}")
+
+    def fingerprint(self, file_path):
+        """Cheap content identity of a large local file: size plus a hash of
+        its first and last few MB (cached per path, size and mtime)"""
+        identity = file_key(file_path)
+        with self._lock:
+            if identity in self._fingerprints:
+                return self._fingerprints[identity]
+        size = os.path.getsize(file_path)
+        digest = hashlib.sha256(str(size).encode('ascii'))
+        with open(file_path, 'rb') as f:
+            digest.update(f.read(FINGERPRINT_BYTES))
+            if size > FINGERPRINT_BYTES:
+                f.seek(max(FINGERPRINT_BYTES, size - FINGERPRINT_BYTES))
+                digest.update(f.read(FINGERPRINT_BYTES))
+        value = digest.hexdigest()
+        with self._lock:
+            self._fingerprints[identity] = value
+        return value
+
+    # Lookup and storage
+
+    def _valid_outputs(self, key):
+        with self._lock:
+            rows = self._db.execute('SELECT path, size FROM outputs WHERE key = ? ORDER BY position',
+                                    (key,)).fetchall()
+        if not rows:
+            return None
+        for path, size in rows:
+            try:
+                if os.path.getsize(path) != size:
+                    raise OSError
+            except OSError:
+                # Moved, deleted or modified since it was archived
+                self.forget(key)
+                return None
+        return [path for path, _ in rows]
+
+    def reuse(self, key, save_path):
+        """Materialize archived outputs for ``key`` in ``save_path``.
+
+        Returns the output paths, or None when there is nothing to reuse.
+        """
+        existing = self._valid_outputs(key)
+        if not existing:
+            return None
+
+        outputs = []
+        for path in existing:
+            if os.path.normcase(os.path.dirname(os.path.abspath(path))) == \
+                    os.path.normcase(os.path.abspath(save_path)):
+                outputs.append(path)
+                continue
+            stem, ext = os.path.splitext(os.path.basename(path))
+            target = unique_path(save_path, stem, ext, outputs)
+            link_or_copy(path, target)
+            outputs.append(target)
+        return outputs
+
+    def add(self, key, outputs):
+        """Archive freshly produced ``outputs`` under ``key``.
+
+        Files whose content already exists elsewhere in the archive are
+        replaced by a hardlink to the existing copy.
+        """
+        now = time.time()
+        for position, path in enumerate(outputs):
+            if not os.path.isfile(path):
+                continue
+            digest = sha256_file(path)
+            self._share_identical(path, digest)
+            with self._lock:
+                self._db.execute('INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?)',
+                                 (key, position, os.path.abspath(path), os.path.getsize(path),
+                                  digest, now))
+
+    def _share_identical(self, path, digest):
+        with self._lock:
+            rows = self._db.execute('SELECT path, size FROM outputs WHERE sha256 = ?', (digest,)).fetchall()
+        for other, size in rows:
+            if os.path.abspath(other) == os.path.abspath(path):
+                continue
+            try:
+                if os.path.getsize(other) != size or os.path.samefile(other, path):
+                    continue
+                tmp_path = f"{path}.dedupe.tmp"
+                os.link(other, tmp_path)
+                os.replace(tmp_path, path)
+                return
+            except OSError:
+                # Different volume or no hardlink support: keep the copy
+                continue
+
+    def forget(self, key):
+        with self._lock:
+            self._db.execute('DELETE FROM outputs WHERE key = ?', (key,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,197 @@
+"""Global bandwidth scheduler for running downloads.
+
+yt-dlp calls the progress hook after every block it reads, from whichever
+thread read it.  The engine hands the new bytes to ``JobThrottle.consume``,
+which sleeps once the job is ahead of its rate; the sleeping reader stops
+pulling from the socket, so TCP slows the sender down.
+
+Rates are handed out by weighted max-min fairness: every job gets a share
+of the total cap proportional to the weight of its priority class, jobs
+that use less than their share (server-limited, or capped) give the rest to
+the others.  The total cap and per-job caps can be changed at any time and
+running jobs pick them up within one rebalance interval.
+"""
+import re
+import threading
+import time
+
+# Job.priority -> weight.  Interactive clip jobs (priority 1) get four times
+# the bandwidth of background full downloads while both are running.
+PRIORITY_WEIGHT_BASE = 4
+
+# How often shares are recomputed from measured demand
+REBALANCE_INTERVAL = 1.0
+# A demand-limited job may grow by this factor per interval
+DEMAND_HEADROOM = 1.5
+# Burst allowance, in seconds of the job's rate
+BURST = 0.5
+# Sleep in slices so rate changes apply to jobs that are already waiting
+MAX_SLEEP = 0.25
+
+UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_rate(text):
+    """Parse "500K", "2.5M" or "1000000" (bytes per second); empty or 0 means no limit"""
+    if text is None:
+        return None
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b)?(?:/s)?\s*', str(text), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid rate: {text!r}")
+    rate = float(match.group(1)) * UNITS[match.group(2).lower()]
+    return rate or None
+
+
+def weight_for(priority):
+    return PRIORITY_WEIGHT_BASE ** max(0, min(priority, 3))
+
+
+class JobThrottle:
+    def __init__(self, scheduler, job, cap):
+        self.scheduler = scheduler
+        self.job = job
+        self.cap = cap
+        self.weight = weight_for(job.priority)
+        self.rate = None
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self._window_bytes = 0
+        self._demand = None
+        self._file_bytes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, filename, downloaded_bytes):
+        """Feed yt-dlp's per-file byte counter from a progress hook"""
+        if downloaded_bytes is None:
+            return
+        with self._lock:
+            previous = self._file_bytes.get(filename, downloaded_bytes)
+            self._file_bytes[filename] = downloaded_bytes
+        self.consume(downloaded_bytes - previous)
+
+    def consume(self, nbytes):
+        """Account for ``nbytes`` just read; blocks while the job is over its rate"""
+        if nbytes <= 0:
+            return
+        self.scheduler._maybe_rebalance()
+        with self._lock:
+            self._window_bytes += nbytes
+            self._refill()
+            self._tokens -= nbytes
+        while True:
+            with self._lock:
+                self._refill()
+                if self.rate is None or self._tokens >= 0:
+                    return
+                wait = -self._tokens / self.rate
+            time.sleep(min(wait, MAX_SLEEP))
+
+    def _refill(self):
+        # Caller holds the lock
+        now = time.monotonic()
+        if self.rate is None:
+            self._tokens = 0.0
+        else:
+            self._tokens = min(self._tokens + (now - self._last) * self.rate, self.rate * BURST)
+        self._last = now
+
+    def _take_window(self, elapsed):
+        with self._lock:
+            measured = self._window_bytes / elapsed if elapsed > 0 else 0
+            self._window_bytes = 0
+        return measured
+
+    def _set_rate(self, rate):
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+
+class BandwidthScheduler:
+    def __init__(self, total_rate=None, default_job_rate=None):
+        self.total_rate = total_rate
+        self.default_job_rate = default_job_rate
+        self._throttles = {}
+        self._lock = threading.Lock()
+        self._last_rebalance = time.monotonic()
+
+    def register(self, job, cap=None):
+        throttle = JobThrottle(self, job, cap if cap is not None else self.default_job_rate)
+        with self._lock:
+            self._throttles[job.key] = throttle
+            self._rebalance()
+        return throttle
+
+    def throttle(self, job):
+        """The running job's JobThrottle, or None if it isn't registered"""
+        with self._lock:
+            return self._throttles.get(job.key)
+
+    def unregister(self, job):
+        with self._lock:
+            self._throttles.pop(job.key, None)
+            self._rebalance()
+
+    def set_total_rate(self, rate):
+        with self._lock:
+            self.total_rate = rate
+            self._rebalance()
+
+    def set_job_rate(self, job, rate):
+        """Cap one running job (None lifts its cap)"""
+        with self._lock:
+            throttle = self._throttles.get(job.key)
+            if throttle is not None:
+                throttle.cap = rate
+                self._rebalance()
+
+    def rates(self):
+        """Current rate per running job key, None meaning unlimited"""
+        with self._lock:
+            return {key: throttle.rate for key, throttle in self._throttles.items()}
+
+    def _maybe_rebalance(self):
+        if time.monotonic() - self._last_rebalance < REBALANCE_INTERVAL:
+            return
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._last_rebalance
+            if elapsed < REBALANCE_INTERVAL:
+                return
+            self._last_rebalance = now
+            for throttle in self._throttles.values():
+                measured = throttle._take_window(elapsed)
+                # A job that got less than it was allowed is limited by
+                # something else; lend the difference to the others
+                if throttle.rate is not None and measured < throttle.rate * 0.9:
+                    throttle._demand = max(measured * DEMAND_HEADROOM, 1024)
+                else:
+                    throttle._demand = None
+            self._rebalance()
+
+    def _rebalance(self):
+        # Caller holds the lock.  Weighted water-filling over each job's limit
+        # (its cap or measured demand, whichever is lower).
+        throttles = list(self._throttles.values())
+        if not self.total_rate:
+            for throttle in throttles:
+                throttle._set_rate(throttle.cap)
+            return
+
+        remaining = self.total_rate
+        pending = throttles
+        while pending:
+            total_weight = sum(throttle.weight for throttle in pending)
+            limited = []
+            for throttle in pending:
+                limit = min(x for x in (throttle.cap, throttle._demand, float('inf')) if x is not None)
+                if limit <= remaining * throttle.weight / total_weight:
+                    limited.append((throttle, limit))
+            if not limited:
+                for throttle in pending:
+                    throttle._set_rate(remaining * throttle.weight / total_weight)
+                return
+            for throttle, limit in limited:
+                throttle._set_rate(limit)
+                remaining -= limit
+                pending.remove(throttle)
@@ -0,0 +1,261 @@
+"""Headless batch front-end: ``python -m downloader jobs.txt``.
+
+Each non-empty line of the job file describes one job::
+
+    <url>                       download the full video
+    <url> <start> <end>         download a clip
+    <local file> <start> <end>  cut a clip from a local file
+    <source> <s>-<e>,<s>-<e>    cut several clips in one pass
+    <source> chapters           one clip per chapter marker
+    <local file> convert        remux to mp4 (audio converted only if needed)
+    <playlist url> sync         download the videos not fetched by earlier syncs
+
+A folder in place of a local file applies the line to every video in it.
+
+Times are seconds or ``H:M:S`` / ``M:S``.  Lines starting with ``#`` are
+ignored.  Use ``-`` to read the job list from stdin.
+
+Jobs are written to a journal as they run; ``--resume`` picks up whatever a
+crashed or interrupted run left unfinished.
+
+``--serve PORT`` keeps running and takes jobs from local clients over
+HTTP/JSON instead (see server.py and client.py).
+"""
+import argparse
+import os
+import shlex
+import sys
+
+from . import cutting, toolchain
+from .archive import Archive
+from .archive import default_path as default_archive_path
+from .fragcache import DEFAULT_MAX_BYTES, FragmentCache
+from .fragcache import default_folder as default_fragment_folder
+from .bandwidth import BandwidthScheduler, parse_rate
+from .engine import (DEFAULT_QUALITY, QUALITY_OPTIONS, Engine, Job, expand_video_paths, is_url,
+                     parse_time)
+from .fragments import DEFAULT_BUDGET
+from .jobqueue import JobQueue
+from .journal import JobJournal
+from .journal import default_path as default_journal_path
+from .metrics import MetricsSink
+from .playlists import PlaylistIndex
+from .playlists import default_path as default_playlists_path
+from .progress import ProgressBus, describe
+
+
+def parse_job_line(line, save_path, quality, cut_mode=None):
+    """Turn one job-file line into a list of Jobs (empty for blank/comment lines);
+    ``cut_mode`` None picks the default for each kind of source"""
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return []
+
+    fields = shlex.split(line, posix=os.name != 'nt')
+    if os.path.isdir(fields[0]):
+        files = expand_video_paths([fields[0]])
+        if not files:
+            raise ValueError(f"No video files in {fields[0]}")
+        return [_parse_fields([path] + fields[1:], line, save_path, quality, cut_mode)
+                for path in files]
+    return [_parse_fields(fields, line, save_path, quality, cut_mode)]
+
+
+def _parse_fields(fields, line, save_path, quality, cut_mode):
+    source = fields[0]
+    if len(fields) == 1:
+        if not is_url(source):
+            raise ValueError(f"Local files need a start and end time: {line}")
+        return Job(Job.DOWNLOAD, source, save_path, quality)
+    kind = Job.CLIP if is_url(source) else Job.LOCAL_CLIP
+    cut_mode = cut_mode or (cutting.URL_DEFAULT if kind == Job.CLIP else cutting.LOCAL_DEFAULT)
+    if len(fields) == 3:
+        start_time, end_time = parse_time(fields[1]), parse_time(fields[2])
+        return Job(kind, source, save_path, quality, start_time, end_time, cut_mode=cut_mode)
+    if len(fields) != 2:
+        raise ValueError(f"Expected '<source> [<start> <end> | <ranges> | chapters | convert | sync]': {line}")
+    if fields[1].lower() == 'sync':
+        if kind != Job.CLIP:
+            raise ValueError(f"Only playlist or channel URLs can be synced: {line}")
+        return Job(Job.SYNC, source, save_path, quality)
+    if fields[1].lower() == 'convert':
+        if kind != Job.LOCAL_CLIP:
+            raise ValueError(f"Only local files can be converted: {line}")
+        return Job(Job.CONVERT, source, save_path)
+    if fields[1].lower() == 'chapters':
+        return Job(kind, source, save_path, quality, chapters=True, cut_mode=cut_mode)
+    return Job(kind, source, save_path, quality, ranges=parse_ranges(fields[1]), cut_mode=cut_mode)
+
+
+def parse_ranges(text):
+    """Parse "0:10-0:20,1:00-1:30" into [(10, 20), (60, 90)]"""
+    ranges = []
+    for item in text.split(','):
+        start, sep, end = item.partition('-')
+        if not sep:
+            raise ValueError(f"Invalid range: {item!r}")
+        ranges.append((parse_time(start), parse_time(end)))
+    return ranges
+
+
+def read_jobs(stream, save_path, quality, cut_mode=None):
+    jobs = []
+    for lineno, line in enumerate(stream, 1):
+        try:
+            jobs += parse_job_line(line, save_path, quality, cut_mode)
+        except ValueError as e:
+            raise SystemExit(f"line {lineno}: {e}")
+    return jobs
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='video_downloader',
+        description="Download videos and cut clips without the GUI.",
+        epilog="Quality presets: " + ", ".join(f'"{name}"' for name in QUALITY_OPTIONS))
+    parser.add_argument('jobs', nargs='?', help="job file, or - to read from stdin")
+    parser.add_argument('-o', '--output-dir', default='.',
+                        help="folder to save downloads and clips in (default: current folder)")
+    parser.add_argument('-q', '--quality', default=DEFAULT_QUALITY,
+                        help="quality preset name or a raw yt-dlp format string")
+    parser.add_argument('--cut-mode', choices=cutting.CUT_MODES,
+                        help="how clips are cut: fast (keyframe-snapped copy, may start up to a "
+                             "keyframe interval early), smart (frame-accurate, re-encodes only the edges) "
+                             f"or copy (output-side seek) (default: {cutting.URL_DEFAULT} for URLs, "
+                             f"{cutting.LOCAL_DEFAULT} for local files)")
+    parser.add_argument('--no-info-cache', action='store_true',
+                        help="always re-extract video info instead of reusing cached results")
+    parser.add_argument('--no-archive', action='store_true',
+                        help="download even if an identical file was produced before")
+    parser.add_argument('--resume', action='store_true',
+                        help="also run jobs left unfinished by an earlier run")
+    parser.add_argument('--no-journal', action='store_true',
+                        help="do not record jobs, so they cannot be resumed")
+    parser.add_argument('-w', '--workers', type=int, default=2,
+                        help="number of jobs to run at the same time (default: 2)")
+    parser.add_argument('--local-workers', type=int,
+                        help="number of local files to cut or convert at the same time "
+                             "(default: one per CPU core)")
+    parser.add_argument('--per-host', type=int, default=2,
+                        help="maximum running downloads per website, 0 for no limit (default: 2)")
+    parser.add_argument('--limit-rate', type=parse_rate, metavar='RATE',
+                        help="total download rate for all jobs, e.g. 5M or 500K bytes per second; "
+                             "clips get a larger share than full downloads")
+    parser.add_argument('--job-rate', type=parse_rate, metavar='RATE',
+                        help="download rate cap for each job")
+    parser.add_argument('--fragment-budget', type=int, default=DEFAULT_BUDGET,
+                        help="fragment download threads shared by all running jobs; each job's "
+                             f"share is tuned to its throughput (default: {DEFAULT_BUDGET})")
+    parser.add_argument('--fragment-cache', type=int, metavar='MB', default=DEFAULT_MAX_BYTES // 1024 ** 2,
+                        help="size of the on-disk cache of HLS/DASH fragments shared by clips of the "
+                             f"same video, 0 to turn it off (default: {DEFAULT_MAX_BYTES // 1024 ** 2})")
+    parser.add_argument('--stream-merge', action='store_true',
+                        help="download separate video and audio streams straight into the merged file; "
+                             "an interrupted download then starts over")
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="append per-job stage timings and throughput to FILE as JSON lines")
+    parser.add_argument('--prometheus', metavar='FILE',
+                        help="keep running totals in FILE in Prometheus text format "
+                             "(for node_exporter's textfile collector)")
+    parser.add_argument('--serve', type=int, metavar='PORT',
+                        help="keep running and accept jobs over HTTP on PORT (see downloader/server.py)")
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="address to serve on (default: 127.0.0.1; the API has no authentication)")
+    parser.add_argument('--tools', action='store_true',
+                        help="show the ffmpeg and ffprobe in use and what they support, then exit")
+    return parser
+
+
+def print_progress(event):
+    text = describe(event)
+    if text:
+        print(f"[job {event.job.id}] {text}", file=sys.stderr)
+
+
+def print_state(job):
+    if job.status == Job.DONE:
+        if job.formats:
+            print(f"[job {job.id}] formats {job.formats['spec']}: {'; '.join(job.formats['reasons'])}",
+                  file=sys.stderr)
+        for output in job.outputs:
+            print(output)
+    elif job.status == Job.FAILED:
+        print(f"[job {job.id}] failed: {job.error}", file=sys.stderr)
+    elif job.status == Job.CANCELLED:
+        print(f"[job {job.id}] cancelled", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.tools:
+        print(toolchain.get().describe())
+        return 0
+    if not args.jobs and not args.resume and args.serve is None:
+        parser.error("give a job file, - for stdin, --resume or --serve PORT")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    journal = None if args.no_journal else JobJournal(default_journal_path())
+    jobs = journal.unfinished() if journal is not None and args.resume else []
+    if args.jobs == '-':
+        jobs += read_jobs(sys.stdin, args.output_dir, args.quality, args.cut_mode)
+    elif args.jobs:
+        with open(args.jobs, encoding='utf-8') as f:
+            jobs += read_jobs(f, args.output_dir, args.quality, args.cut_mode)
+
+    archive = None if args.no_archive else Archive(default_archive_path())
+    playlists = PlaylistIndex(default_playlists_path())
+    progress = ProgressBus(interval=1.0)
+    on_state = print_state
+    events = None
+    if args.serve is None:
+        progress.subscribe(print_progress)
+    else:
+        # Imported here: the server reuses this module's job-line parser
+        from .server import EventHub
+        events = EventHub()
+        progress.subscribe(events.progress)
+
+        def on_state(job):
+            print_state(job)
+            events.state(job)
+    metrics = None
+    if args.metrics or args.prometheus:
+        metrics = MetricsSink(args.metrics, args.prometheus)
+    fragment_cache = None
+    if args.fragment_cache > 0:
+        fragment_cache = FragmentCache(default_fragment_folder(), args.fragment_cache * 1024 ** 2)
+    engine = Engine(progress=progress, use_info_cache=not args.no_info_cache,
+                    journal=journal, archive=archive, metrics=metrics,
+                    fragment_budget=args.fragment_budget,
+                    bandwidth=BandwidthScheduler(args.limit_rate, args.job_rate),
+                    playlists=playlists, fragment_cache=fragment_cache, stream_merge=args.stream_merge)
+    queue = JobQueue(engine, workers=args.workers, per_host_limit=args.per_host,
+                     on_state=on_state, local_workers=args.local_workers)
+    for job in jobs:
+        queue.submit(job)
+    try:
+        if args.serve is None:
+            queue.join()
+        else:
+            from .server import serve
+            serve(queue, events, args.host, args.serve, args.output_dir, args.quality, args.cut_mode)
+    except KeyboardInterrupt:
+        # Stop ffmpeg and the downloads now and clean up their partial files
+        print("Cancelling all jobs...", file=sys.stderr)
+        for job in queue.jobs():
+            queue.cancel(job)
+        queue.join()
+    queue.shutdown()
+    engine.close()
+    progress.stop()
+    if journal is not None:
+        journal.prune()
+        journal.close()
+    if archive is not None:
+        archive.close()
+    playlists.close()
+    if fragment_cache is not None:
+        fragment_cache.close()
+
+    return 1 if any(job.status in (Job.FAILED, Job.CANCELLED) for job in jobs) else 0
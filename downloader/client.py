@@ -0,0 +1,150 @@
+"""Minimal client for the local job server (see server.py).
+
+    python -m downloader.client "https://youtu.be/... 1:00 1:30" "~/video.mp4 convert"
+    python -m downloader.client --server http://127.0.0.1:8765 --list
+
+Submits each job line, prints progress until all of them (and any videos a
+playlist sync queued) have finished, and prints the output paths.  The
+exit status is 1 if a job failed or was cancelled, like the batch CLI.
+``Client`` can be used from other Python code as well.
+"""
+import argparse
+import json
+import sys
+import urllib.error
+import urllib.request
+
+DEFAULT_SERVER = 'http://127.0.0.1:8765'
+FINISHED = ('done', 'failed', 'cancelled')
+
+
+class ServerError(Exception):
+    pass
+
+
+class Client:
+    def __init__(self, server=DEFAULT_SERVER):
+        self.server = server.rstrip('/')
+
+    def _request(self, method, path, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(self.server + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.load(e).get('error')
+            except ValueError:
+                message = None
+            raise ServerError(message or str(e)) from e
+
+    def submit(self, line, **options):
+        """Submit a job line; options are output_dir, quality, cut_mode,
+        priority and rate_limit.  Returns the new jobs as dicts."""
+        return self._request('POST', '/jobs', dict(options, line=line))['jobs']
+
+    def jobs(self):
+        return self._request('GET', '/jobs')['jobs']
+
+    def job(self, job_id):
+        return self._request('GET', f"/jobs/{job_id}")
+
+    def pause(self, job_id):
+        return self._request('POST', f"/jobs/{job_id}/pause", {})
+
+    def resume(self, job_id):
+        return self._request('POST', f"/jobs/{job_id}/resume", {})
+
+    def cancel(self, job_id):
+        return self._request('POST', f"/jobs/{job_id}/cancel", {})
+
+    def events(self, job_id=None):
+        """Yield (event name, data dict) from the server's event stream"""
+        path = '/events' if job_id is None else f"/events?job={job_id}"
+        with urllib.request.urlopen(self.server + path) as response:
+            name, data = None, []
+            for raw in response:
+                line = raw.decode('utf-8').rstrip('\r\n')
+                if line.startswith('event:'):
+                    name = line[len('event:'):].strip()
+                elif line.startswith('data:'):
+                    data.append(line[len('data:'):].strip())
+                elif not line:
+                    if name and data:
+                        yield name, json.loads('\n'.join(data))
+                    name, data = None, []
+
+    def wait(self, job_ids, on_event=None):
+        """Follow the event stream until the jobs and the jobs they queued
+        have finished; returns their last states by id.  ``on_event(name,
+        data)`` sees the events of those jobs only."""
+        waiting = set(job_ids)
+        states = {}
+        for name, data in self.events():
+            if data['id'] not in waiting:
+                continue
+            if on_event is not None:
+                on_event(name, data)
+            if name != 'state':
+                continue
+            states[data['id']] = data
+            if data['status'] in FINISHED:
+                waiting.discard(data['id'])
+                if data['status'] == 'done':
+                    waiting.update(data['children'])
+            if not waiting:
+                return states
+        raise ServerError("The server closed the event stream")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m downloader.client',
+                                     description="Submit jobs to a running job server and follow them.")
+    parser.add_argument('lines', nargs='*', help="job lines, in the batch CLI's job-file syntax")
+    parser.add_argument('--server', default=DEFAULT_SERVER, help=f"server URL (default: {DEFAULT_SERVER})")
+    parser.add_argument('-o', '--output-dir', help="folder to save into, inside the server's output folder")
+    parser.add_argument('-q', '--quality', help="quality preset name or a raw yt-dlp format string")
+    parser.add_argument('--cut-mode', help="fast, smart or copy (default: the server's, "
+                                           "smart for URLs and fast for local files)")
+    parser.add_argument('--list', action='store_true', help="list the server's jobs and exit")
+    args = parser.parse_args(argv)
+
+    client = Client(args.server)
+    try:
+        if args.list:
+            for job in client.jobs():
+                print(f"{job['id']:>5}  {job['status']:<10} {job['progress']:5.1f}%  {job['description']}")
+            return 0
+        if not args.lines:
+            parser.error("give at least one job line, or --list")
+
+        options = {name: value for name, value in (('output_dir', args.output_dir), ('quality', args.quality),
+                                                   ('cut_mode', args.cut_mode)) if value}
+        job_ids = []
+        for line in args.lines:
+            job_ids += [job['id'] for job in client.submit(line, **options)]
+
+        def print_event(name, data):
+            if name == 'progress' and data['description']:
+                print(f"[job {data['id']}] {data['description']}", file=sys.stderr)
+
+        states = client.wait(job_ids, print_event)
+    except (ServerError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    status = 0
+    for job in states.values():
+        if job['status'] == 'done':
+            for output in job['outputs']:
+                print(output)
+        else:
+            print(f"[job {job['id']}] {job['status']}: {job['error']}", file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Cancel, pause and resume for running jobs.
+
+Every job carries a ``JobControl``.  The engine calls ``checkpoint()`` from
+yt-dlp's progress hooks and between ffmpeg runs: it blocks while the job
+is paused and raises ``JobCancelled`` once the job is cancelled.  A paused
+download therefore stops reading from its sockets and a cancelled one
+stops at the next block it receives.
+
+ffmpeg processes started for a job are attached to its control, so pausing
+suspends them (SIGSTOP, or NtSuspendProcess on Windows) and cancelling
+terminates them instead of letting them run to the end.  A job cancelled
+with ``keep_partial`` (the app is closing, the job resumes on the next
+start) stops the same way but keeps its partial downloads.
+"""
+import os
+import signal
+import sys
+import threading
+
+# Seconds a terminated ffmpeg gets to exit before it is killed
+TERMINATE_TIMEOUT = 5
+
+
+class JobCancelled(Exception):
+    """Raised inside a job that was cancelled."""
+
+
+# Signals go straight to the pid on POSIX: Popen's own methods poll() first,
+# which could reap the child behind the back of the thread waiting for it.
+
+def suspend_process(process):
+    if sys.platform == 'win32':
+        _nt_process_call(process, 'NtSuspendProcess')
+    else:
+        os.kill(process.pid, signal.SIGSTOP)
+
+
+def resume_process(process):
+    if sys.platform == 'win32':
+        _nt_process_call(process, 'NtResumeProcess')
+    else:
+        os.kill(process.pid, signal.SIGCONT)
+
+
+def terminate_process(process):
+    if sys.platform == 'win32':
+        process.terminate()
+    else:
+        os.kill(process.pid, signal.SIGTERM)
+
+
+def kill_process(process):
+    if sys.platform == 'win32':
+        process.kill()
+    else:
+        os.kill(process.pid, signal.SIGKILL)
+
+
+def _nt_process_call(process, name):
+    import ctypes
+    PROCESS_SUSPEND_RESUME = 0x0800
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(PROCESS_SUSPEND_RESUME, False, process.pid)
+    if not handle:
+        raise ctypes.WinError()
+    try:
+        getattr(ctypes.windll.ntdll, name)(handle)
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+class JobControl:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._running.set()
+        self._cancelled = False
+        self.keep_partial = False
+        self._processes = set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set() and not self._cancelled
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def pause(self):
+        with self._lock:
+            if self._cancelled or not self._running.is_set():
+                return
+            self._running.clear()
+            for process in self._processes:
+                self._signal(process, suspend_process)
+
+    def resume(self):
+        with self._lock:
+            if self._running.is_set():
+                return
+            self._running.set()
+            for process in self._processes:
+                self._signal(process, resume_process)
+
+    def cancel(self, keep_partial=False):
+        with self._lock:
+            if self._cancelled:
+                return
+            self.keep_partial = keep_partial
+            was_paused = not self._running.is_set()
+            self._cancelled = True
+            # Wake up everything blocked in checkpoint()
+            self._running.set()
+            for process in self._processes:
+                if was_paused:
+                    # A stopped process only acts on SIGTERM once it runs again
+                    self._signal(process, resume_process)
+                self._signal(process, terminate_process)
+            if self._processes:
+                timer = threading.Timer(TERMINATE_TIMEOUT, self._kill_remaining)
+                timer.daemon = True
+                timer.start()
+
+    def _kill_remaining(self):
+        # The thread that started a process detaches it once it has exited
+        with self._lock:
+            for process in self._processes:
+                self._signal(process, kill_process)
+
+    def checkpoint(self):
+        """Block while paused; raise JobCancelled if the job was cancelled"""
+        self._running.wait()
+        if self._cancelled:
+            raise JobCancelled("Cancelled")
+
+    def attach(self, process):
+        """Track a child process so pause and cancel reach it"""
+        with self._lock:
+            self._processes.add(process)
+            if self._cancelled:
+                self._signal(process, terminate_process)
+            elif not self._running.is_set():
+                self._signal(process, suspend_process)
+
+    def detach(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+    @staticmethod
+    def _signal(process, action):
+        try:
+            action(process)
+        except OSError as e:
+            # The process exited in the meantime
+            print(f"Could not signal process {process.pid}: {e}")
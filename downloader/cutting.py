@@ -0,0 +1,288 @@
+"""ffmpeg command builders for cutting clips out of local files.
+
+Three cut modes are supported:
+
+``copy``
+    The original behaviour: seek on the output side and stream-copy.  ffmpeg
+    reads everything before the start time, so late clips are slow.
+``fast``
+    Seek on the input side, snapped to the keyframe at or before the start
+    time, and stream-copy.  Only the bytes of the clip are read, but the
+    clip may start up to one GOP early.
+``smart``
+    Frame-accurate: re-encode only the partial GOPs at each edge and
+    stream-copy the keyframe-aligned middle, then join the pieces with the
+    concat demuxer.
+
+When a smart cut has to re-encode the whole clip (no keyframe inside it,
+or a codec the edges can't be matched to), long clips are split at
+keyframes and the segments are encoded by parallel ffmpeg processes, then
+joined losslessly the same way.
+"""
+import concurrent.futures
+import os
+import subprocess
+
+from .probe import AAC_AUDIO_ARGS
+
+COPY = 'copy'
+FAST = 'fast'
+SMART = 'smart'
+CUT_MODES = (COPY, FAST, SMART)
+# Mode used when none is chosen.  URL clips stay frame accurate, as they
+# were when yt-dlp re-encoded them at the cuts; local clips favour speed
+LOCAL_DEFAULT = FAST
+URL_DEFAULT = SMART
+
+# Source codec -> (encoder for the edges, bitstream filter for copied pieces)
+SMART_ENCODERS = {
+    'h264': ('libx264', 'h264_mp4toannexb'),
+    'hevc': ('libx265', 'hevc_mp4toannexb'),
+}
+EDGE_QUALITY = ['-crf', '16', '-preset', 'fast']
+# Encoders for a full re-encode, best first; mpeg4 is in every ffmpeg build
+REENCODERS = ('libx264', 'mpeg4')
+# Segments of a parallel re-encode are at least this long: each one pays
+# for a process start and a seek, and keyframes are seconds apart anyway
+MIN_SEGMENT_SECONDS = 10.0
+
+EPSILON = 0.01
+
+
+def seek_time(seconds):
+    """ffmpeg time for a seek to a keyframe.  Rounded to milliseconds, a
+    keyframe at 0.133467 would become 0.133 and an input-side seek would
+    land on the keyframe before it, so keep the index's full precision."""
+    return f"{seconds:.6f}"
+
+
+def run_ffmpeg(cmd, metrics=None):
+    if metrics is not None:
+        returncode, stderr = metrics.run_ffmpeg(cmd)
+    else:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        returncode, stderr = result.returncode, result.stderr
+    if returncode != 0:
+        raise RuntimeError(stderr)
+
+
+def convert_command(ffmpeg_path, file_path, output_path, audio_args=AAC_AUDIO_ARGS):
+    """Remux a whole file to mp4, converting the audio only if it has to"""
+    return [
+        ffmpeg_path, '-y', '-i', file_path,
+        '-map', '0:v:0?', '-map', '0:a:0?',
+        '-c:v', 'copy',
+    ] + audio_args + [output_path]
+
+
+def copy_cut_command(ffmpeg_path, file_path, ranges, output_paths, audio_args=AAC_AUDIO_ARGS):
+    """One input, one output per range: the file is demuxed once no matter
+    how many clips are cut from it."""
+    cmd = [ffmpeg_path, '-y', '-i', file_path]
+    for (start_time, end_time), output_path in zip(ranges, output_paths):
+        cmd += [
+            '-ss', str(start_time),
+            '-t', str(end_time - start_time),
+            '-c:v', 'copy',
+        ] + audio_args + [
+            '-avoid_negative_ts', 'make_zero',
+            output_path,
+        ]
+    return cmd
+
+
+def fast_cut_command(ffmpeg_path, file_path, ranges, output_paths, index, audio_args=AAC_AUDIO_ARGS):
+    """One seeking input per range, each snapped to the keyframe at or
+    before its start, so ffmpeg jumps straight to every clip."""
+    cmd = [ffmpeg_path, '-y']
+    for start_time, end_time in ranges:
+        keyframe = index.keyframe_before(file_path, start_time)
+        cmd += ['-ss', seek_time(keyframe), '-t', seek_time(end_time - keyframe), '-i', file_path]
+    for input_index, output_path in enumerate(output_paths):
+        cmd += [
+            '-map', f"{input_index}:v:0?",
+            '-map', f"{input_index}:a:0?",
+            '-c:v', 'copy',
+        ] + audio_args + [
+            '-avoid_negative_ts', 'make_zero',
+            output_path,
+        ]
+    return cmd
+
+
+def reencoder(tools=None):
+    """The best full re-encode encoder the toolchain has"""
+    for encoder in REENCODERS:
+        if tools is None or tools.has_encoder(encoder):
+            return encoder
+    return REENCODERS[-1]
+
+
+def encoder_quality(encoder):
+    return EDGE_QUALITY if encoder == 'libx264' else ['-q:v', '2']
+
+
+def reencode_command(ffmpeg_path, file_path, start_time, end_time, output_path,
+                     audio_args=AAC_AUDIO_ARGS, encoder='libx264'):
+    """Frame-accurate full re-encode of one range (input-side seek, so the
+    cost depends on clip length only)"""
+    quality = encoder_quality(encoder)
+    return [
+        ffmpeg_path, '-y',
+        '-ss', f"{start_time:.3f}",
+        '-t', f"{end_time - start_time:.3f}",
+        '-i', file_path,
+        '-map', '0:v:0?', '-map', '0:a:0?',
+        '-c:v', encoder,
+    ] + quality + audio_args + [output_path]
+
+
+def plan_segments(index, file_path, start_time, end_time, count):
+    """Split a range at keyframes into at most ``count`` segments of similar length.
+
+    Only the first segment may start between keyframes; every other one
+    starts on a keyframe, so its input-side seek decodes nothing extra.
+    """
+    count = min(count, int((end_time - start_time) // MIN_SEGMENT_SECONDS))
+    boundaries = [start_time]
+    for number in range(1, count):
+        target = start_time + (end_time - start_time) * number / count
+        keyframe = index.keyframe_before(file_path, target)
+        if boundaries[-1] + EPSILON < keyframe < end_time - EPSILON:
+            boundaries.append(keyframe)
+    boundaries.append(end_time)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def parallel_reencode(ffmpeg_path, file_path, start_time, end_time, output_path, index, workdir,
+                      audio_args=AAC_AUDIO_ARGS, metrics=None, tools=None, workers=1):
+    """Full re-encode of one range, split at keyframes across up to
+    ``workers`` ffmpeg processes and joined without another encode.
+
+    Every segment is encoded with the same encoder and settings as a
+    single-pass encode, so the joined clip is frame-accurate and starts and
+    ends on the same frames.  The segments are encoded independently, so
+    the output is not bit-identical to a single pass: each segment starts
+    with its own keyframe and rate control restarts at every split.  The
+    audio is encoded once over the whole range.
+    """
+    encoder = reencoder(tools)
+    segments = plan_segments(index, file_path, start_time, end_time, workers) if workers > 1 else []
+    if len(segments) < 2:
+        run_ffmpeg(reencode_command(ffmpeg_path, file_path, start_time, end_time, output_path,
+                                    audio_args, encoder), metrics)
+        return
+
+    # Share the cores between the processes instead of letting each one
+    # start a thread per core
+    threads = []
+    if tools is None or tools.threads:
+        threads = ['-threads', str(max(1, workers // len(segments)))]
+    commands = []
+    piece_paths = []
+    for number, (segment_start, segment_end) in enumerate(segments):
+        piece_path = os.path.join(workdir, f"segment_{number}.ts")
+        commands.append([
+            ffmpeg_path, '-y',
+            '-ss', seek_time(segment_start),
+            '-t', seek_time(segment_end - segment_start),
+            '-i', file_path,
+            '-map', '0:v:0', '-an',
+            '-c:v', encoder,
+        ] + encoder_quality(encoder) + threads + ['-f', 'mpegts', piece_path])
+        piece_paths.append(piece_path)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(commands)) as pool:
+        for future in [pool.submit(run_ffmpeg, cmd, metrics) for cmd in commands]:
+            future.result()
+    join_pieces(ffmpeg_path, piece_paths, file_path, start_time, end_time, output_path, workdir,
+                audio_args, metrics)
+
+
+def join_pieces(ffmpeg_path, piece_paths, file_path, start_time, end_time, output_path, workdir,
+                audio_args=AAC_AUDIO_ARGS, metrics=None):
+    """Join video pieces losslessly and take the audio in one pass from the
+    source, so there are no gaps at the piece boundaries"""
+    list_path = os.path.join(workdir, 'pieces.txt')
+    with open(list_path, 'w', encoding='utf-8') as listing:
+        for piece_path in piece_paths:
+            listing.write(f"file '{os.path.basename(piece_path)}'\n")
+    run_ffmpeg([
+        ffmpeg_path, '-y',
+        '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-ss', f"{start_time:.3f}", '-t', f"{end_time - start_time:.3f}", '-i', file_path,
+        '-map', '0:v:0', '-map', '1:a:0?',
+        '-c:v', 'copy',
+    ] + audio_args + [output_path], metrics)
+
+
+def can_smart_cut(codec, tools=None):
+    """True if edges of ``codec`` video can be re-encoded to match the copied
+    middle and the pieces joined (needs the encoder and the mpegts muxer)"""
+    if codec not in SMART_ENCODERS:
+        return False
+    if tools is None:
+        return True
+    return tools.has_encoder(SMART_ENCODERS[codec][0]) and tools.has_muxer('mpegts')
+
+
+def plan_smart_cut(index, file_path, start_time, end_time):
+    """Split a range into ('encode' | 'copy', start, end) pieces.
+
+    Returns None when there is no keyframe inside the range, in which case
+    the whole clip has to be re-encoded anyway.
+    """
+    first_keyframe = index.keyframe_after(file_path, start_time)
+    if first_keyframe is None or first_keyframe >= end_time - EPSILON:
+        return None
+    last_keyframe = index.keyframe_before(file_path, end_time)
+
+    pieces = []
+    if first_keyframe - start_time > EPSILON:
+        pieces.append(('encode', start_time, first_keyframe))
+    if last_keyframe > first_keyframe + EPSILON:
+        pieces.append(('copy', first_keyframe, last_keyframe))
+        if end_time - last_keyframe > EPSILON:
+            pieces.append(('encode', last_keyframe, end_time))
+    else:
+        pieces.append(('copy', first_keyframe, end_time))
+    return pieces
+
+
+def smart_cut(ffmpeg_path, file_path, start_time, end_time, output_path, index, video_stream, workdir,
+              audio_args=AAC_AUDIO_ARGS, metrics=None, tools=None, workers=1):
+    """``tools`` is the toolchain.Toolchain in use; without it every encoder
+    and muxer is assumed to be available.  A full re-encode may use up to
+    ``workers`` ffmpeg processes."""
+    codec = (video_stream or {}).get('codec_name')
+    pieces = plan_smart_cut(index, file_path, start_time, end_time) if can_smart_cut(codec, tools) else None
+    if pieces is None:
+        if tools is not None and not tools.has_muxer('mpegts'):
+            workers = 1
+        parallel_reencode(ffmpeg_path, file_path, start_time, end_time, output_path, index, workdir,
+                          audio_args, metrics, tools, workers)
+        return
+
+    encoder, bsf = SMART_ENCODERS[codec]
+    pix_fmt = video_stream.get('pix_fmt')
+    piece_paths = []
+    for number, (action, piece_start, piece_end) in enumerate(pieces):
+        piece_path = os.path.join(workdir, f"piece_{number}.ts")
+        cmd = [
+            ffmpeg_path, '-y',
+            '-ss', seek_time(piece_start),
+            '-t', seek_time(piece_end - piece_start),
+            '-i', file_path,
+            '-map', '0:v:0', '-an',
+        ]
+        if action == 'encode':
+            cmd += ['-c:v', encoder] + EDGE_QUALITY
+            if pix_fmt:
+                cmd += ['-pix_fmt', pix_fmt]
+        else:
+            cmd += ['-c:v', 'copy', '-bsf:v', bsf]
+        run_ffmpeg(cmd + ['-f', 'mpegts', piece_path], metrics)
+        piece_paths.append(piece_path)
+
+    join_pieces(ffmpeg_path, piece_paths, file_path, start_time, end_time, output_path, workdir,
+                audio_args, metrics)
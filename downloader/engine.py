@@ -0,0 +1,1086 @@
+"""GUI-free download and clip engine shared by the Tk app and the CLI."""
+import concurrent.futures
+import contextlib
+import copy
+import itertools
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+from . import cutting, fragcache, playlists, probe, ranking, remote, streammerge, toolchain
+from .bandwidth import BandwidthScheduler
+from .control import JobCancelled, JobControl
+from .fragments import DEFAULT_BUDGET, ConcurrencyTuner, FragmentBudget, retry_sleep
+from .infocache import InfoCache
+from .keyframes import KeyframeIndex
+from .metrics import JobMetrics, YtdlpLogger
+from .paths import cache_dir
+from .ydlpool import YdlPool
+
+QUALITY_OPTIONS = {
+    "Best Quality (Auto)": "(bv+ba/b)[vcodec!*=av01]",
+    "2160p 4K": "(bv[height<=2160]+ba/b)[vcodec!*=av01]",
+    "1440p": "(bv[height<=1440]+ba/b)[vcodec!*=av01]",
+    "1080p FHD": "(bv[height<=1080]+ba/b)[vcodec!*=av01]",
+    "720p HD": "(bv[height<=720]+ba/b)[vcodec!*=av01]",
+    "480p SD": "(bv[height<=480]+ba/b)[vcodec!*=av01]",
+    "360p SD": "(bv[height<=360]+ba/b)[vcodec!*=av01]",
+    "Audio Only": "bestaudio/best",
+    "Worst (Smallest)": "worst[vcodec!*=av01]"
+}
+
+# Presets whose formats are picked by ranking.rank() for each video, with
+# its height cap; the format strings above are the fallback when the format
+# list says too little.  "Worst" is left to yt-dlp.
+RANKED_PRESETS = {
+    "Best Quality (Auto)": None,
+    "2160p 4K": 2160,
+    "1440p": 1440,
+    "1080p FHD": 1080,
+    "720p HD": 720,
+    "480p SD": 480,
+    "360p SD": 360,
+    "Audio Only": ranking.AUDIO_ONLY,
+}
+
+DEFAULT_QUALITY = "Best Quality (Auto)"
+DEFAULT_FORMAT = QUALITY_OPTIONS[DEFAULT_QUALITY]
+
+VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.m4v']
+
+# Leftovers of an unfinished yt-dlp download: .part files and their
+# fragments, resume state, and formats waiting to be merged
+PARTIAL_DOWNLOAD_PATTERN = re.compile(r'\.part(-Frag\d+)?$|\.ytdl$|\.temp\.\w+$|\.f[\w-]+\.\w+(\.part)?$')
+
+RETRIES = 10
+FRAGMENT_RETRIES = 10
+# Stream merges fetch formats in ranged requests of this size unless the
+# extractor asks for another one
+STREAM_CHUNK_SIZE = 10 * 1024 ** 2
+STREAM_BLOCK_SIZE = 256 * 1024
+
+
+class DownloadError(Exception):
+    """Raised when a download or clip job fails."""
+
+
+def resource_path(relative_path):
+    """ Get absolute path to resource, works for dev and PyInstaller """
+    try:
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, relative_path)
+
+
+def validate_url(url):
+    # Support YouTube and Google Drive URLs
+    youtube_pattern = re.compile(
+        r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/'
+    )
+    drive_pattern = re.compile(
+        r'(https?://)?(drive\.google\.com|docs\.google\.com)'
+    )
+    return youtube_pattern.match(url) or drive_pattern.match(url)
+
+
+def is_video_file(file_path):
+    return any(file_path.lower().endswith(ext) for ext in VIDEO_EXTENSIONS)
+
+
+def expand_video_paths(paths):
+    """Video files among ``paths``, with folders expanded recursively"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, dirs, names in os.walk(path):
+                dirs.sort()
+                files += [os.path.join(folder, name) for name in sorted(names)
+                          if is_video_file(name)]
+        elif is_video_file(path):
+            files.append(path)
+    return files
+
+
+def is_url(source):
+    return re.match(r'^[a-zA-Z][a-zA-Z0-9+.-]*://', source) is not None
+
+
+def parse_time(value):
+    """Parse "90", "1:30" or "0:1:30" into seconds"""
+    parts = str(value).strip().split(':')
+    if not parts or len(parts) > 3:
+        raise ValueError(f"Invalid time: {value!r}")
+    total = 0
+    for part in parts:
+        total = total * 60 + int(part)
+    return total
+
+
+def resolve_format(quality):
+    """Map a quality preset name to a yt-dlp format string.
+
+    Anything that is not a preset name is passed through as a raw format
+    string so the CLI can use any yt-dlp selector.
+    """
+    if not quality:
+        return DEFAULT_FORMAT
+    return QUALITY_OPTIONS.get(quality, quality)
+
+
+def safe_filename(name):
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', name or '').strip('_.') or 'untitled'
+
+
+# Paths handed out by unique_path in this process.  Local jobs run in
+# parallel, so a name must be claimed before its file exists on disk.
+_claimed_paths = set()
+_claimed_lock = threading.Lock()
+
+
+def unique_path(folder, stem, ext, taken=()):
+    """Return folder/stem+ext, adding a counter if it exists or is in ``taken``"""
+    with _claimed_lock:
+        path = os.path.join(folder, f"{stem}{ext}")
+        counter = 1
+        while os.path.exists(path) or path in taken or path in _claimed_paths:
+            path = os.path.join(folder, f"{stem}_{counter}{ext}")
+            counter += 1
+        _claimed_paths.add(path)
+    return path
+
+
+def preload():
+    """Import yt-dlp ahead of the first download.
+
+    yt-dlp is imported on first use because loading it takes longer than
+    building the whole window; the GUI calls this from a background thread
+    once it is on screen.
+    """
+    import yt_dlp
+    return yt_dlp
+
+
+def get_ffmpeg_path():
+    return toolchain.get().ffmpeg
+
+
+def get_ffprobe_path():
+    return toolchain.get().ffprobe
+
+
+class Job:
+    """A single download or clip request handed to the engine."""
+
+    DOWNLOAD = 'download'
+    CLIP = 'clip'
+    LOCAL_CLIP = 'local_clip'
+    CONVERT = 'convert'
+    SYNC = 'sync'
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    _ids = itertools.count(1)
+
+    def __init__(self, kind, source, save_path, quality=DEFAULT_QUALITY,
+                 start_time=None, end_time=None, priority=0, ranges=None, chapters=False,
+                 cut_mode=cutting.COPY, key=None, created=None, rate_limit=None):
+        if kind not in (self.DOWNLOAD, self.CLIP, self.LOCAL_CLIP, self.CONVERT, self.SYNC):
+            raise ValueError(f"Unknown job kind: {kind}")
+        if ranges is None and (start_time is not None or end_time is not None):
+            ranges = [(start_time, end_time)]
+        ranges = list(ranges or [])
+        if kind in (self.CLIP, self.LOCAL_CLIP) and not ranges and not chapters:
+            raise ValueError("Clip jobs need a start and end time")
+        if cut_mode not in cutting.CUT_MODES:
+            raise ValueError(f"Unknown cut mode: {cut_mode}")
+        if ranges and chapters:
+            raise ValueError("Use either time ranges or a chapter split, not both")
+        for range_start, range_end in ranges:
+            if range_start is None or range_end is None:
+                raise ValueError("Clip jobs need a start and end time")
+            if range_start >= range_end:
+                raise ValueError("Start time must be less than end time")
+
+        self.id = next(Job._ids)
+        # Stable identity across restarts, used by the journal
+        self.key = key or uuid.uuid4().hex
+        # Part of every output name, so a resumed job finds its partial files
+        self.created = created or int(time.time())
+        self.kind = kind
+        self.source = source
+        self.save_path = save_path
+        self.quality = quality
+        self.ranges = ranges
+        self.chapters = chapters
+        self.cut_mode = cut_mode
+        self.start_time, self.end_time = ranges[0] if ranges else (None, None)
+        self.priority = priority
+        # Bytes per second, None for the scheduler's default
+        self.rate_limit = rate_limit
+        self.status = self.QUEUED
+        self.progress = 0.0
+        self.output = None
+        self.outputs = []
+        self.error = None
+        self.metrics = None
+        # Formats ranked best for a quality preset and why (ranking.Choice.to_dict())
+        self.formats = None
+        # Pause, resume and cancel requests from the UI
+        self.control = JobControl()
+        # Jobs this one produced (a playlist sync), queued when it finishes
+        self.children = []
+        # Shared list of jobs that were submitted together, if any
+        self.batch = None
+
+    @property
+    def is_clip(self):
+        return self.kind in (self.CLIP, self.LOCAL_CLIP)
+
+    @property
+    def is_local(self):
+        return self.kind in (self.LOCAL_CLIP, self.CONVERT)
+
+    def describe(self):
+        if self.kind == self.DOWNLOAD:
+            return self.source
+        if self.kind == self.CONVERT:
+            return f"{self.source} (convert to mp4)"
+        if self.kind == self.SYNC:
+            return f"{self.source} (sync new videos)"
+        if self.chapters:
+            return f"{self.source} (split by chapters)"
+        if len(self.ranges) > 1:
+            return f"{self.source} ({len(self.ranges)} clips)"
+        return f"{self.source} ({self.start_time}s to {self.end_time}s)"
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} {self.status} {self.describe()}>"
+
+
+class Engine:
+    """Runs jobs and publishes their progress on a ProgressBus.
+
+    Workers only publish; the bus merges updates and delivers them to its
+    subscribers at a fixed rate.  The engine never touches any UI toolkit,
+    so it can run on a headless box.
+    """
+
+    def __init__(self, progress=None, use_info_cache=True, journal=None, archive=None, metrics=None,
+                 fragment_budget=DEFAULT_BUDGET, bandwidth=None, playlists=None, fragment_cache=None,
+                 stream_merge=False):
+        self.progress = progress
+        self.metrics = metrics
+        self.journal = journal
+        self.archive = archive
+        self.playlists = playlists
+        # HLS/DASH fragments shared by clips of the same video (optional)
+        self.fragment_cache = fragment_cache
+        # Download separate video and audio formats straight into the
+        # merged file instead of merging two finished downloads
+        self.stream_merge = stream_merge
+        self._keyframe_index = None
+        self.audio_probe = probe.AudioProbe(get_ffprobe_path)
+        self.info_cache = InfoCache(cache_dir('info')) if use_info_cache else None
+        # Fragment threads are tuned per job but shared by all running jobs
+        self.fragment_tuner = ConcurrencyTuner(FragmentBudget(fragment_budget))
+        self.bandwidth = bandwidth or BandwidthScheduler()
+        # Smart cuts running right now; a full re-encode splits the cores
+        # between them
+        self._encodes = 0
+        self._encodes_lock = threading.Lock()
+        # One long-lived YoutubeDL per worker thread, so jobs reuse its
+        # open connections, cookies and extractors
+        self.ydl_pool = YdlPool({'quiet': True, 'noprogress': True})
+
+    def close(self):
+        """Close the pooled downloaders and their connections"""
+        self.ydl_pool.close()
+
+    @contextlib.contextmanager
+    def _encode_workers(self):
+        """Yield how many parallel ffmpeg encoders this smart cut may use"""
+        with self._encodes_lock:
+            self._encodes += 1
+            running = self._encodes
+        try:
+            yield max(1, (os.cpu_count() or 1) // running)
+        finally:
+            with self._encodes_lock:
+                self._encodes -= 1
+
+    def keyframe_index(self):
+        if self._keyframe_index is None:
+            self._keyframe_index = KeyframeIndex(get_ffprobe_path(), cache_dir('keyframes'))
+        return self._keyframe_index
+
+    def _report(self, job, percent=None, text=None, downloaded_bytes=None, total_bytes=None, eta=None):
+        if percent is not None:
+            job.progress = percent
+            journal = self.journal
+            if journal is not None:
+                journal.save_progress(job)
+        if self.progress is not None:
+            self.progress.publish(job, percent, text, downloaded_bytes, total_bytes, eta)
+
+    def _ffmpeg_progress(self, job, verb):
+        """on_progress callback for JobMetrics.run_ffmpeg"""
+        def report(percent, speed, eta):
+            parts = [f"{percent:.1f}%" if percent is not None else '',
+                     f"{speed:.1f}x" if speed else '']
+            details = ', '.join(part for part in parts if part)
+            self._report(job, percent, f"{verb}... {details}" if details else f"{verb}...", eta=eta)
+        return report
+
+    def run(self, job):
+        """Run ``job`` to completion and return the output path."""
+        job.metrics = JobMetrics(job)
+        status = Job.FAILED
+        try:
+            if job.is_local:
+                job.outputs = self._process_local_clip(job)
+            elif job.kind == Job.SYNC:
+                job.outputs = self._sync_playlist(job)
+            else:
+                job.outputs = self._download_video(job)
+            job.output = job.outputs[0] if job.outputs else None
+            status = Job.DONE
+        except JobCancelled as e:
+            status = Job.CANCELLED
+            job.error = str(e)
+            if not job.is_local and not job.control.keep_partial:
+                self._remove_partial_downloads(job)
+            self._report(job, text="Cancelled")
+            raise
+        except DownloadError as e:
+            job.error = str(e)
+            raise
+        except Exception as e:
+            job.error = str(e)
+            raise DownloadError(str(e)) from e
+        finally:
+            if self.playlists is not None and job.kind == Job.DOWNLOAD:
+                self.playlists.job_finished(job, status)
+            job.metrics.finish(status)
+            if self.metrics is not None:
+                try:
+                    self.metrics.record(job.metrics)
+                except OSError as e:
+                    print(f"Could not write metrics: {e}")
+        return job.output
+
+    def _remove_partial_downloads(self, job):
+        # Output names carry the job's creation time, so these are this job's
+        marker = f"_{job.created}"
+        try:
+            names = os.listdir(job.save_path)
+        except OSError:
+            return
+        for name in names:
+            if marker in name and PARTIAL_DOWNLOAD_PATTERN.search(name):
+                try:
+                    os.remove(os.path.join(job.save_path, name))
+                except OSError as e:
+                    print(f"Could not remove {name}: {e}")
+
+    def _download_video(self, job):
+        import yt_dlp
+        from yt_dlp.utils import download_range_func
+
+        url, save_path = job.source, job.save_path
+        self._report(job, text=self._start_text(job, "Starting download...", "Downloading"))
+
+        # Get selected quality format string (AV1-excluded)
+        format_string = resolve_format(job.quality)
+
+        # Unique per job but stable across restarts, so an interrupted
+        # download resumes from its .part files instead of starting over
+        timestamp = job.created
+
+        ydl_opts = {
+            'format': format_string,
+            'merge_output_format': 'mp4',
+            'fragment_retries': FRAGMENT_RETRIES,
+            'retries': RETRIES,
+            # Back off between retries instead of hammering a throttling site
+            'retry_sleep_functions': {'http': retry_sleep, 'fragment': retry_sleep},
+            'writesubtitles': False,
+            'writeautomaticsub': False,
+            # Names are unique per job, so keep whatever a previous run of
+            # this job already finished and continue its .part files
+            'overwrites': False,
+            'continuedl': True,
+            'quiet': True,
+            'noprogress': True,
+        }
+        ffmpeg_path = get_ffmpeg_path()
+        if ffmpeg_path:
+            # Merge and cut with the same ffmpeg as everything else, which
+            # is not on PATH when it ships with the app
+            ydl_opts['ffmpeg_location'] = ffmpeg_path
+        if job.chapters:
+            # One extraction, one file per chapter marker
+            filename = f"%(title)s_%(section_number)02d_%(section_title)s_{timestamp}.%(ext)s"
+            ydl_opts['download_ranges'] = download_range_func(['.*'], [])
+            ydl_opts['force_keyframes_at_cuts'] = True
+        elif job.is_clip:
+            # Unique filename for clips with timestamp; all ranges share one extraction
+            filename = f"clip_%(section_start)ds_to_%(section_end)ds_{timestamp}.%(ext)s"
+            ydl_opts['download_ranges'] = download_range_func(None, job.ranges)
+            ydl_opts['force_keyframes_at_cuts'] = True
+        else:
+            # Unique filename for regular downloads with timestamp
+            filename = f"%(title)s_{timestamp}.%(ext)s"
+        ydl_opts['outtmpl'] = os.path.join(save_path, filename)
+
+        # Add progress hook
+        ydl_opts['progress_hooks'] = [lambda d: self._progress_hook(job, d)]
+        # Time every post-processor (merge, AAC transcode) as its own stage
+        ydl_opts['postprocessor_hooks'] = [lambda d: self._postprocessor_hook(job, d)]
+        ydl_opts['logger'] = YtdlpLogger(job.metrics)
+
+        concurrency = self.fragment_tuner.start(job.key, (urlparse(url).hostname or '').lower())
+        throttle = self.bandwidth.register(job, job.rate_limit)
+        try:
+            with self.ydl_pool.session(ydl_opts) as ydl:
+                # yt-dlp reads the thread count when each stream or section
+                # starts, so a new level takes effect at the next boundary
+                concurrency.apply(ydl.params)
+                ydl.add_progress_hook(lambda d: self._tune_fragments(job, concurrency, ydl, d))
+                # Sleeping in the hook holds back the thread that read the bytes
+                ydl.add_progress_hook(lambda d: d['status'] == 'downloading' and
+                                      throttle.observe(d.get('filename'), d.get('downloaded_bytes')))
+                info, cached = self._extract_info(ydl, url, job.metrics)
+                try:
+                    outputs = self._download_info(ydl, job, info)
+                except yt_dlp.utils.DownloadError:
+                    if not cached:
+                        raise
+                    # Format URLs in the cached info may have been revoked early
+                    self.info_cache.invalidate(url)
+                    outputs = self._download_info(ydl, job, self._extract_info(ydl, url, job.metrics)[0])
+        finally:
+            concurrency.close()
+            self.bandwidth.unregister(job)
+
+        self._report(job, 100, "Download completed!")
+        return outputs or [save_path]
+
+    def _extract_info(self, ydl, url, metrics):
+        """Return (info, came_from_cache) for ``url`` without downloading"""
+        with metrics.stage('extract'):
+            if self.info_cache is not None:
+                info = self.info_cache.get(url)
+                if info is not None:
+                    metrics.info_cache_hit = True
+                    return info, True
+            info = ydl.extract_info(url, download=False, process=False)
+            metrics.info_cache_hit = False
+            if self.info_cache is not None and info and info.get('_type', 'video') == 'video':
+                self.info_cache.put(url, ydl.sanitize_info(copy.deepcopy(info)))
+            return info, False
+
+    def _download_info(self, ydl, job, info):
+        # Let yt-dlp pick the formats without downloading, check the archive,
+        # decide whether the merge needs an AAC transcode, then download the
+        # same extraction.
+        metrics = job.metrics
+        with metrics.stage('select'):
+            self._rank_formats(ydl, job, info)
+            selected = ydl.process_ie_result(copy.deepcopy(info), download=False)
+
+        archive_key = self.archive.download_key(selected, job) if self.archive else None
+        if archive_key:
+            with metrics.stage('archive'):
+                outputs = self.archive.reuse(archive_key, job.save_path)
+            if outputs:
+                self._report(job, text="Already downloaded, reusing the existing file...")
+                return outputs
+
+        # Force AAC audio only when the source audio can't go into mp4 as-is (fixes 720p Opus issue)
+        with metrics.stage('probe'):
+            audio_args = self.audio_probe.args_for_formats(selected or {})
+
+        # Fast and smart clips seek inside the remote file instead of having
+        # yt-dlp fetch and re-encode the sections
+        outputs = None
+        if job.is_clip and not job.chapters and job.cut_mode != cutting.COPY:
+            outputs = self._remote_clip(job, selected or {}, audio_args)
+            if outputs is None:
+                outputs = self._fragment_clip(ydl, job, selected or {}, audio_args)
+        elif self.stream_merge and not job.is_clip and not job.chapters:
+            outputs = self._stream_merge(ydl, job, selected or {}, audio_args)
+        if outputs:
+            if archive_key:
+                with metrics.stage('archive'):
+                    self.archive.add(archive_key, outputs)
+            return outputs
+
+        ydl.params['postprocessor_args'] = {'ffmpeg': ['-c:v', 'copy'] + audio_args}
+        job.control.checkpoint()
+        with metrics.stage('download'):
+            info = ydl.process_ie_result(copy.deepcopy(info), download=True)
+
+        downloads = (info or {}).get('requested_downloads') or []
+        outputs = [d['filepath'] for d in downloads if d.get('filepath')]
+        if archive_key and outputs:
+            with metrics.stage('archive'):
+                self.archive.add(archive_key, outputs)
+        return outputs
+
+    def _rank_formats(self, ydl, job, info):
+        """Replace a preset's format string with the formats ranked best for
+        this video (see ranking.py)"""
+        if job.quality not in RANKED_PRESETS or not info or info.get('_type', 'video') != 'video':
+            return
+        choice = ranking.rank(info.get('formats') or [], RANKED_PRESETS[job.quality])
+        if choice is None:
+            return
+        # The preset's own string still applies if yt-dlp drops these formats
+        spec = f"{choice.spec}/{resolve_format(job.quality)}"
+        ydl.params['format'] = spec
+        ydl.format_selector = ydl.build_format_selector(spec)
+        job.formats = job.metrics.formats = choice.to_dict()
+        self._report(job, text=f"Formats {choice.spec}: {'; '.join(choice.reasons)}")
+
+    def _remote_clip(self, job, selected, audio_args):
+        """Cut the clip ranges from the remote format URLs with ranged reads.
+
+        Returns the output paths, or None when the formats are not plain
+        HTTP(S) files (HLS) or the remote cut fails, so the caller falls
+        back to yt-dlp.
+        """
+        formats = remote.direct_formats(selected)
+        ffmpeg_path = get_ffmpeg_path()
+        ffprobe_path = get_ffprobe_path()
+        if not formats or not ffmpeg_path or (job.cut_mode == cutting.SMART and not ffprobe_path):
+            return None
+        video = next((fmt for fmt in formats if remote.has_video(fmt)), None)
+
+        metrics = job.metrics
+        outputs = []
+        part_path = None
+        try:
+            for number, (start_time, end_time) in enumerate(job.ranges):
+                self._report(job, number * 100 / len(job.ranges),
+                             f"Fetching clip {number + 1} of {len(job.ranges)} ({start_time}s to {end_time}s)...")
+                output_path = unique_path(job.save_path, f"clip_{int(start_time)}s_to_{int(end_time)}s_{job.created}",
+                                          '.mp4', outputs)
+                stem, ext = os.path.splitext(output_path)
+                part_path = f"{stem}.part{ext}"
+                with metrics.stage('keyframes'):
+                    keyframe = start_time
+                    if video is not None and ffprobe_path:
+                        keyframe = remote.keyframe_before(ffprobe_path, video, start_time)
+
+                with metrics.stage('remote_clip'):
+                    if job.cut_mode == cutting.SMART:
+                        self._remote_smart_clip(
+                            job, lambda fetched: remote.fetch_command(ffmpeg_path, formats, keyframe, end_time,
+                                                                      fetched, probe.COPY_AUDIO_ARGS),
+                            keyframe, start_time, end_time, part_path, ffmpeg_path, ffprobe_path, audio_args)
+                    else:
+                        cutting.run_ffmpeg(remote.fetch_command(ffmpeg_path, formats, keyframe, end_time,
+                                                                part_path, audio_args), metrics)
+                os.replace(part_path, output_path)
+                outputs.append(output_path)
+        except JobCancelled:
+            for path in outputs + [part_path]:
+                if path and os.path.exists(path):
+                    os.remove(path)
+            raise
+        except (RuntimeError, OSError, ValueError) as e:
+            # ffmpeg or ffprobe failed, or the keyframe scan got no usable answer
+            self._report(job, text=f"Remote clip failed, falling back to a full section download: {e}")
+            for path in outputs + [part_path]:
+                try:
+                    if path:
+                        os.remove(path)
+                except OSError:
+                    pass
+            return None
+
+        self._report(job, 100, "Download completed!")
+        return outputs
+
+    def _remote_smart_clip(self, job, fetch_command, keyframe, start_time, end_time, output_path,
+                           ffmpeg_path, ffprobe_path, audio_args):
+        # Fetch the keyframe-aligned piece losslessly (``fetch_command(path)``
+        # builds the ffmpeg command), then cut it frame accurately on disk;
+        # only the partial GOPs at the edges get re-encoded
+        workdir = tempfile.mkdtemp(prefix='.smartcut_', dir=job.save_path)
+        try:
+            fetched = os.path.join(workdir, 'source.mkv')
+            cutting.run_ffmpeg(fetch_command(fetched), job.metrics)
+            # A scratch index: the fetched file is deleted right after
+            index = KeyframeIndex(ffprobe_path, workdir)
+            with self._encode_workers() as workers:
+                cutting.smart_cut(ffmpeg_path, fetched, start_time - keyframe, end_time - keyframe,
+                                  output_path, index, probe.video_stream(ffprobe_path, fetched), workdir,
+                                  audio_args, job.metrics, toolchain.get(), workers)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _fragment_clip(self, ydl, job, selected, audio_args):
+        """Cut the clip ranges from only the HLS/DASH fragments that cover them.
+
+        Returns the output paths, or None when the formats are not
+        fragmented, their playlists need yt-dlp (encryption, byte ranges) or
+        the cut fails, so the caller falls back to yt-dlp's section download.
+        """
+        formats = remote.fragmented_formats(selected)
+        ffmpeg_path = get_ffmpeg_path()
+        ffprobe_path = get_ffprobe_path()
+        if not formats or not ffmpeg_path or (job.cut_mode == cutting.SMART and not ffprobe_path):
+            return None
+
+        metrics = job.metrics
+        outputs = []
+        part_path = None
+        workdir = tempfile.mkdtemp(prefix='.fragments_', dir=job.save_path)
+        try:
+            with metrics.stage('fragments'):
+                listings = [self._fragment_listing(ydl, fmt) for fmt in formats]
+            if None in listings:
+                return None
+            for number, (start_time, end_time) in enumerate(job.ranges):
+                self._report(job, number * 100 / len(job.ranges),
+                             f"Fetching clip {number + 1} of {len(job.ranges)} ({start_time}s to {end_time}s)...")
+                output_path = unique_path(job.save_path, f"clip_{int(start_time)}s_to_{int(end_time)}s_{job.created}",
+                                          '.mp4', outputs)
+                stem, ext = os.path.splitext(output_path)
+                part_path = f"{stem}.part{ext}"
+
+                # Video fragments start on keyframes; every format is fetched
+                # from the first video fragment so the streams line up
+                fetch_start = start_time
+                for fmt, (_, fragments) in zip(formats, listings):
+                    chosen = remote.covering(fragments, start_time, end_time)
+                    if remote.has_video(fmt) and chosen:
+                        fetch_start = min(fetch_start, chosen[0].start)
+                pieces = []
+                with metrics.stage('fragments'):
+                    for index, (fmt, (init, fragments)) in enumerate(zip(formats, listings)):
+                        chosen = remote.covering(fragments, fetch_start, end_time)
+                        if not chosen:
+                            raise RuntimeError(f"No fragments of format {fmt.get('format_id')} "
+                                               f"cover {start_time}s to {end_time}s")
+                        path = os.path.join(workdir, f"format_{index}.{fmt.get('ext') or 'mp4'}")
+                        self._fetch_fragments(ydl, job, selected, fmt, init, chosen, path)
+                        pieces.append((fmt, path, chosen[0].start))
+
+                with metrics.stage('remote_clip'):
+                    if job.cut_mode == cutting.SMART:
+                        self._remote_smart_clip(
+                            job, lambda fetched: remote.fragment_cut_command(ffmpeg_path, pieces, fetch_start,
+                                                                             end_time, fetched,
+                                                                             probe.COPY_AUDIO_ARGS),
+                            fetch_start, start_time, end_time, part_path, ffmpeg_path, ffprobe_path, audio_args)
+                    else:
+                        cutting.run_ffmpeg(remote.fragment_cut_command(ffmpeg_path, pieces, start_time, end_time,
+                                                                       part_path, audio_args), metrics)
+                os.replace(part_path, output_path)
+                outputs.append(output_path)
+        except JobCancelled:
+            for path in outputs + [part_path]:
+                if path and os.path.exists(path):
+                    os.remove(path)
+            raise
+        except (RuntimeError, OSError, ValueError) as e:
+            self._report(job, text=f"Fragment clip failed, falling back to a full section download: {e}")
+            for path in outputs + [part_path]:
+                try:
+                    if path:
+                        os.remove(path)
+                except OSError:
+                    pass
+            return None
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self._report(job, 100, "Download completed!")
+        return outputs
+
+    def _fragment_listing(self, ydl, fmt):
+        """(init URL, [remote.Fragment]) of a fragmented format, None if yt-dlp has to handle it"""
+        if fmt.get('protocol') == 'http_dash_segments':
+            return remote.dash_fragments(fmt)
+        playlist = self._fetch_url(ydl, fmt, fmt['url']).decode('utf-8', 'replace')
+        return remote.hls_fragments(playlist, fmt['url'])
+
+    def _fetch_fragments(self, ydl, job, info, fmt, init, fragments, path):
+        """Join the init segment and ``fragments`` of ``fmt`` into ``path``.
+
+        Cached fragments are copied from disk; the others are fetched in
+        parallel (as many at once as yt-dlp's fragment threads for this
+        job) and added to the cache.  The fetch threads only share
+        ``ydl.urlopen()``, which is safe across threads (see ydlpool.py).
+        """
+        cache = self.fragment_cache
+        entries = ([('init', init)] if init else []) + [(fragment.number, fragment.url) for fragment in fragments]
+        keys = [fragcache.fragment_key(info, fmt, number, url) for number, url in entries]
+        workers = max(1, ydl.params.get('concurrent_fragment_downloads') or 1)
+        fetched = 0
+        job.metrics.observe_download(path, 0)
+        with open(path, 'wb') as out, concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            # Cache lookups happen again while writing: a fragment evicted
+            # in between is simply fetched then
+            futures = [pool.submit(self._fetch_url, ydl, fmt, url, job)
+                       if cache is None or not cache.contains(key) else None
+                       for (_, url), key in zip(entries, keys)]
+            try:
+                for number, ((_, url), key, future) in enumerate(zip(entries, keys, futures)):
+                    job.control.checkpoint()
+                    if future is None and cache.copy_to(key, out):
+                        continue
+                    data = future.result() if future is not None else self._fetch_url(ydl, fmt, url, job)
+                    out.write(data)
+                    if cache is not None:
+                        cache.put(key, data)
+                    fetched += len(data)
+                    job.metrics.observe_download(path, fetched)
+            except BaseException:
+                for future in futures:
+                    if future is not None:
+                        future.cancel()
+                raise
+
+    def _fetch_url(self, ydl, fmt, url, job=None):
+        """GET ``url`` with the format's headers through yt-dlp's network
+        stack, retrying server and network errors"""
+        from yt_dlp.networking import Request
+        from yt_dlp.networking.exceptions import HTTPError, RequestError
+
+        attempt = 0
+        while True:
+            if job is not None:
+                job.control.checkpoint()
+            try:
+                with ydl.urlopen(Request(url, headers=fmt.get('http_headers') or {})) as response:
+                    return response.read()
+            except RequestError as e:
+                permanent = isinstance(e, HTTPError) and e.status < 500 and e.status != 429
+                if permanent or attempt >= FRAGMENT_RETRIES:
+                    raise RuntimeError(f"Could not fetch {url.split('?', 1)[0]}: {e}") from e
+                if job is not None:
+                    job.metrics.add_retry()
+                time.sleep(retry_sleep(attempt))
+                attempt += 1
+
+    def _stream_merge(self, ydl, job, selected, audio_args):
+        """Download separate video and audio formats straight into one
+        merged file with a single ffmpeg (see streammerge.py).
+
+        Returns the output paths, or None when there is nothing to merge,
+        the formats are not plain HTTP(S) files or the merge fails, so the
+        caller falls back to yt-dlp's download and merge.
+        """
+        formats = remote.direct_formats(selected)
+        ffmpeg_path = get_ffmpeg_path()
+        if not formats or len(formats) < 2 or not ffmpeg_path:
+            return None
+        output_path = ydl.prepare_filename(selected)
+        if os.path.exists(output_path):
+            # Finished by an earlier run of this job
+            return [output_path]
+
+        metrics = job.metrics
+        with metrics.stage('probe'):
+            sizes = [self._remote_size(ydl, fmt, job) for fmt in formats]
+        if None in sizes:
+            return None
+        # Written next to the output, so the rename is atomic
+        stem, ext = os.path.splitext(output_path)
+        part_path = f"{stem}.temp{ext}"
+        throttle = self.bandwidth.throttle(job)
+        # Bytes read again after ffmpeg seeks back are only counted once
+        served = [streammerge.ServedRanges() for _ in formats]
+        served_lock = threading.Lock()
+
+        def fetch(number, start, end, write):
+            position = [start]
+
+            def forward(block):
+                write(block)
+                with served_lock:
+                    served[number].add(position[0], position[0] + len(block))
+                    total = served[number].total
+                position[0] += len(block)
+                metrics.observe_download(f"stream{number}", total)
+                if throttle is not None:
+                    throttle.consume(len(block))
+            self._fetch_range(ydl, formats[number], start, end, forward, job)
+
+        for number in range(len(formats)):
+            metrics.observe_download(f"stream{number}", 0)
+        self._report(job, 0, "Downloading and merging...")
+        try:
+            with streammerge.StreamProxy(sizes, fetch) as proxy, metrics.stage('stream_merge'):
+                cmd = remote.merge_command(ffmpeg_path, formats, [proxy.url(n) for n in range(len(formats))],
+                                           part_path, audio_args)
+                returncode, stderr = metrics.run_ffmpeg(cmd, selected.get('duration'),
+                                                        self._ffmpeg_progress(job, "Downloading and merging"))
+            # A failed fetch looks like a short input to ffmpeg
+            if proxy.error is not None:
+                raise RuntimeError(str(proxy.error))
+            if returncode != 0:
+                raise RuntimeError(stderr)
+            os.replace(part_path, output_path)
+        except JobCancelled:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        except RuntimeError as e:
+            self._report(job, text=f"Streaming merge failed, falling back to a separate download and merge: {e}")
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            return None
+        return [output_path]
+
+    def _remote_size(self, ydl, fmt, job):
+        """Length in bytes of a remote format, or None if the server won't say"""
+        from yt_dlp.networking import Request
+        from yt_dlp.networking.exceptions import HTTPError, RequestError
+
+        if fmt.get('filesize'):
+            return fmt['filesize']
+        headers = dict(fmt.get('http_headers') or {}, Range='bytes=0-0')
+        attempt = 0
+        while True:
+            job.control.checkpoint()
+            try:
+                with ydl.urlopen(Request(fmt['url'], headers=headers)) as response:
+                    match = re.search(r'/(\d+)$', response.headers.get('Content-Range') or '')
+                return int(match.group(1)) if match else None
+            except RequestError as e:
+                permanent = isinstance(e, HTTPError) and e.status < 500 and e.status != 429
+                if permanent or attempt >= FRAGMENT_RETRIES:
+                    return None
+                job.metrics.add_retry()
+                time.sleep(retry_sleep(attempt))
+                attempt += 1
+
+    def _fetch_range(self, ydl, fmt, start, end, write, job):
+        """Pass bytes ``start``..``end`` of a format to ``write`` as they
+        arrive, fetched in ranged chunks through yt-dlp's network stack.
+        Server and network errors resume from the last byte written."""
+        from yt_dlp.networking import Request
+        from yt_dlp.networking.exceptions import HTTPError, RequestError, TransportError
+
+        chunk_size = (fmt.get('downloader_options') or {}).get('http_chunk_size') or STREAM_CHUNK_SIZE
+        attempt = 0
+        while start <= end:
+            job.control.checkpoint()
+            chunk_end = min(start + chunk_size - 1, end)
+            headers = dict(fmt.get('http_headers') or {}, Range=f"bytes={start}-{chunk_end}")
+            try:
+                with ydl.urlopen(Request(fmt['url'], headers=headers)) as response:
+                    if response.status == 200:
+                        if start:
+                            raise RuntimeError("The server does not support ranged requests")
+                        # The whole file comes in one response
+                        chunk_end = end
+                    while start <= chunk_end:
+                        block = response.read(min(STREAM_BLOCK_SIZE, chunk_end + 1 - start))
+                        if not block:
+                            raise TransportError("Connection closed early")
+                        write(block)
+                        start += len(block)
+                attempt = 0
+            except RequestError as e:
+                permanent = isinstance(e, HTTPError) and e.status < 500 and e.status != 429
+                if permanent or attempt >= FRAGMENT_RETRIES:
+                    raise RuntimeError(f"Could not fetch {fmt['url'].split('?', 1)[0]}: {e}") from e
+                job.metrics.add_retry()
+                time.sleep(retry_sleep(attempt))
+                attempt += 1
+
+    def _sync_playlist(self, job):
+        """List a playlist or channel and queue the entries not downloaded yet"""
+        if self.playlists is None:
+            raise DownloadError("Playlist sync needs a playlist index")
+        self._report(job, text="Checking playlist for new videos...")
+        ydl_opts = {
+            'extract_flat': 'in_playlist',
+            'lazy_playlist': True,
+            'quiet': True,
+            'noprogress': True,
+            'logger': YtdlpLogger(job.metrics),
+        }
+        with self.ydl_pool.session(ydl_opts) as ydl, job.metrics.stage('list'):
+            try:
+                key, title, entries = playlists.sync(ydl, job.source, self.playlists)
+            except ValueError as e:
+                raise DownloadError(str(e))
+
+        job.control.checkpoint()
+        folder = os.path.join(job.save_path, safe_filename(title)) if title else job.save_path
+        os.makedirs(folder, exist_ok=True)
+        children = []
+        for entry in entries:
+            child = Job(Job.DOWNLOAD, entry.url, folder, job.quality, priority=job.priority,
+                        rate_limit=job.rate_limit)
+            child.batch = children
+            self.playlists.queued(key, entry.video_id, entry.url, entry.title, entry.duration, child)
+            children.append(child)
+        job.children = children
+
+        self._report(job, 100, f"{len(children)} new video(s) queued" if children
+                     else "Playlist is up to date")
+        return [folder]
+
+    def _start_text(self, job, download_text, verb):
+        if not job.is_clip:
+            return download_text
+        if job.chapters:
+            return f"{verb} chapters..."
+        if len(job.ranges) > 1:
+            return f"{verb} {len(job.ranges)} clips..."
+        return f"{verb} clip ({job.start_time}s to {job.end_time}s)..."
+
+    def _process_local_clip(self, job):
+        file_path, save_path = job.source, job.save_path
+        self._report(job, 0, self._start_text(job, "Converting...", "Processing"))
+
+        # Get FFmpeg path from bundled executable
+        ffmpeg_path = get_ffmpeg_path()
+        if not ffmpeg_path:
+            raise DownloadError("FFmpeg not found! Please make sure ffmpeg.exe is in the same folder as this app.")
+
+        metrics = job.metrics
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        if job.chapters:
+            with metrics.stage('probe'):
+                chapters = probe.chapters(get_ffprobe_path(), file_path)
+            if not chapters:
+                raise DownloadError("No chapter markers found in this file")
+            ranges = [(chapter.start, chapter.end) for chapter in chapters]
+            names = [f"{base_name}_{chapter.index:02d}_{safe_filename(chapter.title)}"
+                     for chapter in chapters]
+        elif job.kind == Job.CONVERT:
+            ranges = []
+            names = [base_name]
+        else:
+            ranges = job.ranges
+            names = [f"{base_name}_clip_{start}s_to_{end}s" for start, end in ranges]
+
+        # Generate unique filenames for local clips to prevent overwrites
+        timestamp = job.created
+        output_paths = []
+        for name in names:
+            output_paths.append(unique_path(save_path, f"{name}_{timestamp}", '.mp4', output_paths))
+
+        with metrics.stage('probe'):
+            audio_args = self.audio_probe.args_for_file(file_path)
+        archive_key = None
+        if self.archive:
+            with metrics.stage('archive'):
+                archive_key = self.archive.local_key(file_path, job, audio_args)
+                outputs = self.archive.reuse(archive_key, save_path)
+            if outputs:
+                self._report(job, 100, "Identical clip already exists, reusing it!")
+                return outputs
+
+        try:
+            self._cut_local(job, ffmpeg_path, ranges, output_paths, audio_args)
+        except JobCancelled:
+            # Half-written clips are of no use to anyone
+            for output_path in output_paths:
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+            raise
+
+        if archive_key:
+            with metrics.stage('archive'):
+                self.archive.add(archive_key, output_paths)
+
+        if job.kind == Job.CONVERT:
+            self._report(job, 100, "Converted successfully!")
+        else:
+            self._report(job, 100, "Clip created successfully!" if len(output_paths) == 1
+                         else f"{len(output_paths)} clips created successfully!")
+        return output_paths
+
+    def _cut_local(self, job, ffmpeg_path, ranges, output_paths, audio_args):
+        file_path, metrics = job.source, job.metrics
+        if job.kind != Job.CONVERT and job.cut_mode == cutting.SMART:
+            with metrics.stage('probe'):
+                video_stream = probe.video_stream(get_ffprobe_path(), file_path)
+            with metrics.stage('cut'):
+                for number, ((start_time, end_time), output_path) in enumerate(zip(ranges, output_paths)):
+                    if len(ranges) > 1:
+                        self._report(job, number * 100 / len(ranges),
+                                     f"Cutting clip {number + 1} of {len(ranges)}...")
+                    workdir = tempfile.mkdtemp(prefix='.smartcut_', dir=job.save_path)
+                    try:
+                        with self._encode_workers() as workers:
+                            cutting.smart_cut(ffmpeg_path, file_path, start_time, end_time, output_path,
+                                              self.keyframe_index(), video_stream, workdir, audio_args,
+                                              metrics, toolchain.get(), workers)
+                    finally:
+                        shutil.rmtree(workdir, ignore_errors=True)
+            return
+
+        if job.kind == Job.CONVERT:
+            cmd = cutting.convert_command(ffmpeg_path, file_path, output_paths[0], audio_args)
+            with metrics.stage('probe'):
+                duration = probe.duration(get_ffprobe_path(), file_path)
+            verb = "Converting"
+        else:
+            if job.cut_mode == cutting.FAST:
+                with metrics.stage('keyframes'):
+                    cmd = cutting.fast_cut_command(ffmpeg_path, file_path, ranges, output_paths,
+                                                   self.keyframe_index(), audio_args)
+            else:
+                cmd = cutting.copy_cut_command(ffmpeg_path, file_path, ranges, output_paths,
+                                               audio_args)
+            # All outputs are written side by side, so the longest one
+            # decides how far along ffmpeg is
+            duration = max(end_time - start_time for start_time, end_time in ranges)
+            verb = "Cutting"
+
+        with metrics.stage('cut'):
+            returncode, stderr = metrics.run_ffmpeg(cmd, duration, self._ffmpeg_progress(job, verb))
+        if returncode != 0:
+            raise DownloadError(stderr)
+
+    def _tune_fragments(self, job, concurrency, ydl, d):
+        if concurrency.observe(d, job.metrics.retries):
+            concurrency.apply(ydl.params)
+
+    def _postprocessor_hook(self, job, d):
+        stage = f"postprocess:{d.get('postprocessor')}"
+        if d['status'] == 'started':
+            job.control.checkpoint()
+            job.metrics.begin(stage)
+        elif d['status'] == 'finished':
+            job.metrics.end(stage)
+
+    def _progress_hook(self, job, d):
+        # Runs on the thread that read the data: blocking here pauses the
+        # download, raising ends it
+        job.control.checkpoint()
+        if d['status'] == 'downloading':
+            downloaded = d.get('downloaded_bytes')
+            job.metrics.observe_download(d.get('filename'), downloaded)
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            if d.get('total_bytes'):
+                progress = (d['downloaded_bytes'] / d['total_bytes']) * 100
+                self._report(job, progress, f"Downloading... {progress:.1f}%", downloaded, total)
+            elif '_percent_str' in d:
+                percent_str = d['_percent_str'].replace('%', '').strip()
+                try:
+                    progress = float(percent_str)
+                    self._report(job, progress, f"Downloading... {progress:.1f}%", downloaded, total)
+                except:
+                    self._report(job, text="Downloading...", downloaded_bytes=downloaded, total_bytes=total)
@@ -0,0 +1,148 @@
+"""Size-bounded on-disk cache of HLS/DASH media fragments.
+
+Clips from fragmented formats fetch only the fragments that cover them
+(see remote.py), and every fragment goes through this cache first.  Several
+clips from one video, or the same video cut again at another range, read
+the fragments they share from disk instead of the network.
+
+Fragments are keyed by what they contain, not by their URL: the video,
+the format and the fragment's position in it.  Signed URLs change with
+every extraction, but the key stays the same.
+
+The cache is a folder of files plus a SQLite index with sizes and last-use
+times.  When the total goes over the limit the least recently used
+fragments are evicted.  Files are written under a temporary name and
+renamed into place, and readers open a fragment before copying it.  So
+concurrent readers and several processes sharing one data folder only
+ever see complete fragments; a fragment evicted while it is being read is
+still read to the end on POSIX, and skipped until the next eviction on
+Windows, where an open file cannot be removed.
+"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+from .paths import cache_dir
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+# Fragments evicted per round; the index is checked again afterwards
+EVICT_BATCH = 64
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS fragments (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fragments_used ON fragments (used);
+'''
+
+
+def default_folder():
+    return cache_dir('fragments')
+
+
+def fragment_key(info, fmt, number, url):
+    """Stable key of one fragment of ``fmt`` (a format of video ``info``)"""
+    # The path identifies the fragment; the query string usually only
+    # carries expiring signatures
+    identity = '|'.join([
+        str(info.get('extractor_key') or info.get('extractor') or ''),
+        str(info.get('id') or info.get('webpage_url') or ''),
+        str(fmt.get('format_id') or ''),
+        str(number),
+        url.split('?', 1)[0],
+    ])
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+
+class FragmentCache:
+    def __init__(self, folder, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(folder, 'index.sqlite3'), check_same_thread=False,
+                                   isolation_level=None, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+
+    def _path(self, key):
+        return os.path.join(self.folder, key[:2], key)
+
+    def contains(self, key):
+        return os.path.exists(self._path(key))
+
+    def copy_to(self, key, out):
+        """Append the cached fragment to the open file ``out``; False on a miss"""
+        try:
+            with open(self._path(key), 'rb') as f:
+                with self._lock:
+                    updated = self._db.execute('UPDATE fragments SET used = ? WHERE key = ?',
+                                               (time.time(), key)).rowcount
+                if not updated:
+                    # Half-evicted or left over from a crash
+                    return self._miss()
+                shutil.copyfileobj(f, out)
+        except FileNotFoundError:
+            return self._miss()
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def _miss(self):
+        with self._lock:
+            self.misses += 1
+        return False
+
+    def put(self, key, data):
+        """Store a fragment's bytes and evict old fragments if over the limit"""
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO fragments VALUES (?, ?, ?)', (key, len(data), time.time()))
+        self._evict()
+
+    def size(self):
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM fragments').fetchone()[0]
+
+    def _evict(self):
+        excess = self.size() - self.max_bytes
+        while excess > 0:
+            with self._lock:
+                rows = self._db.execute('SELECT key, size FROM fragments ORDER BY used LIMIT ?',
+                                        (EVICT_BATCH,)).fetchall()
+            removed = False
+            for key, size in rows:
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    # Being read on Windows; try again next time
+                    continue
+                with self._lock:
+                    self._db.execute('DELETE FROM fragments WHERE key = ?', (key,))
+                removed = True
+                excess -= size
+                if excess <= 0:
+                    return
+            if not removed:
+                return
+
+    def close(self):
+        with self._lock:
+            self._db.close()
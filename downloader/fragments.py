@@ -0,0 +1,170 @@
+"""Adaptive fragment concurrency for HLS/DASH downloads.
+
+yt-dlp downloads the fragments of one stream with a fixed number of
+threads (``concurrent_fragment_downloads``): it sizes its thread pool when
+the stream starts and keeps it until the stream is complete, with no hook
+to resize it.  Adaptation is therefore per stream, not per fragment batch.
+After every fragmented stream the tuner looks at the throughput and the
+retry rate, climbs while more threads still pay off and backs off when the
+site starts throttling.  The next stream of the job (the audio after the
+video, the next clip section or chapter) uses the new level, and the level
+is remembered per host so the next job starts where the last one ended.
+A job with a single stream, such as a muxed HLS download, runs at its
+starting level from start to finish; it is the per-host level that lets
+the following jobs start higher or lower.
+
+All running jobs share one ``FragmentBudget``.  Its grants add up to at
+most the budget, except that every job gets at least one thread, so more
+jobs than the budget get one each.  yt-dlp can't change the thread count of
+a stream that is already running, though: a job picks up its new grant
+(smaller when another job has joined, larger when one has left) at its
+next stream or clip boundary, and until then the jobs together may use
+more threads than the budget.
+"""
+import math
+import threading
+
+DEFAULT_BUDGET = 32
+MIN_WORKERS = 1
+MAX_WORKERS = 16
+INITIAL_WORKERS = 4
+
+# Retries per fragment above which a stream counts as throttled
+ERROR_RATE_LIMIT = 0.05
+# A step up must improve throughput by at least this much to be kept
+MIN_GAIN = 1.10
+
+
+def retry_sleep(attempt):
+    """Exponential backoff for yt-dlp's ``retry_sleep_functions``"""
+    return min(2 ** attempt, 30)
+
+
+class FragmentBudget:
+    """Max-min fair split of a global fragment-thread budget across jobs"""
+
+    def __init__(self, total=DEFAULT_BUDGET):
+        self.total = total
+        self._wanted = {}
+        self._lock = threading.Lock()
+
+    def request(self, owner, wanted):
+        """Register that ``owner`` wants ``wanted`` threads; return its grant"""
+        with self._lock:
+            self._wanted[owner] = max(1, wanted)
+            return self._allocate()[owner]
+
+    def grant(self, owner):
+        """Current grant of ``owner``, which changes as other jobs come and go"""
+        with self._lock:
+            return self._allocate().get(owner, 1)
+
+    def release(self, owner):
+        with self._lock:
+            self._wanted.pop(owner, None)
+
+    def _allocate(self):
+        # Water-filling: jobs that want less than an equal share get what
+        # they want, the rest split what is left.  Everyone gets at least 1.
+        allocation = {}
+        remaining = self.total
+        pending = sorted(self._wanted.items(), key=lambda item: item[1])
+        while pending:
+            share = max(1, remaining // len(pending))
+            owner, wanted = pending.pop(0)
+            allocation[owner] = min(wanted, share)
+            remaining -= allocation[owner]
+        return allocation
+
+
+class ConcurrencyTuner:
+    def __init__(self, budget=None, minimum=MIN_WORKERS, maximum=MAX_WORKERS, initial=INITIAL_WORKERS):
+        self.budget = budget or FragmentBudget()
+        self.minimum = minimum
+        self.maximum = maximum
+        self.initial = initial
+        self._levels = {}
+        self._lock = threading.Lock()
+
+    def start(self, owner, host):
+        with self._lock:
+            workers = self._levels.get(host, self.initial)
+        return JobConcurrency(self, owner, host, workers)
+
+    def _remember(self, host, workers):
+        with self._lock:
+            self._levels[host] = workers
+
+
+class JobConcurrency:
+    """Concurrency state of one running job"""
+
+    def __init__(self, tuner, owner, host, workers):
+        self.tuner = tuner
+        self.owner = owner
+        self.host = host
+        self.wanted = workers
+        self.workers = tuner.budget.request(owner, workers)
+        self._previous = None
+        self._plateau = False
+        self._streams = {}
+
+    def apply(self, params):
+        params['concurrent_fragment_downloads'] = self.workers
+
+    def observe(self, d, retries):
+        """Feed a yt-dlp progress dict; ``retries`` is the job's retry count so far.
+
+        Returns True when the level changed and should be applied.
+        """
+        filename = d.get('filename')
+        if d['status'] == 'downloading':
+            # Only fragmented (HLS/DASH) streams report a fragment count
+            if d.get('fragment_count') and filename not in self._streams:
+                self._streams[filename] = (retries, d['fragment_count'])
+            return False
+        if d['status'] != 'finished':
+            return False
+        if filename not in self._streams:
+            # Not a fragmented stream, but still a boundary
+            return self._refresh()
+
+        retries_before, fragments = self._streams.pop(filename)
+        elapsed = d.get('elapsed') or 0
+        if elapsed <= 0 or not d.get('downloaded_bytes'):
+            return self._refresh()
+        rate = d['downloaded_bytes'] / elapsed
+        return self._adjust(rate, (retries - retries_before) / fragments)
+
+    def _refresh(self):
+        # Pick up a grant that changed as other jobs started or finished
+        workers = self.tuner.budget.grant(self.owner)
+        changed = workers != self.workers
+        self.workers = workers
+        return changed
+
+    def _adjust(self, rate, error_rate):
+        tuner = self.tuner
+        wanted = self.wanted
+        if error_rate > ERROR_RATE_LIMIT:
+            # Throttled: back off hard and start climbing again later
+            wanted = max(tuner.minimum, wanted // 2)
+            self._plateau = False
+        elif self._previous is not None and self.workers > self._previous[0] and \
+                rate < self._previous[1] * MIN_GAIN:
+            # The last step up did not pay off: go back and stay there
+            wanted = self._previous[0]
+            self._plateau = True
+        elif not self._plateau:
+            wanted = min(tuner.maximum, max(wanted + 1, math.ceil(wanted * 1.5)))
+        self._previous = (self.workers, rate)
+
+        self.wanted = wanted
+        workers = tuner.budget.request(self.owner, wanted)
+        changed = workers != self.workers
+        self.workers = workers
+        return changed
+
+    def close(self):
+        self.tuner.budget.release(self.owner)
+        self.tuner._remember(self.host, self.wanted)
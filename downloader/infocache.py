@@ -0,0 +1,143 @@
+"""On-disk cache of yt-dlp extraction results.
+
+Cutting a fifth clip from the same video should not repeat the page fetch,
+player parsing and format listing.  Entries are keyed by a normalized URL,
+expire after a TTL or shortly before the signed format URLs inside them
+stop working (YouTube's ``expire=`` parameter), and the folder is kept
+under a size limit by evicting the least recently used entries.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+# Query parameters that never change what gets extracted
+IGNORED_PARAMS = {'t', 'si', 'feature', 'pp', 'ab_channel', 'start', 'usp'}
+
+YOUTUBE_ID_PATTERNS = [
+    re.compile(r'^(?:www\.|m\.|music\.)?youtube(?:-nocookie)?\.com/(?:shorts|embed|live|v)/([\w-]{11})'),
+    re.compile(r'^youtu\.be/([\w-]{11})'),
+]
+
+
+def normalize_url(url):
+    """Reduce equivalent spellings of a video URL to one cache key"""
+    parsed = urlparse(url.strip() if '://' in url else f"https://{url.strip()}")
+    host = (parsed.hostname or '').lower()
+    query = dict(parse_qsl(parsed.query))
+    location = host + parsed.path
+
+    if host.endswith('youtube.com') and parsed.path == '/watch' and query.get('v'):
+        return f"youtube:{query['v']}"
+    for pattern in YOUTUBE_ID_PATTERNS:
+        match = pattern.match(location)
+        if match:
+            return f"youtube:{match.group(1)}"
+
+    kept = sorted((key, value) for key, value in query.items()
+                  if key not in IGNORED_PARAMS and not key.startswith('utm_'))
+    return urlunparse(('https', host, parsed.path.rstrip('/') or '/', '', urlencode(kept), ''))
+
+
+def format_urls_expire_at(info):
+    """Earliest ``expire=`` timestamp among the format URLs, or None"""
+    earliest = None
+    for fmt in info.get('formats') or []:
+        for key in ('url', 'manifest_url', 'fragment_base_url'):
+            value = fmt.get(key)
+            if not value:
+                continue
+            match = re.search(r'[?&/]expire[=/](\d{9,})', value)
+            if match:
+                expire = int(match.group(1))
+                earliest = expire if earliest is None else min(earliest, expire)
+    return earliest
+
+
+class InfoCache:
+    def __init__(self, folder, ttl=6 * 3600, max_bytes=64 * 1024 * 1024, expiry_margin=10 * 60):
+        self.folder = folder
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.expiry_margin = expiry_margin
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.folder, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, url):
+        key = normalize_url(url)
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+            if entry.get('key') != key or entry.get('expires', 0) <= time.time():
+                self._remove(path)
+                return None
+            try:
+                # Touch for LRU ordering
+                os.utime(path)
+            except OSError:
+                pass
+            return entry['info']
+
+    def put(self, url, info):
+        """Store a sanitized (JSON-safe) info dict for ``url``"""
+        key = normalize_url(url)
+        now = time.time()
+        expires = now + self.ttl
+        format_expire = format_urls_expire_at(info)
+        if format_expire is not None:
+            expires = min(expires, format_expire - self.expiry_margin)
+        if expires <= now:
+            return
+
+        entry = {'key': key, 'created': now, 'expires': expires, 'info': info}
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(entry, f)
+                os.replace(tmp_path, path)
+            except (OSError, TypeError, ValueError):
+                self._remove(tmp_path)
+                return
+            self._evict()
+
+    def invalidate(self, url):
+        with self._lock:
+            self._remove(self._path(normalize_url(url)))
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.folder):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        # Least recently used first
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
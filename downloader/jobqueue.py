@@ -0,0 +1,223 @@
+"""Bounded worker pool that runs engine jobs.
+
+Jobs wait in a single queue and are picked up by a fixed number of worker
+threads.  A per-host cap stops several workers from hammering the same site
+at once; jobs for a busy host stay queued while other hosts get served.
+
+Local jobs (cutting or converting files on disk) are CPU and disk bound, not
+network bound, so they get their own lane with one worker per core: a
+dropped folder of recordings keeps every core busy with its own ffmpeg
+process while downloads continue on the network workers.
+
+Jobs can be paused, resumed and cancelled whether they are queued or
+running; a paused queued job is skipped until it is resumed.
+"""
+import itertools
+import os
+import threading
+from urllib.parse import urlparse
+
+from .control import JobCancelled
+from .engine import DownloadError, Job, is_url
+
+
+class JobQueue:
+    FIFO = 'fifo'
+    PRIORITY = 'priority'
+
+    def __init__(self, engine, workers=2, per_host_limit=2, ordering=FIFO, on_state=None,
+                 local_workers=None):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if local_workers is None:
+            local_workers = os.cpu_count() or 1
+        if local_workers < 1:
+            raise ValueError("local_workers must be at least 1")
+        if ordering not in (self.FIFO, self.PRIORITY):
+            raise ValueError(f"Unknown ordering: {ordering}")
+
+        self.engine = engine
+        self.workers = workers
+        self.local_workers = local_workers
+        self.per_host_limit = per_host_limit
+        self.ordering = ordering
+        self.on_state = on_state
+
+        self._cond = threading.Condition()
+        self._pending = []
+        self._jobs = []
+        self._running_per_host = {}
+        self._active = 0
+        self._seq = itertools.count()
+        self._threads = []
+        self._closed = False
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, args=(False,),
+                                          name=f"job-worker-{i + 1}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            for i in range(self.local_workers):
+                thread = threading.Thread(target=self._worker, args=(True,),
+                                          name=f"local-worker-{i + 1}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def submit(self, job):
+        """Queue ``job`` and return it; workers are started on first use"""
+        self.start()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Queue is shut down")
+            job.status = Job.QUEUED
+            self._pending.append((self._sort_key(job), job))
+            self._pending.sort(key=lambda item: item[0])
+            self._jobs.append(job)
+            self._cond.notify_all()
+        journal = self.journal
+        if journal is not None:
+            journal.record(job)
+        self._notify(job)
+        return job
+
+    @property
+    def journal(self):
+        return getattr(self.engine, 'journal', None)
+
+    def jobs(self):
+        with self._cond:
+            return list(self._jobs)
+
+    def cancel(self, job, keep_partial=False):
+        """Cancel a queued or running job; its worker stops it and frees its
+        files, except for partial downloads with ``keep_partial``"""
+        was_queued = False
+        with self._cond:
+            for index, (_, pending) in enumerate(self._pending):
+                if pending is job:
+                    del self._pending[index]
+                    job.status = Job.CANCELLED
+                    job.error = "Cancelled"
+                    was_queued = True
+                    self._cond.notify_all()
+                    break
+        job.control.cancel(keep_partial)
+        if was_queued:
+            self._notify(job)
+
+    def pause(self, job):
+        job.control.pause()
+        with self._cond:
+            # join() stops waiting for a queued job once it is paused
+            self._cond.notify_all()
+        self._notify(job)
+
+    def resume(self, job):
+        job.control.resume()
+        with self._cond:
+            # A paused job may have been passed over while workers were idle
+            self._cond.notify_all()
+        self._notify(job)
+
+    def join(self):
+        """Block until every submitted job is done or failed.
+
+        Queued jobs that are paused are not waited for (they would block
+        forever); running jobs are, even while paused.
+        """
+        with self._cond:
+            while self._active or any(not job.control.paused for _, job in self._pending):
+                self._cond.wait()
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _sort_key(self, job):
+        seq = next(self._seq)
+        if self.ordering == self.PRIORITY:
+            # Higher priority first, FIFO within the same priority
+            return (-job.priority, seq)
+        return (seq,)
+
+    @staticmethod
+    def host_of(job):
+        if job.is_local or not is_url(job.source):
+            return None
+        return (urlparse(job.source).hostname or '').lower()
+
+    def _host_has_room(self, host):
+        if host is None or not self.per_host_limit:
+            return True
+        return self._running_per_host.get(host, 0) < self.per_host_limit
+
+    def _take_next(self, local):
+        # Caller holds the lock.  Skip jobs whose host is at its cap so one
+        # busy site does not block everything queued behind it.
+        for index, (_, job) in enumerate(self._pending):
+            if job.control.paused:
+                continue
+            host = self.host_of(job)
+            if (host is None) != local:
+                continue
+            if self._host_has_room(host):
+                del self._pending[index]
+                if host is not None:
+                    self._running_per_host[host] = self._running_per_host.get(host, 0) + 1
+                self._active += 1
+                job.status = Job.RUNNING
+                return job, host
+        return None, None
+
+    def _worker(self, local):
+        while True:
+            with self._cond:
+                job, host = self._take_next(local)
+                while job is None:
+                    if self._closed:
+                        return
+                    self._cond.wait()
+                    job, host = self._take_next(local)
+            self._notify(job)
+
+            try:
+                self.engine.run(job)
+                job.status = Job.DONE
+            except JobCancelled:
+                job.status = Job.CANCELLED
+            except DownloadError:
+                job.status = Job.FAILED
+            except Exception as e:
+                job.error = str(e)
+                job.status = Job.FAILED
+
+            try:
+                if job.status == Job.DONE:
+                    # Queued before this job counts as finished, so join() waits for them
+                    for child in job.children:
+                        self.submit(child)
+            except RuntimeError:
+                # Shut down while the job ran: its children are not run
+                pass
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    if host is not None:
+                        self._running_per_host[host] -= 1
+                    self._cond.notify_all()
+            self._notify(job)
+
+    def _notify(self, job):
+        journal = self.journal
+        if journal is not None and job.status != Job.QUEUED:
+            journal.save_state(job)
+        if self.on_state:
+            self.on_state(job)
@@ -0,0 +1,125 @@
+"""Crash-safe SQLite journal of submitted jobs.
+
+Every job is written down when it is queued and updated as it runs.  After
+a crash or an app restart, ``unfinished()`` rebuilds the jobs that never
+completed; because output names are derived from the job's creation time,
+the resubmitted job continues its own partial files.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .engine import Job
+from .paths import data_dir
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    source TEXT NOT NULL,
+    save_path TEXT NOT NULL,
+    quality TEXT,
+    ranges TEXT NOT NULL,
+    chapters INTEGER NOT NULL,
+    cut_mode TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    rate_limit REAL,
+    created INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    outputs TEXT NOT NULL DEFAULT '[]',
+    error TEXT,
+    updated REAL NOT NULL
+)
+'''
+
+
+def default_path():
+    return os.path.join(data_dir(), 'jobs.sqlite3')
+
+
+class JobJournal:
+    # Progress is persisted at most this often per job
+    PROGRESS_INTERVAL = 2.0
+
+    def __init__(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._last_progress_write = {}
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(SCHEMA)
+        columns = {row[1] for row in self._db.execute('PRAGMA table_info(jobs)')}
+        if 'rate_limit' not in columns:
+            # Journals written before per-job rate limits were kept
+            self._db.execute('ALTER TABLE jobs ADD COLUMN rate_limit REAL')
+
+    def record(self, job):
+        """Insert or fully update ``job``"""
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO jobs (key, kind, source, save_path, quality, ranges, chapters, '
+                'cut_mode, priority, rate_limit, created, status, progress, outputs, error, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job.key, job.kind, job.source, job.save_path, job.quality,
+                 json.dumps(job.ranges), int(job.chapters), job.cut_mode, job.priority,
+                 job.rate_limit, job.created, job.status, job.progress, json.dumps(job.outputs),
+                 job.error, time.time()))
+
+    def save_state(self, job):
+        with self._lock:
+            self._db.execute(
+                'UPDATE jobs SET status = ?, progress = ?, outputs = ?, error = ?, updated = ? '
+                'WHERE key = ?',
+                (job.status, job.progress, json.dumps(job.outputs), job.error, time.time(), job.key))
+            if job.status in (Job.DONE, Job.FAILED, Job.CANCELLED):
+                self._last_progress_write.pop(job.key, None)
+
+    def save_progress(self, job):
+        """Throttled progress update, safe to call for every progress event"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_progress_write.get(job.key, 0) < self.PROGRESS_INTERVAL:
+                return
+            self._last_progress_write[job.key] = now
+            self._db.execute('UPDATE jobs SET progress = ?, updated = ? WHERE key = ?',
+                             (job.progress, time.time(), job.key))
+
+    def unfinished(self):
+        """Rebuild every job that was queued or running when the app stopped"""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT key, kind, source, save_path, quality, ranges, chapters, cut_mode, '
+                'priority, rate_limit, created, progress FROM jobs WHERE status IN (?, ?) '
+                'ORDER BY created, rowid',
+                (Job.QUEUED, Job.RUNNING)).fetchall()
+
+        jobs = []
+        for (key, kind, source, save_path, quality, ranges, chapters, cut_mode,
+             priority, rate_limit, created, progress) in rows:
+            try:
+                job = Job(kind, source, save_path, quality,
+                          ranges=[tuple(r) for r in json.loads(ranges)] or None,
+                          chapters=bool(chapters), cut_mode=cut_mode, priority=priority,
+                          key=key, created=created, rate_limit=rate_limit)
+            except ValueError:
+                continue
+            job.progress = progress
+            jobs.append(job)
+        return jobs
+
+    def prune(self, older_than=7 * 24 * 3600):
+        """Forget finished jobs older than ``older_than`` seconds"""
+        with self._lock:
+            self._db.execute('DELETE FROM jobs WHERE status IN (?, ?, ?) AND updated < ?',
+                             (Job.DONE, Job.FAILED, Job.CANCELLED, time.time() - older_than))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,127 @@
+"""On-disk cache of video keyframe positions for fast, keyframe-aware cuts.
+
+The index is filled lazily: only a window around each requested cut point
+is scanned (ffprobe ``-read_intervals`` seeks straight there), and every
+scanned window is remembered so later cuts from the same file do not
+touch it again.
+"""
+import bisect
+import hashlib
+import json
+import os
+import threading
+
+from . import probe
+from .paths import file_key
+
+EPSILON = 0.001
+
+
+class KeyframeIndex:
+    WINDOW = 30.0
+    MAX_WINDOW = 960.0
+
+    def __init__(self, ffprobe_path, folder):
+        self.ffprobe_path = ffprobe_path
+        self.folder = folder
+        self._entries = {}
+        self._file_locks = {}
+        self._lock = threading.Lock()
+
+    def keyframe_before(self, file_path, t):
+        """Latest keyframe at or before ``t`` (0 if there is none)"""
+        window = self.WINDOW
+        while True:
+            start = max(0.0, t - window)
+            keyframes = self._keyframes(file_path, start, t + EPSILON)
+            i = bisect.bisect_right(keyframes, t + EPSILON)
+            if i:
+                return keyframes[i - 1]
+            if start == 0.0:
+                return 0.0
+            window *= 2
+
+    def keyframe_after(self, file_path, t):
+        """Earliest keyframe at or after ``t``, or None past the last one"""
+        window = self.WINDOW
+        while window <= self.MAX_WINDOW:
+            keyframes = self._keyframes(file_path, t, t + window)
+            i = bisect.bisect_left(keyframes, t - EPSILON)
+            if i < len(keyframes):
+                return keyframes[i]
+            window *= 2
+        return None
+
+    def _keyframes(self, file_path, start, end):
+        key = file_key(file_path)
+        with self._lock:
+            file_lock = self._file_locks.setdefault(key, threading.Lock())
+        # One lock per file, so batches of files are scanned in parallel
+        with file_lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = self._load(key)
+            if not _covered(entry['windows'], start, end):
+                found = self._scan(file_path, start, end)
+                entry['keyframes'] = sorted(set(entry['keyframes']) | set(found))
+                entry['windows'] = _merge(entry['windows'] + [[start, end]])
+                self._save(key, entry)
+            return entry['keyframes']
+
+    def _scan(self, file_path, start, end):
+        return scan_keyframes(self.ffprobe_path, file_path, start, end)
+
+    def _path(self, key):
+        return os.path.join(self.folder, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _load(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                entry = json.load(f)
+            if entry.get('key') == key:
+                return entry
+        except (OSError, ValueError):
+            pass
+        return {'key': key, 'windows': [], 'keyframes': []}
+
+    def _save(self, key, entry):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            # The cache is only an optimisation
+            pass
+
+
+def scan_keyframes(ffprobe_path, source, start, end, input_args=()):
+    """Keyframe times of the first video stream between ``start`` and ``end``.
+
+    ``source`` may be a URL; ``input_args`` go before it (e.g. ``-headers``).
+    """
+    data = probe.run_ffprobe(ffprobe_path, [
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-read_intervals', f"{start:.3f}%{end:.3f}",
+    ] + list(input_args) + [source])
+    keyframes = []
+    for packet in data.get('packets', []):
+        if 'K' in packet.get('flags', '') and packet.get('pts_time') not in (None, 'N/A'):
+            keyframes.append(round(float(packet['pts_time']), 6))
+    return keyframes
+
+
+def _covered(windows, start, end):
+    return any(a <= start and end <= b for a, b in windows)
+
+
+def _merge(windows):
+    merged = []
+    for a, b in sorted(windows):
+        if merged and a <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], b)
+        else:
+            merged.append([a, b])
+    return merged
@@ -0,0 +1,340 @@
+"""Per-job timing and throughput metrics.
+
+Each job gets a ``JobMetrics`` that times the stages it goes through
+(extraction, format selection, download, every yt-dlp post-processor, local
+cuts), counts bytes and retries and adds up the wall and CPU time of the
+ffmpeg processes the engine starts itself.  Stage times are exclusive: time
+spent in a nested stage (a post-processor inside the download call) is not
+counted again for the outer one.
+
+A ``MetricsSink`` appends one JSON line per finished job and can keep a
+Prometheus text file (for node_exporter's textfile collector) up to date
+with running totals.
+"""
+import collections
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from .paths import data_dir
+from .progress import FFmpegProgress
+
+PROMETHEUS_PREFIX = 'video_downloader'
+
+# Throughput is sampled over at least this many seconds for the peak value
+PEAK_WINDOW = 1.0
+# Only the end of a child's stderr is kept for error messages
+STDERR_TAIL_LINES = 50
+
+
+def default_path():
+    return os.path.join(data_dir(), 'metrics.jsonl')
+
+
+def run_process(cmd, on_output=None, control=None):
+    """Run ``cmd`` and return (returncode, stderr, wall seconds, CPU seconds).
+
+    Lines the child writes to stdout go to ``on_output`` as they arrive.
+    Only the last STDERR_TAIL_LINES of stderr are kept.  The process is
+    attached to ``control`` (a JobControl) while it runs, so it can be
+    paused and cancelled.  CPU time (user + system of the child) comes from
+    ``os.wait4`` and is None on platforms without it.
+    """
+    started = time.monotonic()
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL,
+                               stdout=subprocess.PIPE if on_output else subprocess.DEVNULL,
+                               stderr=subprocess.PIPE, text=True, errors='replace')
+    if control is not None:
+        control.attach(process)
+    try:
+        tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+        # Drained on its own thread so a chatty stderr never blocks the child
+        reader = threading.Thread(target=tail.extend, args=(process.stderr,), daemon=True)
+        reader.start()
+        if on_output:
+            for line in process.stdout:
+                on_output(line)
+            process.stdout.close()
+        reader.join()
+        process.stderr.close()
+
+        cpu = None
+        if hasattr(os, 'wait4'):
+            _, status, usage = os.wait4(process.pid, 0)
+            # Reaped by hand, so tell Popen not to wait for it again
+            process.returncode = os.waitstatus_to_exitcode(status)
+            cpu = usage.ru_utime + usage.ru_stime
+        else:
+            process.wait()
+    finally:
+        if control is not None:
+            control.detach(process)
+    return process.returncode, ''.join(tail), time.monotonic() - started, cpu
+
+
+class JobMetrics:
+    def __init__(self, job):
+        self.job = job
+        self.started = time.time()
+        self.finished = None
+        self.status = None
+        self.stages = {}
+        self.bytes_downloaded = 0
+        self.peak_throughput = 0.0
+        self.retries = 0
+        self.ffmpeg_runs = 0
+        self.ffmpeg_wall = 0.0
+        self.ffmpeg_cpu = None
+        self.info_cache_hit = None
+        # Formats picked by the preset ranking and why (ranking.Choice.to_dict)
+        self.formats = None
+        self._lock = threading.Lock()
+        self._stack = []
+        self._mark = time.monotonic()
+        self._file_bytes = {}
+        self._window = None
+
+    # Stages
+
+    def begin(self, name):
+        with self._lock:
+            self._credit()
+            self._stack.append(name)
+
+    def end(self, name):
+        with self._lock:
+            if name not in self._stack:
+                return
+            self._credit()
+            # Unwind anything left open inside this stage as well
+            while self._stack and self._stack.pop() != name:
+                pass
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def _credit(self):
+        # Caller holds the lock: give the time since the last switch to the
+        # innermost open stage
+        now = time.monotonic()
+        if self._stack:
+            name = self._stack[-1]
+            self.stages[name] = self.stages.get(name, 0.0) + now - self._mark
+        self._mark = now
+
+    # Counters
+
+    def observe_download(self, filename, downloaded_bytes):
+        """Feed yt-dlp's per-file byte counter; safe from fragment threads"""
+        if downloaded_bytes is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            # The first report of a resumed file includes what an earlier
+            # run already fetched, so it only sets the baseline
+            previous = self._file_bytes.get(filename, downloaded_bytes)
+            if downloaded_bytes > previous:
+                self.bytes_downloaded += downloaded_bytes - previous
+            self._file_bytes[filename] = downloaded_bytes
+
+            if self._window is None:
+                self._window = (now, self.bytes_downloaded)
+            elif now - self._window[0] >= PEAK_WINDOW:
+                window_start, window_bytes = self._window
+                rate = (self.bytes_downloaded - window_bytes) / (now - window_start)
+                self.peak_throughput = max(self.peak_throughput, rate)
+                self._window = (now, self.bytes_downloaded)
+
+    def add_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def add_process(self, wall, cpu):
+        with self._lock:
+            self.ffmpeg_runs += 1
+            self.ffmpeg_wall += wall
+            if cpu is not None:
+                self.ffmpeg_cpu = (self.ffmpeg_cpu or 0.0) + cpu
+
+    def run_ffmpeg(self, cmd, duration=None, on_progress=None):
+        """Run an ffmpeg command for the job, record its cost and return
+        (returncode, stderr).
+
+        The process follows the job's pause and cancel requests; a cancelled
+        run raises JobCancelled.  With ``on_progress`` ffmpeg reports its
+        position, passed on as ``on_progress(percent, speed, eta)`` (see
+        FFmpegProgress; ``duration`` is the expected output length).
+        """
+        control = self.job.control
+        control.checkpoint()
+        on_output = None
+        if on_progress is not None:
+            cmd = cmd[:1] + FFmpegProgress.ARGS + cmd[1:]
+            parser = FFmpegProgress(duration, on_progress)
+
+            def on_output(line):
+                # A terminated ffmpeg still reports progress=end
+                if not control.cancelled:
+                    parser.feed(line)
+        returncode, stderr, wall, cpu = run_process(cmd, on_output, control)
+        self.add_process(wall, cpu)
+        control.checkpoint()
+        return returncode, stderr
+
+    def finish(self, status):
+        with self._lock:
+            self._credit()
+            self._stack = []
+            self.finished = time.time()
+            self.status = status
+
+    # Export
+
+    def average_throughput(self):
+        seconds = self.stages.get('download', 0.0)
+        return self.bytes_downloaded / seconds if seconds > 0 else 0.0
+
+    def to_dict(self):
+        job = self.job
+        return {
+            'job': job.key,
+            'kind': job.kind,
+            'source': job.source,
+            'status': self.status,
+            'error': job.error,
+            'started': round(self.started, 3),
+            'duration': round((self.finished or time.time()) - self.started, 3),
+            'stages': {name: round(seconds, 3) for name, seconds in self.stages.items()},
+            'info_cache_hit': self.info_cache_hit,
+            'formats': self.formats,
+            'bytes': self.bytes_downloaded,
+            'avg_bytes_per_second': round(self.average_throughput(), 1),
+            'peak_bytes_per_second': round(max(self.peak_throughput, self.average_throughput()), 1),
+            'retries': self.retries,
+            'ffmpeg_runs': self.ffmpeg_runs,
+            'ffmpeg_wall_seconds': round(self.ffmpeg_wall, 3),
+            'ffmpeg_cpu_seconds': None if self.ffmpeg_cpu is None else round(self.ffmpeg_cpu, 3),
+            'outputs': list(job.outputs),
+        }
+
+
+class YtdlpLogger:
+    """yt-dlp ``logger`` that counts retries and keeps warnings visible.
+
+    With a logger set yt-dlp sends its screen output here even in quiet
+    mode, which is where its "Retrying (1/10)..." messages show up.
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def _count(self, message):
+        if 'Retrying' in message:
+            self.metrics.add_retry()
+
+    def debug(self, message):
+        self._count(message)
+
+    def info(self, message):
+        self._count(message)
+
+    def warning(self, message):
+        self._count(message)
+        print(message, file=sys.stderr)
+
+    def error(self, message):
+        print(message, file=sys.stderr)
+
+
+class MetricsSink:
+    """Writes finished jobs' metrics as JSON lines and/or a Prometheus text file"""
+
+    def __init__(self, jsonl_path=None, prometheus_path=None):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._stage_seconds = {}
+        self._stage_count = {}
+        self._totals = {'bytes': 0, 'retries': 0, 'ffmpeg_runs': 0,
+                        'ffmpeg_wall_seconds': 0.0, 'ffmpeg_cpu_seconds': 0.0}
+        self._peak = 0.0
+        for path in (jsonl_path, prometheus_path):
+            folder = os.path.dirname(path) if path else ''
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+
+    def record(self, metrics):
+        entry = metrics.to_dict()
+        with self._lock:
+            if self.jsonl_path:
+                with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + '\n')
+            if self.prometheus_path:
+                self._add(entry)
+                self._write_prometheus()
+
+    def _add(self, entry):
+        key = (entry['kind'], entry['status'])
+        self._jobs[key] = self._jobs.get(key, 0) + 1
+        for name, seconds in entry['stages'].items():
+            self._stage_seconds[name] = self._stage_seconds.get(name, 0.0) + seconds
+            self._stage_count[name] = self._stage_count.get(name, 0) + 1
+        for name in self._totals:
+            self._totals[name] += entry[name] or 0
+        self._peak = max(self._peak, entry['peak_bytes_per_second'])
+
+    def _format_total(self, name):
+        # Exact values: a rounded counter stops visibly growing and breaks rate()
+        value = self._totals[name]
+        if name.endswith('_seconds'):
+            return f"{value:.3f}"
+        return f"{int(value)}"
+
+    def _write_prometheus(self):
+        p = PROMETHEUS_PREFIX
+        lines = [
+            f"# HELP {p}_jobs_total Finished jobs by kind and status.",
+            f"# TYPE {p}_jobs_total counter",
+        ]
+        for (kind, status), count in sorted(self._jobs.items()):
+            lines.append(f'{p}_jobs_total{{kind="{kind}",status="{status}"}} {count}')
+        lines += [
+            f"# HELP {p}_stage_seconds Time spent per job stage.",
+            f"# TYPE {p}_stage_seconds summary",
+        ]
+        for name in sorted(self._stage_seconds):
+            lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {self._stage_seconds[name]:.3f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {self._stage_count[name]}')
+        for name, help_text in (('bytes', "Bytes downloaded."),
+                                ('retries', "Download and fragment retries."),
+                                ('ffmpeg_runs', "ffmpeg processes started by the engine."),
+                                ('ffmpeg_wall_seconds', "Wall time of those ffmpeg processes."),
+                                ('ffmpeg_cpu_seconds', "CPU time of those ffmpeg processes.")):
+            lines += [
+                f"# HELP {p}_{name}_total {help_text}",
+                f"# TYPE {p}_{name}_total counter",
+                f"{p}_{name}_total {self._format_total(name)}",
+            ]
+        lines += [
+            f"# HELP {p}_peak_bytes_per_second Highest per-job download throughput seen.",
+            f"# TYPE {p}_peak_bytes_per_second gauge",
+            f"{p}_peak_bytes_per_second {self._peak:.1f}",
+            f"# HELP {p}_last_job_timestamp_seconds When the last job finished.",
+            f"# TYPE {p}_last_job_timestamp_seconds gauge",
+            f"{p}_last_job_timestamp_seconds {time.time():.0f}",
+        ]
+        # The collector may read at any time, so never expose a partial file
+        tmp_path = f"{self.prometheus_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.prometheus_path)
@@ -0,0 +1,36 @@
+"""Where the engine keeps its caches and state files."""
+import os
+import sys
+
+APP_DIR_NAME = 'VideoDownloader'
+
+
+def data_dir():
+    """Per-user folder for caches, indexes and journals.
+
+    ``VIDEO_DOWNLOADER_HOME`` overrides the default, which follows the
+    usual per-OS location (LOCALAPPDATA, ~/Library/Caches, XDG_CACHE_HOME).
+    """
+    override = os.environ.get('VIDEO_DOWNLOADER_HOME')
+    if override:
+        return override
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, APP_DIR_NAME)
+
+
+def cache_dir(name):
+    """Return (and create) a named sub-folder of data_dir()"""
+    path = os.path.join(data_dir(), name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_key(file_path):
+    """Identity of a local file for cache keys: path, size and mtime"""
+    stat = os.stat(file_path)
+    return f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
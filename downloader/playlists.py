@@ -0,0 +1,194 @@
+"""Incremental playlist and channel sync.
+
+A sync lists the playlist with flat extraction (one request per page of
+entries, no per-video extraction) and walks the entries lazily, newest
+first for channels.  Each entry is looked up in a SQLite index of what
+earlier syncs queued; only new entries, entries whose last download failed
+and entries whose duration changed (a finished premiere or livestream, a
+re-upload) are queued again; failed entries are retried even when the walk
+does not reach them.  Once enough consecutive entries are already
+known the walk stops, so a repeat sync of a large channel only fetches its
+first page.
+"""
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from .infocache import normalize_url
+from .paths import data_dir
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS playlists (
+    playlist TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT,
+    synced REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    playlist TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT,
+    duration REAL,
+    job_key TEXT,
+    status TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (playlist, video_id)
+);
+CREATE INDEX IF NOT EXISTS entries_job_key ON entries (job_key);
+'''
+
+# Stop listing after this many consecutive entries that need nothing
+STOP_AFTER_KNOWN = 20
+# Channels list their tabs (Videos, Shorts, Live) as nested playlists
+MAX_DEPTH = 2
+
+# Job statuses as stored by the engine (Job.DONE / Job.FAILED)
+DONE = 'done'
+FAILED = 'failed'
+
+CHANNEL_PATH_PREFIXES = ('/@', '/channel/', '/c/', '/user/')
+
+
+def default_path():
+    return os.path.join(data_dir(), 'playlists.sqlite3')
+
+
+def is_playlist_url(url):
+    """True for playlist and channel URLs (a watch URL with &list= is a single video)"""
+    parsed = urlparse(url if '://' in url else f"https://{url}")
+    host = (parsed.hostname or '').lower()
+    if not host.endswith('youtube.com'):
+        return False
+    if parsed.path == '/playlist' and parse_qs(parsed.query).get('list'):
+        return True
+    return parsed.path.startswith(CHANNEL_PATH_PREFIXES)
+
+
+def playlist_key(info, url):
+    if info.get('id'):
+        return f"{info.get('extractor_key') or info.get('extractor') or 'generic'}:{info['id']}"
+    return normalize_url(url)
+
+
+class PlaylistIndex:
+    def __init__(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+
+    def entry(self, playlist, video_id):
+        """(duration, status) recorded for an entry, or None if it is new"""
+        with self._lock:
+            return self._db.execute('SELECT duration, status FROM entries WHERE playlist = ? AND video_id = ?',
+                                    (playlist, video_id)).fetchone()
+
+    def failed(self, playlist):
+        """Entries whose last download failed, as Entry objects"""
+        with self._lock:
+            rows = self._db.execute('SELECT video_id, url, title, duration FROM entries '
+                                    'WHERE playlist = ? AND status = ?', (playlist, FAILED)).fetchall()
+        return [Entry(*row) for row in rows]
+
+    def queued(self, playlist, video_id, url, title, duration, job):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                             (playlist, video_id, url, title, duration, job.key, job.status, time.time()))
+
+    def synced(self, playlist, url, title):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO playlists VALUES (?, ?, ?, ?)',
+                             (playlist, url, title, time.time()))
+
+    def job_finished(self, job, status):
+        """Record how a queued entry's download ended (no-op for other jobs)"""
+        with self._lock:
+            self._db.execute('UPDATE entries SET status = ?, updated = ? WHERE job_key = ?',
+                             (status, time.time(), job.key))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class Entry:
+    def __init__(self, video_id, url, title, duration):
+        self.video_id = video_id
+        self.url = url
+        self.title = title
+        self.duration = duration
+
+    def __repr__(self):
+        return f"<Entry {self.video_id} {self.title!r}>"
+
+
+def sync(ydl, url, index, stop_after=STOP_AFTER_KNOWN):
+    """List ``url`` with ``ydl`` (built with ``extract_flat='in_playlist'``).
+
+    Returns (playlist key, title, entries that need downloading).
+    ``stop_after=None`` walks the whole playlist.
+    """
+    info = ydl.extract_info(url, download=False, process=False)
+    # A channel URL may first resolve to its default tab
+    for _ in range(MAX_DEPTH):
+        if info.get('_type') in ('url', 'url_transparent') and info.get('url'):
+            info = ydl.extract_info(info['url'], download=False, process=False)
+    if info.get('_type') != 'playlist':
+        raise ValueError("This URL is not a playlist or channel")
+
+    key = playlist_key(info, url)
+    wanted = []
+    _walk(ydl, info, key, index, stop_after, wanted, 0)
+    # Failures further down than the walk got are retried from the index
+    listed = {entry.video_id for entry in wanted}
+    wanted += [entry for entry in index.failed(key) if entry.video_id not in listed]
+    index.synced(key, url, info.get('title'))
+    return key, info.get('title'), wanted
+
+
+def _walk(ydl, playlist, key, index, stop_after, wanted, depth):
+    known_in_a_row = 0
+    # entries may be a generator: only the pages we get to are fetched
+    for entry in playlist.get('entries') or []:
+        if not entry:
+            continue
+        if depth < MAX_DEPTH and _is_nested_playlist(entry):
+            nested = entry
+            if entry.get('_type') != 'playlist':
+                nested = ydl.extract_info(entry['url'], download=False, process=False)
+            _walk(ydl, nested, key, index, stop_after, wanted, depth + 1)
+            continue
+
+        video_url = entry.get('url') or entry.get('webpage_url')
+        video_id = entry.get('id') or video_url
+        if not video_url:
+            continue
+        duration = entry.get('duration')
+        recorded = index.entry(key, video_id)
+        if recorded is not None:
+            recorded_duration, status = recorded
+            changed = duration is not None and recorded_duration is not None and \
+                abs(duration - recorded_duration) > 1
+            if status == DONE and not changed:
+                known_in_a_row += 1
+                if stop_after is not None and known_in_a_row >= stop_after:
+                    return
+                continue
+            if status not in (DONE, FAILED) and not changed:
+                # Still queued from an earlier sync (the job journal resumes
+                # it) or cancelled by the user
+                continue
+        known_in_a_row = 0
+        wanted.append(Entry(video_id, video_url, entry.get('title'), duration))
+
+
+def _is_nested_playlist(entry):
+    if entry.get('_type') == 'playlist':
+        return True
+    return entry.get('_type') in ('url', 'url_transparent') and entry.get('ie_key') == 'YoutubeTab'
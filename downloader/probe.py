@@ -0,0 +1,138 @@
+"""Small ffprobe helpers for inspecting local media files."""
+import json
+import subprocess
+import threading
+
+from .paths import file_key
+
+# Audio codecs that can be stream-copied into an mp4 and play everywhere
+MP4_AUDIO_CODECS = {'aac', 'mp4a', 'mp3', 'alac'}
+
+COPY_AUDIO_ARGS = ['-c:a', 'copy']
+AAC_AUDIO_ARGS = ['-c:a', 'aac', '-b:a', '192k']
+
+
+class Chapter:
+    def __init__(self, index, start, end, title):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.title = title
+
+    def __repr__(self):
+        return f"<Chapter {self.index} {self.start}-{self.end} {self.title!r}>"
+
+
+def run_ffprobe(ffprobe_path, args):
+    """Run ffprobe with JSON output and return the parsed result"""
+    if not ffprobe_path:
+        raise RuntimeError("FFprobe not found! Please make sure ffprobe is installed next to ffmpeg.")
+    cmd = [ffprobe_path, '-v', 'error', '-print_format', 'json'] + list(args)
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or "ffprobe failed")
+    return json.loads(result.stdout or '{}')
+
+
+def chapters(ffprobe_path, file_path):
+    """Return the chapter markers of ``file_path`` in playback order"""
+    data = run_ffprobe(ffprobe_path, ['-show_chapters', file_path])
+    result = []
+    for index, chapter in enumerate(data.get('chapters', []), 1):
+        start, end = float(chapter['start_time']), float(chapter['end_time'])
+        if end <= start:
+            continue
+        title = (chapter.get('tags') or {}).get('title') or f"Chapter {index}"
+        result.append(Chapter(index, start, end, title))
+    return result
+
+
+def streams(ffprobe_path, file_path, selector=None):
+    """Return ffprobe's stream list, optionally limited to e.g. ``'v:0'``"""
+    args = ['-show_streams', file_path]
+    if selector:
+        args = ['-select_streams', selector] + args
+    return run_ffprobe(ffprobe_path, args).get('streams', [])
+
+
+def video_stream(ffprobe_path, file_path):
+    found = streams(ffprobe_path, file_path, 'v:0')
+    return found[0] if found else None
+
+
+def duration(ffprobe_path, file_path):
+    """Length of ``file_path`` in seconds, or None if it can't be probed"""
+    try:
+        data = run_ffprobe(ffprobe_path, ['-show_entries', 'format=duration', file_path])
+        return float(data['format']['duration'])
+    except (RuntimeError, KeyError, ValueError):
+        return None
+
+
+def audio_codec(ffprobe_path, source, headers=None):
+    """Codec name of the first audio stream, 'none' if there is none.
+
+    ``source`` may be a local path or a URL; ``headers`` are sent with
+    HTTP requests.
+    """
+    args = ['-select_streams', 'a:0', '-show_entries', 'stream=codec_name']
+    if headers:
+        args += ['-headers', ''.join(f"{key}: {value}\r\n" for key, value in headers.items())]
+    found = run_ffprobe(ffprobe_path, args + [source]).get('streams', [])
+    return found[0].get('codec_name') if found else 'none'
+
+
+def is_mp4_audio(codec):
+    """True if ``codec`` can be copied into mp4 as-is; 'none' means no audio"""
+    codec = (codec or '').lower()
+    return codec == 'none' or codec.split('.')[0] in MP4_AUDIO_CODECS
+
+
+class AudioProbe:
+    """Decides between copying and transcoding audio, caching the probes.
+
+    Local files are keyed by path, size and mtime; remote formats by
+    extractor, video id and format id.  yt-dlp's ``acodec`` metadata is used
+    when present so most remote formats never need a network probe.
+    """
+
+    def __init__(self, ffprobe_path_getter):
+        self._ffprobe_path_getter = ffprobe_path_getter
+        self._codecs = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, key, probe):
+        with self._lock:
+            if key in self._codecs:
+                return self._codecs[key]
+        try:
+            codec = probe()
+        except (OSError, RuntimeError, ValueError):
+            codec = None
+        with self._lock:
+            self._codecs[key] = codec
+        return codec
+
+    def file_codec(self, file_path):
+        return self._cached(('file', file_key(file_path)),
+                            lambda: audio_codec(self._ffprobe_path_getter(), file_path))
+
+    def format_codec(self, info, fmt):
+        acodec = fmt.get('acodec')
+        if acodec:
+            return acodec
+        if not fmt.get('url') or fmt.get('protocol', 'https') not in ('http', 'https'):
+            return None
+        key = ('format', info.get('extractor_key'), info.get('id'), fmt.get('format_id'))
+        return self._cached(key, lambda: audio_codec(
+            self._ffprobe_path_getter(), fmt['url'], fmt.get('http_headers')))
+
+    def args_for_file(self, file_path):
+        return COPY_AUDIO_ARGS if is_mp4_audio(self.file_codec(file_path)) else AAC_AUDIO_ARGS
+
+    def args_for_formats(self, info):
+        """Audio args for the formats yt-dlp selected in a processed info dict"""
+        formats = info.get('requested_formats') or [info]
+        if all(is_mp4_audio(self.format_codec(info, fmt)) for fmt in formats):
+            return COPY_AUDIO_ARGS
+        return AAC_AUDIO_ARGS
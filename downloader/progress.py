@@ -0,0 +1,214 @@
+"""Thread-safe progress event bus.
+
+Workers publish as often as they like (yt-dlp calls its hook for every
+chunk and fragment).  The bus keeps only the latest state per job and a
+dispatcher thread delivers the merged events to subscribers at a fixed
+rate, adding a smoothed speed and ETA.  Subscribers run on the dispatcher
+thread, never on a worker thread; GUI subscribers should hand events over
+to their own event loop.
+"""
+import threading
+import time
+
+
+class ProgressEvent:
+    def __init__(self, job):
+        self.job = job
+        self.percent = None
+        self.text = None
+        self.downloaded_bytes = None
+        self.total_bytes = None
+        self.speed = None
+        self.eta = None
+        self.time = time.monotonic()
+
+    def __repr__(self):
+        return f"<ProgressEvent job={self.job.id} {self.percent} {self.text!r}>"
+
+
+class _RateTracker:
+    """Exponentially smoothed bytes/second for one job"""
+
+    def __init__(self, smoothing):
+        self.smoothing = smoothing
+        self.speed = None
+        self._last = None
+
+    def update(self, downloaded_bytes, now):
+        if self._last is not None:
+            last_bytes, last_time = self._last
+            elapsed = now - last_time
+            if elapsed > 0 and downloaded_bytes >= last_bytes:
+                sample = (downloaded_bytes - last_bytes) / elapsed
+                if self.speed is None:
+                    self.speed = sample
+                else:
+                    self.speed += self.smoothing * (sample - self.speed)
+        self._last = (downloaded_bytes, now)
+        return self.speed
+
+
+class ProgressBus:
+    def __init__(self, interval=0.25, smoothing=0.3):
+        self.interval = interval
+        self.smoothing = smoothing
+        self._subscribers = []
+        self._pending = {}
+        self._rates = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """Call ``callback(event)`` for every merged event; returns an unsubscribe function"""
+        with self._lock:
+            self._subscribers.append(callback)
+        self.start()
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def publish(self, job, percent=None, text=None, downloaded_bytes=None, total_bytes=None, eta=None):
+        """Record a progress update; cheap and safe from any thread.
+
+        ``eta`` is for work that is not measured in bytes (ffmpeg runs);
+        downloads get theirs from the byte rate.
+        """
+        now = time.monotonic()
+        with self._lock:
+            event = self._pending.get(job.id)
+            if event is None:
+                event = self._pending[job.id] = ProgressEvent(job)
+            event.time = now
+            if percent is not None:
+                event.percent = percent
+            if text is not None:
+                event.text = text
+            if total_bytes:
+                event.total_bytes = total_bytes
+            if downloaded_bytes is not None:
+                event.downloaded_bytes = downloaded_bytes
+                tracker = self._rates.get(job.id)
+                if tracker is None:
+                    tracker = self._rates[job.id] = _RateTracker(self.smoothing)
+                event.speed = tracker.update(downloaded_bytes, now)
+                if event.speed and event.total_bytes:
+                    event.eta = max(0.0, (event.total_bytes - downloaded_bytes) / event.speed)
+            if eta is not None:
+                event.eta = eta
+        if percent is not None and percent >= 100:
+            # Completion should not wait for the next tick
+            self._wakeup.set()
+
+    def forget(self, job):
+        with self._lock:
+            self._rates.pop(job.id, None)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='progress-bus', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def flush(self):
+        """Deliver all pending events now"""
+        with self._lock:
+            events = list(self._pending.values())
+            self._pending.clear()
+            subscribers = list(self._subscribers)
+        for event in events:
+            for callback in subscribers:
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"Progress subscriber failed: {e}")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+class FFmpegProgress:
+    """Parser for the key=value blocks ffmpeg writes with ``-progress pipe:1``.
+
+    ``callback(percent, speed, eta)`` runs at the end of every block (about
+    twice a second).  ``duration`` is the expected output length in seconds;
+    without it percent and ETA are None and only the speed factor is known.
+    """
+
+    ARGS = ['-progress', 'pipe:1', '-nostats']
+
+    def __init__(self, duration, callback):
+        self.duration = duration
+        self.callback = callback
+        self._out_time = None
+        self._speed = None
+
+    def feed(self, line):
+        key, _, value = line.strip().partition('=')
+        if key in ('out_time_us', 'out_time_ms'):
+            # Both are microseconds (out_time_ms is misnamed in ffmpeg)
+            try:
+                self._out_time = int(value) / 1000000
+            except ValueError:
+                pass
+        elif key == 'speed':
+            try:
+                self._speed = float(value.rstrip('x'))
+            except ValueError:
+                self._speed = None
+        elif key == 'progress':
+            self._emit(value == 'end')
+
+    def _emit(self, ended):
+        percent = eta = None
+        if ended:
+            percent, eta = (100.0 if self.duration else None), 0.0
+        elif self.duration and self._out_time is not None:
+            out_time = min(max(self._out_time, 0.0), self.duration)
+            percent = out_time * 100 / self.duration
+            if self._speed:
+                eta = (self.duration - out_time) / self._speed
+        self.callback(percent, self._speed, eta)
+
+
+def format_rate(speed):
+    if not speed:
+        return ''
+    for unit in ('B/s', 'KiB/s', 'MiB/s', 'GiB/s'):
+        if speed < 1024 or unit == 'GiB/s':
+            return f"{speed:.1f} {unit}"
+        speed /= 1024
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return ''
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+def describe(event):
+    """Human readable one-liner: text, speed and ETA"""
+    parts = [event.text or (f"{event.percent:.1f}%" if event.percent is not None else '')]
+    if event.speed:
+        parts.append(format_rate(event.speed))
+    if event.eta is not None and (event.percent is None or event.percent < 100):
+        parts.append(f"ETA {format_eta(event.eta)}")
+    return '  '.join(part for part in parts if part)
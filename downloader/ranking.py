@@ -0,0 +1,264 @@
+"""Format ranking for the quality presets.
+
+The presets used to be plain yt-dlp format strings, and yt-dlp's own sort
+knows nothing about what happens to a download afterwards.  On YouTube it
+picks VP9 video and Opus audio, and Opus can't be copied into the mp4 the
+merge writes, so every such download re-encodes its audio to AAC (see
+probe.py).
+
+rank() picks the formats for a preset from the extracted format list.  The
+tier comes first and is never traded away: resolution, then SDR over HDR
+(which looks washed out in players without HDR support), then high frame
+rate.  The preset names a quality and that is what it gets.  Within a tier
+the candidate that causes the least extra work wins, and only then the
+higher bitrate.  So H.264 in mp4 with AAC in m4a beats VP9 with Opus at the
+same 1080p, even when the Opus stream has the higher bitrate, since the
+transcode would re-encode that audio anyway.  Audio is chosen the same way
+within a bitrate band: 128k AAC beats 160k Opus, but 48k AAC doesn't.
+
+yt-dlp's own preferences still come first: damaged or deprioritized formats
+(``preference``) and the video's original audio track (``language_preference``)
+win before anything here is compared.
+"""
+from urllib.parse import urlparse
+
+from .probe import is_mp4_audio
+
+# rank() limit for the audio-only preset
+AUDIO_ONLY = 'audio'
+
+AUDIO = 'audio'
+VIDEO = 'video'
+MUXED = 'muxed'
+
+# Spellings of the same codec family in extractors' codec strings
+CODEC_ALIASES = {'h264': 'avc1', 'avc3': 'avc1', 'vp09': 'vp9', 'hvc1': 'hevc', 'hev1': 'hevc', 'mp4a': 'aac'}
+# Video codecs every mp4 player handles
+MP4_VIDEO_CODECS = {'avc1', 'mp4v'}
+# Left out of every preset, as before: too slow to decode on many machines
+EXCLUDED_VIDEO_CODECS = {'av01'}
+# Containers whose audio goes into the merged mp4 as is, and that open
+# everywhere as audio-only files
+MP4_EXTENSIONS = {'m4a', 'mp4', 'mp3'}
+# Audio bitrate bands in kbit/s; within a band a copy beats a higher bitrate
+AUDIO_BANDS = (64, 192)
+
+# What each kind of extra work costs a candidate.  Only their relative size
+# matters: an audio transcode outweighs everything else put together.
+AUDIO_TRANSCODE_COST = 10
+UNKNOWN_AUDIO_COST = 5
+PLAYBACK_COST = 3
+FRAGMENTED_COST = 1
+MERGE_COST = 1
+
+# Format string for lists without heights, e.g. a direct link to a file:
+# the presets' height and codec filters would reject every format in them
+UNRANKED_SPEC = 'bv*+ba/b'
+
+
+def codec(fmt, field):
+    """Codec family of a format ('avc1', 'opus'), 'none' for no such stream,
+    '' if the extractor didn't say"""
+    family = (fmt.get(field) or '').lower().split('.')[0]
+    return CODEC_ALIASES.get(family, family)
+
+
+def kind(fmt):
+    vcodec, acodec = codec(fmt, 'vcodec'), codec(fmt, 'acodec')
+    if vcodec == 'none':
+        # Both 'none' are storyboards and the like
+        return AUDIO if acodec != 'none' else None
+    return VIDEO if acodec == 'none' else MUXED
+
+
+def is_hdr(fmt):
+    return fmt.get('dynamic_range') not in (None, 'SDR')
+
+
+def is_fragmented(fmt):
+    protocol = fmt.get('protocol') or urlparse(fmt.get('url') or '').scheme
+    return bool(fmt.get('fragments')) or protocol.startswith('m3u8') or 'dash' in protocol
+
+
+def audio_band(fmt):
+    abr = fmt.get('abr') or fmt.get('tbr') or 0
+    return sum(abr >= edge for edge in AUDIO_BANDS)
+
+
+def audio_costs(fmt, merged=True):
+    """(cost, note) pairs for a format's audio"""
+    acodec = codec(fmt, 'acodec')
+    if not merged:
+        if (fmt.get('ext') or '') in MP4_EXTENSIONS:
+            return []
+        return [(PLAYBACK_COST, f"{acodec or 'audio'} in {fmt.get('ext') or 'its container'} "
+                                f"opens in fewer players than m4a")]
+    if not acodec:
+        if (fmt.get('ext') or '') in MP4_EXTENSIONS:
+            # Whatever it is, it is in an mp4 already
+            return []
+        return [(UNKNOWN_AUDIO_COST, "audio codec not listed, may need an AAC transcode")]
+    if is_mp4_audio(acodec):
+        return []
+    return [(AUDIO_TRANSCODE_COST, f"{acodec} audio re-encoded to AAC in the merge")]
+
+
+def video_costs(fmt):
+    vcodec = codec(fmt, 'vcodec')
+    costs = []
+    if vcodec and vcodec not in MP4_VIDEO_CODECS:
+        costs.append((PLAYBACK_COST, f"{vcodec} video plays in fewer players than H.264"))
+    if is_fragmented(fmt):
+        costs.append((FRAGMENTED_COST, "downloaded in fragments"))
+    return costs
+
+
+def audio_key(fmt, merged=True):
+    return (fmt.get('preference') or 0, fmt.get('language_preference') or 0, audio_band(fmt),
+            -sum(cost for cost, _ in audio_costs(fmt, merged)), fmt.get('quality') or 0,
+            fmt.get('abr') or fmt.get('tbr') or 0)
+
+
+def label(fmt):
+    """Short description like '137 (avc1 1080p mp4)' or '140 (mp4a 129k m4a)'"""
+    parts = []
+    if kind(fmt) in (VIDEO, MUXED):
+        parts.append(codec(fmt, 'vcodec'))
+        parts.append(resolution(fmt))
+    if kind(fmt) in (AUDIO, MUXED):
+        parts.append(codec(fmt, 'acodec'))
+        if fmt.get('abr') and kind(fmt) == AUDIO:
+            parts.append(f"{round(fmt['abr'])}k")
+        if fmt.get('language') and kind(fmt) == AUDIO:
+            parts.append(fmt['language'])
+    if fmt.get('ext'):
+        parts.append(fmt['ext'])
+    return f"{fmt['format_id']} ({' '.join(part for part in parts if part)})"
+
+
+def resolution(fmt):
+    """'1080p60', '2160p60 HDR10' or '' if the height is unknown"""
+    if not fmt.get('height'):
+        return ''
+    fps = fmt.get('fps') or 0
+    return f"{fmt['height']}p{int(fps) if fps > 30 else ''}" + (f" {fmt['dynamic_range']}" if is_hdr(fmt) else '')
+
+
+class Choice:
+    """One candidate: a muxed format, a video and audio pair, or audio alone.
+    ``spec`` replaces the format ids when the list can't be ranked."""
+
+    def __init__(self, formats, spec=None):
+        self.formats = formats
+        self._spec = spec
+        self.costs = []
+        merged = not formats or kind(formats[0]) != AUDIO
+        for fmt in formats:
+            if kind(fmt) in (VIDEO, MUXED):
+                self.costs += video_costs(fmt)
+            if kind(fmt) in (AUDIO, MUXED):
+                self.costs += audio_costs(fmt, merged)
+        if len(formats) > 1:
+            self.costs.append((MERGE_COST, "video and audio merged after the download"))
+        self.cost = sum(cost for cost, _ in self.costs)
+        self.reasons = []
+
+    @property
+    def spec(self):
+        """yt-dlp format string selecting exactly these formats"""
+        return self._spec or '+'.join(fmt['format_id'] for fmt in self.formats)
+
+    @property
+    def tier(self):
+        video = self.formats[0]
+        return (video.get('height') or 0, not is_hdr(video), (video.get('fps') or 0) > 30)
+
+    @property
+    def bitrate(self):
+        return sum(fmt.get('tbr') or fmt.get('vbr') or fmt.get('abr') or 0 for fmt in self.formats)
+
+    def key(self):
+        video = self.formats[0]
+        return (video.get('preference') or 0,) + self.tier + (
+            -self.cost, video.get('source_preference') or 0, video.get('quality') or 0, self.bitrate)
+
+    def to_dict(self):
+        return {'spec': self.spec, 'cost': self.cost, 'reasons': list(self.reasons)}
+
+
+def rank(formats, limit=None):
+    """Pick the formats for a preset.
+
+    ``limit`` is the preset's height cap, None for no cap, or AUDIO_ONLY.
+    Returns a Choice with the reasons for it, or None when the list says
+    too little (no audio, nothing under the cap) and the preset's own format
+    string should decide.  A list without any heights gets UNRANKED_SPEC.
+    """
+    usable = [fmt for fmt in formats if fmt.get('format_id') and not fmt.get('has_drm')]
+    audios = [fmt for fmt in usable if kind(fmt) == AUDIO]
+    if limit == AUDIO_ONLY:
+        audio = max(audios, key=lambda fmt: audio_key(fmt, merged=False), default=None)
+        if audio is None:
+            return None
+        choice = Choice([audio])
+        choice.reasons.append(f"{label(audio)}: {audio_reason(audio, audios, merged=False)}")
+        return choice
+
+    # A direct file link or an HLS media playlist: nothing to rank by, and
+    # the format may not even have an id
+    all_videos = [fmt for fmt in formats if kind(fmt) in (VIDEO, MUXED)]
+    if all_videos and not any(fmt.get('height') for fmt in all_videos):
+        choice = Choice([], UNRANKED_SPEC)
+        choice.reasons.append("no heights in the format list, yt-dlp's best pick used")
+        return choice
+
+    audio = max(audios, key=audio_key, default=None)
+    excluded = [fmt['format_id'] for fmt in usable if codec(fmt, 'vcodec') in EXCLUDED_VIDEO_CODECS]
+    videos = [fmt for fmt in usable if kind(fmt) in (VIDEO, MUXED)
+              and codec(fmt, 'vcodec') not in EXCLUDED_VIDEO_CODECS
+              and (limit is None or (fmt.get('height') or 0) <= limit)]
+    if not videos:
+        return None
+    candidates = [Choice([fmt, audio]) if kind(fmt) == VIDEO else Choice([fmt])
+                  for fmt in videos if kind(fmt) == MUXED or audio is not None]
+    if not candidates:
+        return None
+
+    best = max(candidates, key=Choice.key)
+    video = best.formats[0]
+    best.reasons.append(f"{resolution(video) or 'unknown height'} is the best tier "
+                        + (f"up to {limit}p" if limit else "available"))
+    notes = [note for cost, note in video_costs(video)]
+    best.reasons.append(f"{label(video)}: " + ('; '.join(notes) if notes else "copied into the mp4 as is"))
+    if len(best.formats) > 1:
+        best.reasons.append(f"{label(audio)}: {audio_reason(audio, audios)}")
+    elif kind(video) == MUXED:
+        notes = [note for cost, note in audio_costs(video)]
+        best.reasons.append("video and audio in one file, no merge" + (f"; {'; '.join(notes)}" if notes else ''))
+
+    # The strongest rival in the same tier that lost on cost, if any
+    rivals = [choice for choice in candidates if choice.tier == best.tier and choice.cost > best.cost]
+    if rivals:
+        rival = max(rivals, key=lambda choice: choice.bitrate)
+        own = {note for cost, note in best.costs}
+        best.reasons.append(f"preferred to {rival.spec}"
+                            + (f" ({round(rival.bitrate)} vs {round(best.bitrate)} kbit/s)"
+                               if rival.bitrate > best.bitrate else '')
+                            + f": {'; '.join(note for cost, note in rival.costs if note not in own)}")
+    hdr = [choice.spec for choice in candidates if choice.tier[0] == best.tier[0] and is_hdr(choice.formats[0])]
+    if hdr and not is_hdr(video):
+        best.reasons.append(f"SDR preferred to HDR {', '.join(hdr)}: HDR looks washed out in players without "
+                            "HDR support")
+    if excluded:
+        best.reasons.append(f"AV1 left out: {', '.join(excluded)}")
+    return best
+
+
+def audio_reason(audio, audios, merged=True):
+    notes = [note for cost, note in audio_costs(audio, merged)]
+    if notes:
+        reason = '; '.join(notes)
+        if merged and any(codec(fmt, 'acodec') and is_mp4_audio(codec(fmt, 'acodec')) for fmt in audios):
+            reason += ", the mp4-ready audio is in a lower bitrate band or another language"
+        return reason
+    return "copied into the mp4 as is" if merged else "plays everywhere as is"
@@ -0,0 +1,195 @@
+"""Clip straight from remote format URLs without downloading the video.
+
+For formats served over plain HTTP(S), progressive or DASH, ffmpeg can
+seek inside the remote file: it reads the container index (the mp4
+``moov``/``sidx`` boxes or the WebM cues) and then asks for only the byte
+ranges it needs.  A 20 second clip from a 3 hour video therefore moves a
+few megabytes.
+
+The fetch starts exactly on the keyframe at or before the clip start, found
+with a windowed ffprobe scan of the remote video, and is stream-copied.
+Smart mode fetches that keyframe-aligned piece to a temporary file and
+re-encodes only its edges locally.
+
+HLS and DASH formats are split into fragments that start on keyframes.
+For those, only the fragments covering the clip are fetched (through the
+shared fragment cache, see fragcache.py) and joined into one local file
+per format, which is then cut the same way.  Encrypted and byte-range HLS
+playlists and live streams are left to yt-dlp's section download.
+"""
+import re
+from urllib.parse import urljoin
+
+from . import probe
+from .cutting import seek_time
+from .keyframes import EPSILON, scan_keyframes
+
+DIRECT_PROTOCOLS = ('http', 'https')
+FRAGMENT_PROTOCOLS = ('m3u8_native', 'http_dash_segments')
+
+# Seconds scanned before a cut point for the previous keyframe
+SCAN_WINDOW = 30.0
+
+
+def direct_formats(info):
+    """Selected formats of a processed info dict if all of them are plain
+    HTTP(S) files, else None"""
+    formats = info.get('requested_formats') or [info]
+    for fmt in formats:
+        if fmt.get('protocol') not in DIRECT_PROTOCOLS or not fmt.get('url'):
+            return None
+    return formats
+
+
+def fragmented_formats(info):
+    """Selected formats of a processed info dict if all of them are HLS or
+    DASH fragments of a finished video, else None"""
+    if info.get('is_live'):
+        return None
+    formats = info.get('requested_formats') or [info]
+    for fmt in formats:
+        if fmt.get('protocol') not in FRAGMENT_PROTOCOLS:
+            return None
+    return formats
+
+
+class Fragment:
+    def __init__(self, number, url, start, duration):
+        self.number = number
+        self.url = url
+        self.start = start
+        self.duration = duration
+
+    @property
+    def end(self):
+        return self.start + self.duration
+
+    def __repr__(self):
+        return f"<Fragment {self.number} {self.start:.3f}+{self.duration:.3f}>"
+
+
+def dash_fragments(fmt):
+    """(init segment URL or None, [Fragment]) of a DASH format"""
+    base = fmt.get('fragment_base_url') or fmt.get('url') or ''
+    init = None
+    fragments = []
+    start = 0.0
+    for number, fragment in enumerate(fmt.get('fragments') or []):
+        url = fragment.get('url') or urljoin(base, fragment.get('path', ''))
+        if 'duration' not in fragment and number == 0:
+            init = url
+            continue
+        duration = float(fragment.get('duration') or 0)
+        fragments.append(Fragment(number, url, start, duration))
+        start += duration
+    return init, fragments
+
+
+def hls_fragments(playlist, playlist_url):
+    """(init segment URL or None, [Fragment]) of an HLS media playlist, or
+    None for playlists only yt-dlp can handle (encrypted, byte ranges)"""
+    init = None
+    fragments = []
+    start = 0.0
+    duration = None
+    for line in playlist.splitlines():
+        line = line.strip()
+        if line.startswith('#EXT-X-KEY') and 'METHOD=NONE' not in line:
+            return None
+        if line.startswith('#EXT-X-BYTERANGE') or (line.startswith('#EXT-X-MAP') and 'BYTERANGE' in line):
+            return None
+        if line.startswith('#EXT-X-MAP'):
+            match = re.search(r'URI="([^"]+)"', line)
+            if match:
+                init = urljoin(playlist_url, match.group(1))
+        elif line.startswith('#EXTINF:'):
+            duration = float(line[len('#EXTINF:'):].split(',', 1)[0])
+        elif line and not line.startswith('#') and duration is not None:
+            fragments.append(Fragment(len(fragments), urljoin(playlist_url, line), start, duration))
+            start += duration
+            duration = None
+    return init, fragments
+
+
+def covering(fragments, start, end):
+    """The run of fragments that covers ``start``..``end``"""
+    return [fragment for fragment in fragments if fragment.end > start + EPSILON and fragment.start < end]
+
+
+def fragment_cut_command(ffmpeg_path, pieces, start, end, output_path, audio_args=probe.AAC_AUDIO_ARGS):
+    """Cut ``start``..``end`` from joined fragment files into one file.
+
+    ``pieces`` is a list of (format, local path, time of its first
+    fragment); each input seeks relative to where its fragments begin.
+    """
+    cmd = [ffmpeg_path, '-y']
+    for fmt, path, offset in pieces:
+        cmd += ['-ss', seek_time(max(0.0, start - offset)), '-t', seek_time(end - start), '-i', path]
+
+    video = next((i for i, (fmt, _, _) in enumerate(pieces) if has_video(fmt)), None)
+    audio = next((i for i, (fmt, _, _) in enumerate(pieces) if has_audio(fmt)), None)
+    if video is not None:
+        cmd += ['-map', f"{video}:v:0?"]
+    if audio is not None:
+        cmd += ['-map', f"{audio}:a:0?"]
+    return cmd + ['-c:v', 'copy'] + audio_args + ['-avoid_negative_ts', 'make_zero', output_path]
+
+
+def input_args(fmt):
+    """ffmpeg/ffprobe input options that make the request look like yt-dlp's"""
+    args = ['-reconnect', '1']
+    headers = fmt.get('http_headers') or {}
+    if headers:
+        args += ['-headers', ''.join(f"{key}: {value}\r\n" for key, value in headers.items())]
+    return args
+
+
+def has_video(fmt):
+    return fmt.get('vcodec') != 'none'
+
+
+def has_audio(fmt):
+    return fmt.get('acodec') != 'none'
+
+
+def keyframe_before(ffprobe_path, fmt, t):
+    """Latest keyframe at or before ``t`` in a remote video format"""
+    window = SCAN_WINDOW
+    while True:
+        start = max(0.0, t - window)
+        keyframes = [k for k in scan_keyframes(ffprobe_path, fmt['url'], start, t + EPSILON, input_args(fmt))
+                     if k <= t + EPSILON]
+        if keyframes:
+            return max(keyframes)
+        if start == 0.0:
+            return 0.0
+        window *= 2
+
+
+def fetch_command(ffmpeg_path, formats, start, end, output_path, audio_args=probe.AAC_AUDIO_ARGS):
+    """Stream-copy ``start``..``end`` of the remote formats into one file"""
+    cmd = [ffmpeg_path, '-y']
+    for fmt in formats:
+        cmd += input_args(fmt) + ['-ss', seek_time(start), '-t', seek_time(end - start), '-i', fmt['url']]
+
+    return cmd + map_args(formats) + ['-c:v', 'copy'] + audio_args + ['-avoid_negative_ts', 'make_zero', output_path]
+
+
+def merge_command(ffmpeg_path, formats, input_urls, output_path, audio_args=probe.AAC_AUDIO_ARGS):
+    """Mux the whole formats, read from ``input_urls`` (one per format), into one file"""
+    cmd = [ffmpeg_path, '-y']
+    for url in input_urls:
+        cmd += ['-i', url]
+    return cmd + map_args(formats) + ['-c:v', 'copy'] + audio_args + [output_path]
+
+
+def map_args(formats):
+    """Take the video from the first format that has some, the audio likewise"""
+    args = []
+    video = next((i for i, fmt in enumerate(formats) if has_video(fmt)), None)
+    audio = next((i for i, fmt in enumerate(formats) if has_audio(fmt)), None)
+    if video is not None:
+        args += ['-map', f"{video}:v:0?"]
+    if audio is not None:
+        args += ['-map', f"{audio}:a:0?"]
+    return args
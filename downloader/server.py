@@ -0,0 +1,317 @@
+"""Local job server: one engine, queue and set of caches for many clients.
+
+``python -m downloader --serve 8765`` runs the engine as a long-lived
+process.  Clients submit jobs over HTTP/JSON and follow their progress as
+Server-Sent Events, so every client shares the same extraction, archive and
+fragment caches, the same bandwidth limits and the same per-host limits.
+
+    POST /jobs                 {"line": "<job line>", "output_dir": ..., "quality": ...,
+                                "cut_mode": ..., "priority": ..., "rate_limit": ...}
+                               -> 201 {"jobs": [job, ...]}
+    GET  /jobs                 -> {"jobs": [job, ...]}
+    GET  /jobs/<id>            -> job
+    POST /jobs/<id>/pause      -> job   (also /resume and /cancel)
+    GET  /events[?job=<id>]    -> text/event-stream of "progress" and "state" events
+
+``line`` uses the job-file syntax of the batch CLI (see cli.py); the other
+fields are optional and default to the server's command-line options.  A
+line for a folder submits one job per video in it.  Paths are paths on the
+server's machine; ``output_dir`` is relative to the server's output folder
+and may not leave it.
+
+There is no authentication, so the server only listens on localhost unless
+told otherwise.  To keep web pages open in the user's browser from driving
+it, POST bodies must be sent as ``application/json`` (which a page can't do
+cross-site without the server's consent), the ``Host`` header must name the
+server (against DNS rebinding) and requests with a foreign ``Origin`` are
+refused.
+"""
+import http.server
+import json
+import os
+import queue
+import threading
+from urllib.parse import parse_qs, urlparse
+
+from .bandwidth import parse_rate
+from .cli import parse_job_line
+from .progress import describe
+
+# Seconds between SSE comments that keep idle connections open
+KEEPALIVE_INTERVAL = 15
+# Events buffered per client; a client that falls this far behind is
+# disconnected and gets the current state again when it reconnects
+CLIENT_BUFFER = 1000
+# Host names that always reach a server listening on localhost
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '[::1]')
+# Listening on these, the server can't tell which names reach it
+WILDCARD_HOSTS = ('', '0.0.0.0', '::')
+
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'key': job.key,
+        'kind': job.kind,
+        'source': job.source,
+        'description': job.describe(),
+        'status': job.status,
+        'paused': job.control.paused,
+        'progress': job.progress,
+        'ranges': job.ranges,
+        'cut_mode': job.cut_mode,
+        'quality': job.quality,
+        'formats': job.formats,
+        'output_dir': job.save_path,
+        'outputs': list(job.outputs),
+        'error': job.error,
+        'children': [child.id for child in job.children],
+    }
+
+
+def progress_to_dict(event):
+    return {
+        'id': event.job.id,
+        'percent': event.percent,
+        'text': event.text,
+        'downloaded_bytes': event.downloaded_bytes,
+        'total_bytes': event.total_bytes,
+        'speed': event.speed,
+        'eta': event.eta,
+        'description': describe(event),
+    }
+
+
+class EventHub:
+    """Fans progress and state events out to the connected SSE clients"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = set()
+
+    def subscribe(self):
+        client = queue.Queue(CLIENT_BUFFER)
+        with self._lock:
+            self._clients.add(client)
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def publish(self, name, job_id, data):
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.put_nowait((name, job_id, data))
+            except queue.Full:
+                self.unsubscribe(client)
+                # Make room for the marker that ends the client's stream
+                try:
+                    client.get_nowait()
+                    client.put_nowait((None, None, None))
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def progress(self, event):
+        """ProgressBus subscriber"""
+        self.publish('progress', event.job.id, progress_to_dict(event))
+
+    def state(self, job):
+        """JobQueue on_state callback"""
+        self.publish('state', job.id, job_to_dict(job))
+
+
+class JobServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, jobs, events, output_dir, quality, cut_mode):
+        self.jobs = jobs
+        self.events = events
+        self.output_dir = os.path.realpath(output_dir)
+        self.quality = quality
+        self.cut_mode = cut_mode
+        super().__init__(address, JobRequestHandler)
+        host, port = address[0], self.server_address[1]
+        # Values of the Host header that name this server, None for any
+        self.hosts = None
+        if host not in WILDCARD_HOSTS:
+            names = set(LOCAL_HOSTS) | {f"[{host}]" if ':' in host else host}
+            self.hosts = {f"{name}:{port}" for name in names}
+            if port == 80:
+                # Clients leave out the default port
+                self.hosts |= names
+
+    def output_path(self, folder):
+        """``folder`` as a path inside the output folder; ValueError if it leaves it"""
+        if not folder:
+            return self.output_dir
+        if not isinstance(folder, str):
+            raise ValueError('"output_dir" must be a string')
+        path = os.path.realpath(os.path.join(self.output_dir, folder))
+        if os.path.commonpath([self.output_dir, path]) != self.output_dir:
+            raise ValueError(f'"output_dir" must be inside {self.output_dir}')
+        return path
+
+    def find(self, job_id):
+        for job in self.jobs.jobs():
+            if str(job.id) == job_id:
+                return job
+        return None
+
+    def submit(self, request):
+        line = request.get('line')
+        if not isinstance(line, str) or not line.strip():
+            raise ValueError('"line" must be a job line, e.g. "<url> 1:00 1:30"')
+        for name in ('quality', 'cut_mode'):
+            if not isinstance(request.get(name) or '', str):
+                raise ValueError(f'"{name}" must be a string')
+        priority = request.get('priority') or 0
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise ValueError('"priority" must be an integer')
+        rate_limit = request.get('rate_limit')
+        if not isinstance(rate_limit, (str, int, float, type(None))) or isinstance(rate_limit, bool):
+            raise ValueError('"rate_limit" must be a number or a rate like "2M"')
+        output_dir = self.output_path(request.get('output_dir'))
+        jobs = parse_job_line(line, output_dir, request.get('quality') or self.quality,
+                              request.get('cut_mode') or self.cut_mode)
+        if not jobs:
+            raise ValueError("The job line is empty")
+        for job in jobs:
+            job.priority = priority
+            job.rate_limit = parse_rate(rate_limit)
+        os.makedirs(output_dir, exist_ok=True)
+        return [self.jobs.submit(job) for job in jobs]
+
+
+class JobRequestHandler(http.server.BaseHTTPRequestHandler):
+    server_version = 'VideoDownloader'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status, message):
+        self._send_json(status, {'error': message})
+
+    def _refused(self):
+        """Send 403 and return True unless the request names this server and
+        comes from no web page or from one of its own"""
+        host = (self.headers.get('Host') or '').lower()
+        if self.server.hosts is not None and host not in self.server.hosts:
+            self._error(403, f"Unexpected Host header: {host or 'none'}")
+            return True
+        origin = self.headers.get('Origin')
+        if origin is not None and urlparse(origin).netloc.lower() != host:
+            self._error(403, f"Cross-origin requests are not accepted: {origin}")
+            return True
+        return False
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object")
+        return body
+
+    def do_GET(self):
+        if self._refused():
+            return
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        if parts == ['jobs']:
+            self._send_json(200, {'jobs': [job_to_dict(job) for job in self.server.jobs.jobs()]})
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = self.server.find(parts[1])
+            if job is None:
+                self._error(404, f"No job {parts[1]}")
+            else:
+                self._send_json(200, job_to_dict(job))
+        elif parts == ['events']:
+            self._stream_events(parse_qs(url.query).get('job', [None])[0])
+        else:
+            self._error(404, "Not found")
+
+    def do_POST(self):
+        if self._refused():
+            return
+        if self.headers.get_content_type() != 'application/json':
+            # Forms and text/plain bodies are all a cross-site page can send
+            self._error(415, "Requests must be sent as application/json")
+            return
+        parts = [part for part in urlparse(self.path).path.split('/') if part]
+        try:
+            request = self._read_json()
+        except ValueError as e:
+            self._error(400, f"Invalid JSON: {e}")
+            return
+        if parts == ['jobs']:
+            try:
+                jobs = self.server.submit(request)
+            except (TypeError, ValueError) as e:
+                self._error(400, str(e))
+                return
+            self._send_json(201, {'jobs': [job_to_dict(job) for job in jobs]})
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] in ('pause', 'resume', 'cancel'):
+            job = self.server.find(parts[1])
+            if job is None:
+                self._error(404, f"No job {parts[1]}")
+                return
+            getattr(self.server.jobs, parts[2])(job)
+            self._send_json(200, job_to_dict(job))
+        else:
+            self._error(404, "Not found")
+
+    def _stream_events(self, job_id):
+        events = self.server.events
+        client = events.subscribe()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            # Start with where every job stands, then follow the changes
+            for job in self.server.jobs.jobs():
+                if job_id is None or str(job.id) == job_id:
+                    self._write_event('state', job_to_dict(job))
+            while True:
+                try:
+                    name, event_job_id, data = client.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    self.wfile.write(b': keepalive\n\n')
+                    self.wfile.flush()
+                    continue
+                if name is None:
+                    return
+                if job_id is None or str(event_job_id) == job_id:
+                    self._write_event(name, data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            events.unsubscribe(client)
+
+    def _write_event(self, name, data):
+        self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+
+def serve(jobs, events, host, port, output_dir, quality, cut_mode):
+    """Serve until interrupted; ``jobs`` is a JobQueue whose on_state and
+    progress bus feed ``events``"""
+    server = JobServer((host, port), jobs, events, output_dir, quality, cut_mode)
+    print(f"Serving jobs on http://{host}:{server.server_address[1]}/", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -0,0 +1,121 @@
+"""Loopback HTTP proxy that feeds remote formats to a merging ffmpeg.
+
+Formats that come as separate video and audio files are normally
+downloaded to two files, then merged by ffmpeg into a third.  In
+stream-merge mode one ffmpeg reads both formats through this proxy while
+they download and writes the merged file directly, so the merge overlaps
+the download and the streams never touch the disk on their own.
+
+ffmpeg could read the format URLs itself, but it sends one request per
+file, while some sites (YouTube among them) throttle anything that is not
+fetched in ranged chunks.  So ffmpeg reads from localhost instead, and the
+proxy passes every request on to ``fetch``, which fetches the bytes through
+yt-dlp's network stack in chunks and retries them.  The proxy answers
+range requests, so ffmpeg can still seek, e.g. to an index at the end of
+an mp4.  A failed fetch only shows up in ffmpeg as an input that ends
+early, so the proxy keeps the error for the caller to check.
+
+After a seek ffmpeg may read bytes it already had again.  Those are passed
+on (and fetched) again, but ``ServedRanges`` lets the caller count every
+byte of an input only once.
+"""
+import http.server
+import re
+import threading
+
+RANGE_PATTERN = re.compile(r'bytes=(\d+)-')
+
+
+class ServedRanges:
+    """Byte ranges of one input already passed to ffmpeg"""
+
+    def __init__(self):
+        # Sorted, non-overlapping [start, end) pairs
+        self._ranges = []
+
+    def add(self, start, end):
+        """Mark bytes start..end (exclusive) as served; return how many of
+        them were not served before"""
+        new = end - start
+        merged = []
+        for low, high in self._ranges:
+            if high < start or low > end:
+                merged.append((low, high))
+                continue
+            new -= max(0, min(high, end) - max(low, start))
+            start, end = min(low, start), max(high, end)
+        merged.append((start, end))
+        merged.sort()
+        self._ranges = merged
+        return new
+
+    @property
+    def total(self):
+        return sum(high - low for low, high in self._ranges)
+
+
+class StreamProxy(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, sizes, fetch):
+        # ``sizes`` has the length in bytes of each input; ``fetch(number,
+        # start, end, write)`` passes bytes start..end (inclusive) of input
+        # ``number`` to ``write`` as they arrive
+        self.sizes = sizes
+        self.fetch = fetch
+        # First exception raised by ``fetch``, if any
+        self.error = None
+        self._thread = None
+        super().__init__(('127.0.0.1', 0), StreamProxyHandler)
+
+    def url(self, number):
+        return f"http://127.0.0.1:{self.server_address[1]}/{number}"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class StreamProxyHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        try:
+            number = int(self.path.strip('/'))
+            size = self.server.sizes[number]
+        except (ValueError, IndexError):
+            self.send_error(404)
+            return
+        match = RANGE_PATTERN.match(self.headers.get('Range') or '')
+        start = int(match.group(1)) if match else 0
+        if start >= size:
+            self.send_response(416)
+            self.send_header('Content-Range', f"bytes */{size}")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(206 if match else 200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(size - start))
+        if match:
+            self.send_header('Content-Range', f"bytes {start}-{size - 1}/{size}")
+        self.end_headers()
+        try:
+            self.server.fetch(number, start, size - 1, self.wfile.write)
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg seeked elsewhere or finished with this input
+            pass
+        except Exception as e:
+            if self.server.error is None:
+                self.server.error = e
+        self.close_connection = True
@@ -0,0 +1,155 @@
+"""Discovery and capabilities of the ffmpeg toolchain.
+
+ffmpeg and ffprobe are looked up once per process, without a shell and the
+same way on every OS: next to a frozen app, in the working folder, then on
+PATH.  What the build can do (version, encoders, muxers, thread support) is
+probed the first time anyone asks and kept for the rest of the process, so
+cutting and merging code can pick encoders and formats without starting
+ffmpeg once per job.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+EXE_SUFFIX = '.exe' if sys.platform == 'win32' else ''
+
+
+def _candidates(name):
+    exe = name + EXE_SUFFIX
+    if getattr(sys, 'frozen', False):
+        # Bundled with the app (PyInstaller data folder), or installed next to it
+        bundle = getattr(sys, '_MEIPASS', None)
+        if bundle:
+            yield os.path.join(bundle, exe)
+        yield os.path.join(os.path.dirname(sys.executable), exe)
+    yield os.path.abspath(exe)
+    found = shutil.which(name)
+    if found:
+        yield found
+
+
+def find_program(name):
+    for path in _candidates(name):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _sibling(path, name):
+    """``name`` in the same folder as ``path``, if it is there"""
+    folder, program = os.path.split(path)
+    candidate = os.path.join(folder, program.lower().replace('ffmpeg', name))
+    return candidate if candidate != path and os.path.isfile(candidate) else None
+
+
+def _run(cmd):
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, errors='replace', timeout=30)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"Could not run {cmd[0]}: {e}")
+        return ''
+    return result.stdout
+
+
+def _listed_names(output, flag):
+    """Names from an ``ffmpeg -encoders`` / ``-muxers`` listing whose flag
+    column contains ``flag``"""
+    names = set()
+    started = False
+    for line in output.splitlines():
+        if not started:
+            # The legend ends with a line of dashes
+            started = line.strip().startswith('--')
+            continue
+        fields = line.split()
+        if len(fields) >= 2 and flag in fields[0]:
+            names.update(fields[1].split(','))
+    return names
+
+
+class Toolchain:
+    def __init__(self, ffmpeg, ffprobe):
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self._lock = threading.Lock()
+        self._capabilities = None
+
+    def __repr__(self):
+        return f"<Toolchain ffmpeg={self.ffmpeg!r} ffprobe={self.ffprobe!r}>"
+
+    def _probe(self):
+        with self._lock:
+            if self._capabilities is None:
+                capabilities = {'version': None, 'configuration': '', 'encoders': set(),
+                                'muxers': set()}
+                if self.ffmpeg:
+                    lines = _run([self.ffmpeg, '-hide_banner', '-version']).splitlines()
+                    if lines and lines[0].startswith('ffmpeg version '):
+                        capabilities['version'] = lines[0].split()[2]
+                    for line in lines:
+                        if line.startswith('configuration:'):
+                            capabilities['configuration'] = line
+                    encoders = _run([self.ffmpeg, '-hide_banner', '-encoders'])
+                    capabilities['encoders'] = _listed_names(encoders, 'V') | _listed_names(encoders, 'A')
+                    capabilities['muxers'] = _listed_names(
+                        _run([self.ffmpeg, '-hide_banner', '-muxers']), 'E')
+                self._capabilities = capabilities
+            return self._capabilities
+
+    @property
+    def version(self):
+        return self._probe()['version']
+
+    @property
+    def encoders(self):
+        """Names of the video and audio encoders this ffmpeg was built with"""
+        return self._probe()['encoders']
+
+    @property
+    def muxers(self):
+        return self._probe()['muxers']
+
+    @property
+    def threads(self):
+        """False for builds without threading, where -threads has no effect"""
+        configuration = self._probe()['configuration']
+        return '--disable-pthreads' not in configuration or '--enable-w32threads' in configuration
+
+    def has_encoder(self, name):
+        return name in self.encoders
+
+    def has_muxer(self, name):
+        return name in self.muxers
+
+    def describe(self):
+        if not self.ffmpeg:
+            return "ffmpeg not found"
+        return (f"ffmpeg {self.version or '(unknown version)'} at {self.ffmpeg}, "
+                f"ffprobe {'at ' + self.ffprobe if self.ffprobe else 'not found'}, "
+                f"{len(self.encoders)} encoders, {len(self.muxers)} muxers, "
+                f"threads {'on' if self.threads else 'off'}")
+
+
+def discover():
+    ffmpeg = find_program('ffmpeg')
+    ffprobe = (_sibling(ffmpeg, 'ffprobe') if ffmpeg else None) or find_program('ffprobe')
+    return Toolchain(ffmpeg, ffprobe)
+
+
+_current = None
+_current_lock = threading.Lock()
+
+
+def get():
+    """The process-wide Toolchain.
+
+    A toolchain without ffmpeg is not kept, so installing ffmpeg while the
+    app runs is picked up by the next job.
+    """
+    global _current
+    with _current_lock:
+        if _current is None or not _current.ffmpeg:
+            _current = discover()
+        return _current
@@ -0,0 +1,103 @@
+"""Long-lived yt-dlp instances, one per worker thread.
+
+Building a YoutubeDL sets up its network stack (with the ``requests``
+package installed, a pooled session that keeps connections alive), loads
+cookies and creates extractors as URLs come in.  Doing that for every job
+throws all of it away, and for a burst of short clips from one site the new
+TLS connections and extractor set-up are a visible share of each job.  The
+pool keeps one instance per worker thread for the life of the engine, so a
+job reuses the connections, cookies and extractor state left by the jobs
+that ran before it on the same thread.
+
+An instance belongs to one worker thread and its job at a time.  Its
+options, hooks and format selector are per-job state, and extraction and
+downloads through it must stay on that thread.  The one call a job's own
+helper threads may make is ``urlopen()``: yt-dlp's fragment downloader
+calls it from several threads at once itself, and the network stack behind
+it (a pooled ``requests`` session, or urllib) handles concurrent requests.
+The engine's fragment fetches and the stream-merge proxy rely on that, and
+both finish before the job's session ends.
+
+Each job applies its own options for the duration of ``session()`` and
+they are undone afterwards, including the progress and postprocessor hooks
+it added.  Most options are read when they are used, so a job may change
+them.  The format (compiled into a format selector) and the output template
+are only read by the constructor and are re-applied by hand.  The rest of
+what the constructor reads is fixed for the life of an instance: the
+output streams (``quiet``, ``logtostderr``, colours), ``http_headers``,
+``compat_opts``, cookies, ``postprocessors`` and ``post_hooks``, the
+download archive, and the network settings of its request handlers
+(proxy, timeout, certificates).  Those belong in the pool's base options;
+``session()`` refuses a job option that would change one of them instead
+of silently ignoring it.
+"""
+import contextlib
+import threading
+
+# Options YoutubeDL only reads in its constructor (yt-dlp 2023.12.30)
+CONSTRUCTOR_OPTIONS = frozenset((
+    'quiet', 'logtostderr', 'no_color', 'color', 'bidi_workaround', 'http_headers', 'compat_opts',
+    'cookiefile', 'cookiesfrombrowser', 'postprocessors', 'post_hooks', 'download_archive',
+    'forceprint', 'nooverwrites', 'restrictfilenames', 'proxy', 'socket_timeout', 'source_address',
+    'nocheckcertificate', 'legacyserverconnect', 'enable_file_urls', 'client_certificate',
+    'client_certificate_key', 'client_certificate_password', 'debug_printtraffic',
+))
+
+
+class YdlPool:
+    def __init__(self, base_options=None):
+        # Options every instance is built with; quiet and noprogress decide
+        # where yt-dlp writes, which is set up in the constructor
+        self.base_options = dict(base_options or {})
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._instances = []
+
+    def _instance(self):
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            import yt_dlp
+            ydl = yt_dlp.YoutubeDL(dict(self.base_options))
+            self._local.ydl = ydl
+            with self._lock:
+                self._instances.append(ydl)
+        return ydl
+
+    @contextlib.contextmanager
+    def session(self, options):
+        """Yield this thread's YoutubeDL with ``options`` applied for one job"""
+        fixed = sorted(key for key in CONSTRUCTOR_OPTIONS.intersection(options)
+                       if options[key] != self.base_options.get(key))
+        if fixed:
+            raise ValueError(f"Options fixed when the pool builds an instance: {', '.join(fixed)}")
+        ydl = self._instance()
+        params = dict(ydl.params)
+        progress_hooks = list(ydl._progress_hooks)
+        postprocessor_hooks = list(ydl._postprocessor_hooks)
+        format_selector = ydl.format_selector
+
+        options = dict(options)
+        for hook in options.pop('progress_hooks', []):
+            ydl.add_progress_hook(hook)
+        for hook in options.pop('postprocessor_hooks', []):
+            ydl.add_postprocessor_hook(hook)
+        ydl.params.update(options)
+        if 'outtmpl' in options:
+            ydl._parse_outtmpl()
+        if 'format' in options:
+            ydl.format_selector = ydl.build_format_selector(options['format'])
+        try:
+            yield ydl
+        finally:
+            ydl.params.clear()
+            ydl.params.update(params)
+            ydl._progress_hooks[:] = progress_hooks
+            ydl._postprocessor_hooks[:] = postprocessor_hooks
+            ydl.format_selector = format_selector
+
+    def close(self):
+        """Save cookies and close the connections of every instance"""
+        with self._lock:
+            instances, self._instances = self._instances, []
+        for ydl in instances:
+            ydl.close()
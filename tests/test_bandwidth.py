@@ -0,0 +1,67 @@
+import pytest
+
+from downloader.bandwidth import BandwidthScheduler, parse_rate, weight_for
+from downloader.engine import Job
+
+
+def make_job(priority=0):
+    return Job(Job.DOWNLOAD, 'https://example.com/video', '/tmp', priority=priority)
+
+
+def test_parse_rate():
+    assert parse_rate('500K') == 500 * 1024
+    assert parse_rate('2.5M') == 2.5 * 1024 ** 2
+    assert parse_rate('1000000') == 1000000
+    assert parse_rate('0') is None
+    assert parse_rate(None) is None
+    with pytest.raises(ValueError):
+        parse_rate('fast')
+
+
+def test_no_total_rate_leaves_jobs_at_their_caps():
+    scheduler = BandwidthScheduler()
+    capped, free = make_job(), make_job()
+    scheduler.register(capped, 1000)
+    scheduler.register(free)
+    assert scheduler.rates() == {capped.key: 1000, free.key: None}
+
+
+def test_equal_weights_split_evenly():
+    scheduler = BandwidthScheduler(900)
+    jobs = [make_job() for _ in range(3)]
+    for job in jobs:
+        scheduler.register(job)
+    assert scheduler.rates() == {job.key: pytest.approx(300) for job in jobs}
+
+
+def test_shares_follow_priority_weights():
+    scheduler = BandwidthScheduler(1000)
+    background, clip = make_job(0), make_job(1)
+    scheduler.register(background)
+    scheduler.register(clip)
+    rates = scheduler.rates()
+    assert rates[clip.key] / rates[background.key] == pytest.approx(weight_for(1) / weight_for(0))
+    assert sum(rates.values()) == pytest.approx(1000)
+
+
+def test_capped_job_gives_the_rest_to_the_others():
+    scheduler = BandwidthScheduler(1000)
+    capped, first, second = make_job(), make_job(), make_job()
+    scheduler.register(capped, 100)
+    scheduler.register(first)
+    scheduler.register(second)
+    rates = scheduler.rates()
+    assert rates[capped.key] == 100
+    assert rates[first.key] == pytest.approx(450)
+    assert rates[second.key] == pytest.approx(450)
+
+
+def test_unregister_and_total_rate_changes_rebalance():
+    scheduler = BandwidthScheduler(1000)
+    first, second = make_job(), make_job()
+    scheduler.register(first)
+    scheduler.register(second)
+    scheduler.unregister(second)
+    assert scheduler.rates() == {first.key: pytest.approx(1000)}
+    scheduler.set_total_rate(None)
+    assert scheduler.rates() == {first.key: None}
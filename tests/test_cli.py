@@ -0,0 +1,79 @@
+import pytest
+
+from downloader import cutting
+from downloader.cli import parse_job_line, parse_ranges
+from downloader.engine import DEFAULT_QUALITY, Job
+
+URL = 'https://example.com/watch?v=abc'
+
+
+def parse(line, cut_mode=None):
+    return parse_job_line(line, '/out', DEFAULT_QUALITY, cut_mode)
+
+
+def test_parse_ranges():
+    assert parse_ranges('0:10-0:20,1:00-1:30') == [(10, 20), (60, 90)]
+    assert parse_ranges('5-1:00:00') == [(5, 3600)]
+    with pytest.raises(ValueError):
+        parse_ranges('0:10')
+    with pytest.raises(ValueError):
+        parse_ranges('a-b')
+
+
+def test_blank_and_comment_lines():
+    assert parse('') == []
+    assert parse('   ') == []
+    assert parse('# a comment') == []
+
+
+def test_url_alone_is_a_download():
+    [job] = parse(URL)
+    assert job.kind == Job.DOWNLOAD
+    assert job.source == URL
+    assert job.save_path == '/out'
+
+
+def test_url_clip_defaults_to_the_url_cut_mode():
+    [job] = parse(f'{URL} 1:00 1:30')
+    assert job.kind == Job.CLIP
+    assert job.ranges == [(60, 90)]
+    assert job.cut_mode == cutting.URL_DEFAULT
+
+
+def test_local_clip_defaults_to_the_local_cut_mode(tmp_path):
+    video = tmp_path / 'a video.mp4'
+    video.write_bytes(b'')
+    [job] = parse(f'"{video}" 0:10-0:20,0:30-0:40')
+    assert job.kind == Job.LOCAL_CLIP
+    assert job.ranges == [(10, 20), (30, 40)]
+    assert job.cut_mode == cutting.LOCAL_DEFAULT
+
+
+def test_explicit_cut_mode_wins():
+    [job] = parse(f'{URL} 10 20', cutting.COPY)
+    assert job.cut_mode == cutting.COPY
+
+
+def test_keywords():
+    assert parse(f'{URL} chapters')[0].chapters
+    assert parse(f'{URL} sync')[0].kind == Job.SYNC
+    assert parse('/videos/a.mp4 convert')[0].kind == Job.CONVERT
+
+
+def test_folder_expands_to_one_job_per_video(tmp_path):
+    for name in ('b.mp4', 'a.mkv', 'notes.txt'):
+        (tmp_path / name).write_bytes(b'')
+    jobs = parse(f'"{tmp_path}" convert')
+    assert sorted(job.source for job in jobs) == [str(tmp_path / 'a.mkv'), str(tmp_path / 'b.mp4')]
+
+
+@pytest.mark.parametrize('line', [
+    '/videos/a.mp4',
+    '/videos/a.mp4 sync',
+    f'{URL} convert',
+    f'{URL} 1 2 3',
+    f'{URL} 20 10',
+])
+def test_invalid_lines(line):
+    with pytest.raises(ValueError):
+        parse(line)
@@ -0,0 +1,66 @@
+import bisect
+
+from downloader.cutting import plan_segments, plan_smart_cut, seek_time
+
+
+class FakeIndex:
+    """Keyframe index with fixed keyframe times, answering like KeyframeIndex"""
+
+    def __init__(self, keyframes):
+        self.keyframes = sorted(keyframes)
+
+    def keyframe_before(self, file_path, t):
+        i = bisect.bisect_right(self.keyframes, t + 0.01)
+        return self.keyframes[i - 1] if i else 0.0
+
+    def keyframe_after(self, file_path, t):
+        i = bisect.bisect_left(self.keyframes, t - 0.01)
+        return self.keyframes[i] if i < len(self.keyframes) else None
+
+
+EVERY_TWO_SECONDS = FakeIndex(range(0, 600, 2))
+
+
+def test_seek_time_keeps_microseconds():
+    assert seek_time(12.3456789) == '12.345679'
+    assert seek_time(0) == '0.000000'
+
+
+def test_smart_cut_encodes_only_the_ends():
+    assert plan_smart_cut(EVERY_TWO_SECONDS, 'v.mp4', 3.5, 10.5) == [
+        ('encode', 3.5, 4), ('copy', 4, 10), ('encode', 10, 10.5)]
+
+
+def test_smart_cut_on_keyframes_is_one_copy():
+    assert plan_smart_cut(EVERY_TWO_SECONDS, 'v.mp4', 4, 10) == [('copy', 4, 10)]
+
+
+def test_smart_cut_with_one_keyframe_inside():
+    index = FakeIndex([0, 10, 20])
+    assert plan_smart_cut(index, 'v.mp4', 5, 15) == [('encode', 5, 10), ('copy', 10, 15)]
+
+
+def test_smart_cut_without_keyframe_inside_is_a_full_encode():
+    index = FakeIndex([0, 10, 20])
+    assert plan_smart_cut(index, 'v.mp4', 11, 19) is None
+    assert plan_smart_cut(index, 'v.mp4', 21, 25) is None
+
+
+def test_segments_split_at_keyframes():
+    segments = plan_segments(EVERY_TWO_SECONDS, 'v.mp4', 1.5, 61.5, 3)
+    assert segments == [(1.5, 20), (20, 40), (40, 61.5)]
+
+
+def test_segments_cover_the_range_without_gaps():
+    segments = plan_segments(FakeIndex(range(0, 600, 7)), 'v.mp4', 3, 143, 4)
+    assert segments[0][0] == 3 and segments[-1][1] == 143
+    assert all(a[1] == b[0] for a, b in zip(segments, segments[1:]))
+
+
+def test_short_ranges_are_not_split():
+    # Every segment must be at least MIN_SEGMENT_SECONDS long
+    assert plan_segments(EVERY_TWO_SECONDS, 'v.mp4', 0, 15, 8) == [(0, 15)]
+
+
+def test_segments_without_keyframes_stay_whole():
+    assert plan_segments(FakeIndex([0]), 'v.mp4', 5, 65, 4) == [(5, 65)]
@@ -0,0 +1,41 @@
+from downloader.fragments import FragmentBudget
+
+
+def test_single_job_gets_what_it_wants_up_to_the_budget():
+    budget = FragmentBudget(8)
+    assert budget.request('a', 4) == 4
+    assert budget.request('a', 20) == 8
+
+
+def test_max_min_fair_split():
+    budget = FragmentBudget(10)
+    budget.request('small', 2)
+    budget.request('big', 10)
+    budget.request('other', 10)
+    grants = {owner: budget.grant(owner) for owner in ('small', 'big', 'other')}
+    assert grants == {'small': 2, 'big': 4, 'other': 4}
+
+
+def test_grants_never_exceed_the_budget():
+    budget = FragmentBudget(8)
+    for owner in 'abc':
+        budget.request(owner, 16)
+    assert sum(budget.grant(owner) for owner in 'abc') <= 8
+
+
+def test_every_job_gets_at_least_one_thread():
+    budget = FragmentBudget(2)
+    for owner in 'abcd':
+        budget.request(owner, 4)
+    assert all(budget.grant(owner) == 1 for owner in 'abcd')
+
+
+def test_release_frees_the_share():
+    budget = FragmentBudget(8)
+    budget.request('a', 8)
+    budget.request('b', 8)
+    assert budget.grant('a') == 4
+    budget.release('b')
+    assert budget.grant('a') == 8
+    # Unknown owners get the minimum
+    assert budget.grant('b') == 1
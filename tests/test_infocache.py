@@ -0,0 +1,29 @@
+import pytest
+
+from downloader.infocache import normalize_url
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    'https://youtube.com/watch?v=dQw4w9WgXcQ&t=42s&feature=share',
+    'https://m.youtube.com/watch?v=dQw4w9WgXcQ',
+    'https://youtu.be/dQw4w9WgXcQ?si=abc',
+    'youtu.be/dQw4w9WgXcQ',
+    'https://www.youtube.com/shorts/dQw4w9WgXcQ',
+    'https://www.youtube.com/embed/dQw4w9WgXcQ',
+    'https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ',
+])
+def test_youtube_spellings_share_a_key(url):
+    assert normalize_url(url) == 'youtube:dQw4w9WgXcQ'
+
+
+def test_other_sites_drop_tracking_parameters_and_sort_the_rest():
+    assert normalize_url('http://Example.com/v/1/?b=2&utm_source=x&a=1&si=y') == 'https://example.com/v/1?a=1&b=2'
+
+
+def test_other_parameters_are_kept():
+    assert normalize_url('https://example.com/watch?id=1') != normalize_url('https://example.com/watch?id=2')
+
+
+def test_root_path():
+    assert normalize_url('https://example.com') == 'https://example.com/'
@@ -0,0 +1,130 @@
+import threading
+
+from downloader.engine import Job
+from downloader.jobqueue import JobQueue
+
+
+class FakeEngine:
+    """Runs a job by waiting until the test releases it"""
+
+    def __init__(self):
+        self.started = {}
+        self.release = {}
+        self.ran = []
+
+    def prepare(self, job):
+        self.started[job.key] = threading.Event()
+        self.release[job.key] = threading.Event()
+        return job
+
+    def run(self, job):
+        self.ran.append(job)
+        if job.key in self.started:
+            self.started[job.key].set()
+            self.release[job.key].wait(5)
+
+
+def make_job(host='example.com', priority=0):
+    return Job(Job.DOWNLOAD, f'https://{host}/video', '/tmp', priority=priority)
+
+
+def joins_within(queue, timeout):
+    thread = threading.Thread(target=queue.join, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+def test_join_waits_for_submitted_jobs():
+    engine = FakeEngine()
+    queue = JobQueue(engine, workers=1, local_workers=1)
+    job = queue.submit(engine.prepare(make_job()))
+    assert engine.started[job.key].wait(5)
+    assert not joins_within(queue, 0.2)
+    engine.release[job.key].set()
+    assert joins_within(queue, 5)
+    assert job.status == Job.DONE
+    queue.shutdown()
+
+
+def test_join_skips_paused_queued_jobs():
+    engine = FakeEngine()
+    queue = JobQueue(engine, workers=1, local_workers=1)
+    running = queue.submit(engine.prepare(make_job()))
+    assert engine.started[running.key].wait(5)
+    waiting = queue.submit(make_job())
+    queue.pause(waiting)
+    engine.release[running.key].set()
+    assert joins_within(queue, 5)
+    assert waiting.status == Job.QUEUED
+    assert waiting not in engine.ran
+    queue.resume(waiting)
+    assert joins_within(queue, 5)
+    assert waiting.status == Job.DONE
+    queue.shutdown()
+
+
+def test_join_waits_for_paused_running_jobs():
+    engine = FakeEngine()
+    queue = JobQueue(engine, workers=1, local_workers=1)
+    job = queue.submit(engine.prepare(make_job()))
+    assert engine.started[job.key].wait(5)
+    queue.pause(job)
+    assert not joins_within(queue, 0.2)
+    engine.release[job.key].set()
+    assert joins_within(queue, 5)
+    queue.shutdown()
+
+
+def test_children_are_queued_before_the_parent_counts_as_done():
+    engine = FakeEngine()
+    queue = JobQueue(engine, workers=1, local_workers=1)
+    parent = make_job()
+    child = make_job()
+    parent.children.append(child)
+    queue.submit(parent)
+    assert joins_within(queue, 5)
+    assert engine.ran == [parent, child]
+    queue.shutdown()
+
+
+def test_join_returns_when_children_are_refused_after_shutdown():
+    engine = FakeEngine()
+    queue = JobQueue(engine, workers=1, local_workers=1)
+    parent = engine.prepare(make_job())
+    parent.children.append(make_job())
+    queue.submit(parent)
+    assert engine.started[parent.key].wait(5)
+    queue.shutdown(wait=False)
+    engine.release[parent.key].set()
+    assert joins_within(queue, 5)
+    assert engine.ran == [parent]
+    assert parent.status == Job.DONE
+
+
+def test_per_host_limit_lets_other_hosts_through():
+    engine = FakeEngine()
+    queue = JobQueue(engine, workers=2, per_host_limit=1, local_workers=1)
+    first = queue.submit(engine.prepare(make_job('busy.example')))
+    assert engine.started[first.key].wait(5)
+    second = queue.submit(engine.prepare(make_job('busy.example')))
+    other = queue.submit(engine.prepare(make_job('other.example')))
+    assert engine.started[other.key].wait(5)
+    assert not engine.started[second.key].is_set()
+    for key in engine.release:
+        engine.release[key].set()
+    assert joins_within(queue, 5)
+    queue.shutdown()
+
+
+def test_priority_ordering():
+    engine = FakeEngine()
+    queue = JobQueue(engine, workers=1, local_workers=1, ordering=JobQueue.PRIORITY)
+    blocker = queue.submit(engine.prepare(make_job()))
+    assert engine.started[blocker.key].wait(5)
+    low = queue.submit(make_job(priority=0))
+    high = queue.submit(make_job(priority=1))
+    engine.release[blocker.key].set()
+    assert joins_within(queue, 5)
+    assert engine.ran == [blocker, high, low]
+    queue.shutdown()
@@ -0,0 +1,54 @@
+import pytest
+
+from downloader.progress import FFmpegProgress
+
+
+def feed(parser, block):
+    for line in block.strip().splitlines():
+        parser.feed(line + '\n')
+
+
+def collect(duration):
+    events = []
+    return FFmpegProgress(duration, lambda *event: events.append(event)), events
+
+
+def test_block_reports_percent_speed_and_eta():
+    parser, events = collect(100)
+    feed(parser, '''
+frame=250
+out_time_us=25000000
+speed=2.5x
+progress=continue
+''')
+    assert events == [(pytest.approx(25.0), 2.5, pytest.approx(30.0))]
+
+
+def test_out_time_ms_is_microseconds_too():
+    parser, events = collect(10)
+    feed(parser, 'out_time_ms=5000000\nspeed=1x\nprogress=continue')
+    assert events[0][0] == pytest.approx(50.0)
+
+
+def test_end_block_is_complete():
+    parser, events = collect(10)
+    feed(parser, 'out_time_us=9900000\nspeed=3x\nprogress=end')
+    assert events == [(100.0, 3.0, 0.0)]
+
+
+def test_without_duration_only_speed_is_known():
+    parser, events = collect(None)
+    feed(parser, 'out_time_us=5000000\nspeed=4x\nprogress=continue\nprogress=end')
+    assert events == [(None, 4.0, None), (None, 4.0, 0.0)]
+
+
+def test_unusable_values_are_ignored():
+    parser, events = collect(10)
+    feed(parser, 'out_time_us=N/A\nspeed=N/A\nprogress=continue')
+    assert events == [(None, None, None)]
+
+
+def test_percent_is_clamped_to_the_duration():
+    parser, events = collect(10)
+    feed(parser, 'out_time_us=-5000\nprogress=continue\nout_time_us=12000000\nprogress=continue')
+    assert [event[0] for event in events] == [0.0, 100.0]
@@ -0,0 +1,59 @@
+import pytest
+
+from downloader.remote import covering, hls_fragments
+
+PLAYLIST_URL = 'https://cdn.example.com/video/720p/index.m3u8'
+
+MEDIA_PLAYLIST = '''#EXTM3U
+#EXT-X-VERSION:7
+#EXT-X-TARGETDURATION:4
+#EXT-X-MAP:URI="init.mp4"
+#EXTINF:4.000,
+seg0.m4s
+#EXTINF:4.000,
+seg1.m4s
+#EXTINF:2.500,
+/other/seg2.m4s?token=x
+#EXT-X-ENDLIST
+'''
+
+
+def test_hls_fragments_times_and_urls():
+    init, fragments = hls_fragments(MEDIA_PLAYLIST, PLAYLIST_URL)
+    assert init == 'https://cdn.example.com/video/720p/init.mp4'
+    assert [f.number for f in fragments] == [0, 1, 2]
+    assert [f.url for f in fragments] == [
+        'https://cdn.example.com/video/720p/seg0.m4s',
+        'https://cdn.example.com/video/720p/seg1.m4s',
+        'https://cdn.example.com/other/seg2.m4s?token=x',
+    ]
+    assert [f.start for f in fragments] == [0.0, 4.0, 8.0]
+    assert fragments[-1].end == pytest.approx(10.5)
+
+
+def test_hls_fragments_without_init_segment():
+    init, fragments = hls_fragments('#EXTM3U\n#EXTINF:6,\na.ts\n#EXTINF:6,\nb.ts\n', PLAYLIST_URL)
+    assert init is None
+    assert [f.start for f in fragments] == [0.0, 6.0]
+
+
+@pytest.mark.parametrize('line', [
+    '#EXT-X-KEY:METHOD=AES-128,URI="key.bin"',
+    '#EXT-X-BYTERANGE:1000@0',
+    '#EXT-X-MAP:URI="init.mp4",BYTERANGE="720@0"',
+])
+def test_hls_fragments_leaves_encrypted_and_byte_range_playlists_to_ytdlp(line):
+    assert hls_fragments(f'#EXTM3U\n{line}\n#EXTINF:4,\nseg0.m4s\n', PLAYLIST_URL) is None
+
+
+def test_unencrypted_key_line_is_fine():
+    result = hls_fragments('#EXTM3U\n#EXT-X-KEY:METHOD=NONE\n#EXTINF:4,\nseg0.ts\n', PLAYLIST_URL)
+    assert result is not None and len(result[1]) == 1
+
+
+def test_covering():
+    _, fragments = hls_fragments(MEDIA_PLAYLIST, PLAYLIST_URL)
+    assert [f.number for f in covering(fragments, 5.0, 6.0)] == [1]
+    assert [f.number for f in covering(fragments, 3.0, 9.0)] == [0, 1, 2]
+    # A range starting on a boundary does not pull in the fragment before it
+    assert [f.number for f in covering(fragments, 4.0, 8.0)] == [1]
@@ -0,0 +1,20 @@
+from downloader.streammerge import ServedRanges
+
+
+def test_bytes_served_again_are_counted_once():
+    served = ServedRanges()
+    assert served.add(0, 100) == 100
+    # ffmpeg reads the index at the end, then seeks back to the start
+    assert served.add(900, 1000) == 100
+    assert served.add(0, 50) == 0
+    assert served.add(50, 150) == 50
+    assert served.add(0, 1000) == 750
+    assert served.total == 1000
+
+
+def test_adjacent_ranges():
+    served = ServedRanges()
+    served.add(0, 10)
+    served.add(10, 20)
+    assert served.add(5, 15) == 0
+    assert served.total == 20
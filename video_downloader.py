@@ -1,36 +1,44 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import yt_dlp
-from yt_dlp.utils import download_range_func
 import os
-import threading
-import re
-import subprocess
-import sys
-from tkinterdnd2 import DND_FILES, TkinterDnD
-import shutil
+import queue
 import tempfile
+import threading
 import time
+from tkinterdnd2 import DND_FILES, TkinterDnD
+
+from downloader import cutting, engine
+from downloader.engine import Engine, Job, resource_path
+from downloader.archive import Archive, default_path as default_archive_path
+from downloader.fragcache import FragmentCache, default_folder as default_fragment_folder
+from downloader.jobqueue import JobQueue
+from downloader.journal import JobJournal, default_path as default_journal_path
+from downloader.metrics import MetricsSink, default_path as default_metrics_path
+from downloader.playlists import PlaylistIndex, is_playlist_url, default_path as default_playlists_path
+from downloader.progress import ProgressBus, describe as describe_progress
 
-def resource_path(relative_path):
-    """ Get absolute path to resource, works for dev and PyInstaller """
-    try:
-        base_path = sys._MEIPASS
-    except Exception:
-        base_path = os.path.abspath(".")
-    return os.path.join(base_path, relative_path)
+# Set to a file path to have startup milestones written there (see
+# benchmarks/startup.py); the app quits once they are reached
+BENCHMARK_ENV = 'VIDEO_DOWNLOADER_BENCHMARK'
+BENCHMARK_URL_ENV = 'VIDEO_DOWNLOADER_BENCHMARK_URL'
 
 class VideoDownloader:
-    QUALITY_OPTIONS = {
-        "Best Quality (Auto)": "(bv+ba/b)[vcodec!*=av01]",
-        "2160p 4K": "(bv[height<=2160]+ba/b)[vcodec!*=av01]",
-        "1440p": "(bv[height<=1440]+ba/b)[vcodec!*=av01]",
-        "1080p FHD": "(bv[height<=1080]+ba/b)[vcodec!*=av01]",
-        "720p HD": "(bv[height<=720]+ba/b)[vcodec!*=av01]",
-        "480p SD": "(bv[height<=480]+ba/b)[vcodec!*=av01]",
-        "360p SD": "(bv[height<=360]+ba/b)[vcodec!*=av01]",
-        "Audio Only": "bestaudio/best",
-        "Worst (Smallest)": "worst[vcodec!*=av01]"
+    QUALITY_OPTIONS = engine.QUALITY_OPTIONS
+    SPEED_LIMIT_OPTIONS = {
+        "Unlimited": None,
+        "20 MB/s": 20 * 1024 ** 2,
+        "10 MB/s": 10 * 1024 ** 2,
+        "5 MB/s": 5 * 1024 ** 2,
+        "2 MB/s": 2 * 1024 ** 2,
+        "1 MB/s": 1024 ** 2,
+        "500 KB/s": 500 * 1024,
+    }
+    # None: smart for URL clips, fast for local files
+    CUT_MODE_OPTIONS = {
+        "Auto": None,
+        "Fast (keyframe)": cutting.FAST,
+        "Smart (frame-accurate)": cutting.SMART,
+        "Standard": cutting.COPY,
     }
 
     def __init__(self, root):
@@ -43,11 +51,94 @@ class VideoDownloader:
         self.download_progress = tk.DoubleVar()
         self.progress_text = tk.StringVar(value="Ready to download...")
         self.instructions_visible = tk.BooleanVar(value=False)
-        self.current_file = None
+        self.current_files = []
+        # Progress of multi-job batches, keyed by the id of their Job.batch list
+        self.batches = {}
         self.selected_quality = tk.StringVar(value="Best Quality (Auto)")
+        self.split_chapters = tk.BooleanVar(value=False)
+        self.selected_speed_limit = tk.StringVar(value="Unlimited")
+        self.selected_cut_mode = tk.StringVar(value="Auto")
+        self.clip_ranges = []
+        # Worker threads never touch Tk: progress and state changes go
+        # through this queue, which the Tk loop drains on a timer
+        self.ui_events = queue.Queue()
+        self.progress_bus = ProgressBus(interval=0.2)
+        self.progress_bus.subscribe(lambda event: self.ui_events.put(('progress', event)))
+        # The engine, the job queue and their SQLite stores are opened after
+        # the first paint (see open_engine)
+        self._engine = None
+        self._jobs = None
         
         self.setup_ui()
         self.setup_drag_drop()
+        # The first timer fires once mainloop runs; its idle callback then
+        # waits behind the initial redraw, so the window is already on screen
+        self.root.after(0, lambda: self.root.after_idle(self.finish_startup))
+        self.root.after(100, self.process_ui_events)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+    @property
+    def engine(self):
+        if self._engine is None:
+            self.open_engine()
+        return self._engine
+        
+    @property
+    def jobs(self):
+        if self._jobs is None:
+            self.open_engine()
+        return self._jobs
+        
+    @property
+    def journal(self):
+        return self.engine.journal
+        
+    def open_engine(self):
+        """Open the stores and build the engine and job queue, once.
+
+        Tk thread only, like the rest of the app: it reads the speed limit.
+        """
+        if self._engine is not None:
+            return self._engine
+        # Clips are interactive, so they jump ahead of queued full downloads
+        self._engine = Engine(progress=self.progress_bus, journal=JobJournal(default_journal_path()),
+                              archive=Archive(default_archive_path()),
+                              metrics=MetricsSink(default_metrics_path()),
+                              playlists=PlaylistIndex(default_playlists_path()),
+                              fragment_cache=FragmentCache(default_fragment_folder()))
+        self._engine.bandwidth.set_total_rate(self.SPEED_LIMIT_OPTIONS[self.selected_speed_limit.get()])
+        self._jobs = JobQueue(self._engine, workers=2, per_host_limit=2,
+                              ordering=JobQueue.PRIORITY,
+                              on_state=self.on_job_state)
+        return self._engine
+        
+    def on_close(self):
+        """Stop the workers and close the stores before the window goes away"""
+        if self._engine is not None:
+            self.root.withdraw()
+            # Detached first, so the jobs stopped below stay unfinished in
+            # the journal and resume on the next start
+            journal = self._engine.journal
+            self._engine.journal = None
+            for job in self._unfinished_jobs():
+                self._jobs.cancel(job, keep_partial=True)
+            # The workers still write to the stores while they stop
+            self._jobs.shutdown()
+            self._engine.close()
+            for store in (journal, self._engine.archive, self._engine.playlists,
+                          self._engine.fragment_cache):
+                store.close()
+        self.progress_bus.stop()
+        self.root.destroy()
+        
+    def finish_startup(self):
+        """Work the first frame doesn't need"""
+        self.load_logo()
+        self.open_engine()
+        # yt-dlp takes longer to import than the window takes to build, so
+        # it loads in the background and the first download doesn't wait
+        threading.Thread(target=engine.preload, name='preload-yt-dlp', daemon=True).start()
+        self.root.after(500, self.resume_unfinished_jobs)
         
     def setup_ui(self):
         # Create main container with scrollable canvas
@@ -87,7 +178,7 @@ class VideoDownloader:
         logo_title_frame = tk.Frame(header_frame, bg='#232323', height=130) 
         logo_title_frame.pack(fill=tk.X)
         logo_title_frame.pack_propagate(False) 
-        self.load_logo(logo_title_frame)
+        self.create_header(logo_title_frame)
         
         # Instructions section
         self.create_instructions_section(content_frame)
@@ -104,50 +195,10 @@ class VideoDownloader:
         # Progress section
         self.create_progress_section()
     
-    def load_logo(self, parent):
-        """Load and display logo at top left with title below - FIXED FOR BUNDLED APPS"""
-        try:
-            from PIL import Image, ImageTk
-            
-            logo_files = ["logo.png"]
-            logo_loaded = False
-            
-            for logo_file in logo_files:
-                # Use resource_path for proper bundled app support
-                logo_path = resource_path(logo_file)
-                if os.path.exists(logo_path):
-                    try:
-                        logo_image = Image.open(logo_path)
-                        self.logo_photo = ImageTk.PhotoImage(logo_image)
-                        
-                        logo_label = tk.Label(parent, 
-                                            image=self.logo_photo, 
-                                            bg='#232323')
-                        logo_label.pack(side=tk.TOP, anchor='w', padx=10, pady=(10, 5))
-                        
-                        logo_loaded = True
-                        print(f"Logo loaded successfully: {logo_file}")
-                        break
-                        
-                    except Exception as e:
-                        print(f"Could not load {logo_file}: {e}")
-                        continue
-            
-            if not logo_loaded:
-                print("No logo file found or loaded")
-                # Create a text placeholder if logo fails
-                placeholder = tk.Label(parent, text="[LOGO]", 
-                                     font=('Arial', 16, 'bold'),
-                                     fg='#888888', bg='#232323')
-                placeholder.pack(side=tk.TOP, anchor='w', padx=10, pady=(10, 5))
-                
-        except ImportError:
-            print("PIL (Pillow) not installed")
-            # Fallback placeholder
-            placeholder = tk.Label(parent, text="[LOGO]", 
-                                 font=('Arial', 16, 'bold'),
-                                 fg='#888888', bg='#232323')
-            placeholder.pack(side=tk.TOP, anchor='w', padx=10, pady=(10, 5))
+    def create_header(self, parent):
+        # Empty until load_logo runs after the first paint
+        self.logo_slot = tk.Frame(parent, bg='#232323')
+        self.logo_slot.pack(side=tk.TOP, anchor='w', padx=10, pady=(10, 5))
         
         title_label = tk.Label(parent, 
                              text="Video Downloader", 
@@ -156,6 +207,39 @@ class VideoDownloader:
                              bg='#232323')
         title_label.pack(side=tk.TOP, anchor='w', padx=10, pady=(20, 10))
         
+    def load_logo(self):
+        """Load and display logo at top left - FIXED FOR BUNDLED APPS"""
+        # Use resource_path for proper bundled app support
+        logo_path = resource_path("logo.png")
+        logo_photo = None
+        if os.path.exists(logo_path):
+            try:
+                # Tk 8.6 reads PNG itself; Pillow is only needed on older Tk
+                logo_photo = tk.PhotoImage(file=logo_path)
+            except tk.TclError:
+                try:
+                    from PIL import Image, ImageTk
+                    logo_photo = ImageTk.PhotoImage(Image.open(logo_path))
+                except ImportError:
+                    print("PIL (Pillow) not installed")
+                except Exception as e:
+                    print(f"Could not load logo.png: {e}")
+        else:
+            print("No logo file found")
+        
+        if logo_photo is None:
+            # Create a text placeholder if logo fails
+            placeholder = tk.Label(self.logo_slot, text="[LOGO]", 
+                                 font=('Arial', 16, 'bold'),
+                                 fg='#888888', bg='#232323')
+            placeholder.pack()
+            return
+        self.logo_photo = logo_photo
+        logo_label = tk.Label(self.logo_slot, 
+                            image=self.logo_photo, 
+                            bg='#232323')
+        logo_label.pack()
+        
     def _on_mousewheel(self, event):
         """Handle mouse wheel scrolling"""
         self.main_canvas.yview_scroll(int(-1*(event.delta/120)), "units")
@@ -206,9 +290,11 @@ class VideoDownloader:
         instructions_header.bind('<Button-1>', header_click)
         instructions_text.bind('<Button-1>', header_click)
         
-        # Instructions content
+        # Instructions content, filled in when first opened
         self.instructions_frame = tk.Frame(instructions_container, bg='#393838')
+        self.instructions_built = False
         
+    def build_instructions(self):
         instructions_text_content = """HOW TO USE THIS VIDEO DOWNLOADER:
 
      DOWNLOAD FULL VIDEOS:
@@ -217,13 +303,25 @@ class VideoDownloader:
    • Click the red "Download Full Video" button
    • Choose where to save the video on your computer
    • Wait for download to complete
+   • Playlist and channel URLs download every video; syncing the same playlist
+     again later only downloads the videos that are new since the last sync
+   • Use "Speed limit" to leave bandwidth for other apps; clips get a larger
+     share than full downloads, and changes apply to running downloads
 
      CREATE VIDEO CLIPS:
    • Method 1 - From URLs: Enter YouTube/Google Drive URL + set start/end times + quality
-   • Method 2 - From Local Files: Drag & drop a video file from your computer
+   • Method 2 - From Local Files: Drag & drop video files or whole folders from your computer;
+     every file gets the same clip settings and they are processed in parallel
    • Set start time using the hour:minute:second spinboxes (e.g., 0:1:30 = 1 min 30 sec)
    • Set end time (must be later than start time)
    • Select quality for online clips
+   • Pick a cut mode: Fast jumps straight to the nearest keyframe, so the clip may start
+     a second or two early; Smart is frame-accurate and re-encodes only the first and last
+     fraction of a second. Auto uses Smart for online clips and Fast for local files. For
+     online clips both fetch just the clip's part of the video instead of downloading all of it
+   • Click "Add Range" to queue several clips from the same source in one pass
+   • Tick "Split by chapters" to get one clip per chapter marker
+   • "Convert to MP4" remuxes the selected local files to mp4 without re-encoding the video
    • Click "Download Clip" button
    • Choose where to save the clip
 
@@ -248,7 +346,7 @@ class VideoDownloader:
    • 360p SD - Lower quality, smaller file
    • Audio Only - Extract audio track only
    • Worst (Smallest) - Lowest quality, smallest file size
-   • Note: AV1 codec excluded, all audio converted to AAC for universal playback
+   • Note: AV1 codec excluded, non-AAC audio converted to AAC for universal playback
 
      FILE NAMING:
    • Videos saved with unique timestamped names to prevent overwrites
@@ -264,9 +362,11 @@ class VideoDownloader:
    • Make sure you have a stable internet connection for downloads
    • Higher qualities take longer to download and use more storage
    • Downloads are optimized for speed with concurrent fragments
-   • All audio is automatically converted to AAC format for universal compatibility
+   • Audio that is not already AAC/MP3 is converted to AAC for universal compatibility
    • Multiple downloads to same folder won't overwrite each other
    • Check the progress bar at the bottom for download status
+   • Pause, Resume and Cancel next to the progress bar act on every queued and running job;
+     cancelling stops ffmpeg and the downloads right away and removes their partial files
    • Local video processing is much faster than downloading clips from URLs
    • The app works offline for local video file processing
 
@@ -281,7 +381,8 @@ class VideoDownloader:
 
      FILE MANAGEMENT:
    • All downloads include timestamp in filename
-   • Automatic duplicate prevention
+   • Automatic duplicate prevention: a video or clip you already have is
+     linked from the existing file instead of being downloaded again
    • Smart output directory selection
    • Progress tracking for all operations
    • Error logging and recovery options"""
@@ -303,6 +404,9 @@ class VideoDownloader:
             self.instructions_visible.set(False)
         else:
             # Show instructions
+            if not self.instructions_built:
+                self.build_instructions()
+                self.instructions_built = True
             self.instructions_frame.pack(fill=tk.X, pady=(5, 10))
             self.instructions_btn.config(text="−")
             self.instructions_visible.set(True)
@@ -359,6 +463,23 @@ class VideoDownloader:
         download_btn.pack(side=tk.RIGHT, padx=(10, 0))
         self.add_hover_effect(download_btn, '#ff3000', '#f2f2f2', '#f2f2f2', '#232323')
         
+        # Speed limit, applied to running downloads as well
+        speed_frame = tk.Frame(url_frame, bg='#232323')
+        speed_frame.pack(anchor=tk.W, pady=(10, 0))
+        
+        speed_label = tk.Label(speed_frame, text="Speed limit:", 
+                              font=('Arial', 11), fg='#f2f2f2', bg='#232323')
+        speed_label.pack(side=tk.LEFT, padx=(0, 5))
+        
+        speed_dropdown = ttk.Combobox(speed_frame, 
+                                     width=12, 
+                                     font=('Arial', 10),
+                                     textvariable=self.selected_speed_limit,
+                                     state="readonly",
+                                     values=list(self.SPEED_LIMIT_OPTIONS.keys()))
+        speed_dropdown.pack(side=tk.LEFT)
+        speed_dropdown.bind('<<ComboboxSelected>>', self.on_speed_limit_changed)
+        
     def create_drag_drop_section(self, parent):
         # Drag and drop section
         drop_outer_frame = tk.Frame(parent, bg='#232323')
@@ -388,7 +509,7 @@ class VideoDownloader:
         upload_icon.pack(pady=(10, 5))
         
         drop_label = tk.Label(content_frame, 
-                             text="Click or drag files here to upload",
+                             text="Click or drag files or folders here to upload",
                              font=('Arial', 12), fg='#f2f2f2', bg='#232323')
         drop_label.pack(pady=(0, 10))
         
@@ -408,6 +529,17 @@ class VideoDownloader:
                                  font=('Arial', 10), fg='#f2f2f2', bg='#232323')
         self.file_info.pack(pady=(10, 0))
         
+        convert_btn = tk.Button(drop_frame, 
+                              text="Convert to MP4",
+                              font=('Arial', 10, 'bold'),
+                              bg='#393838', fg='#f2f2f2',
+                              activebackground='#f2f2f2', activeforeground='#232323',
+                              border=0, padx=15, pady=6,
+                              relief=tk.FLAT,
+                              command=self.convert_local_files)
+        convert_btn.pack(pady=(10, 0))
+        self.add_hover_effect(convert_btn, '#393838', '#f2f2f2', '#f2f2f2', '#232323')
+        
     def draw_dotted_border(self, event=None):
         # Clear previous drawings
         self.drop_canvas.delete("border")
@@ -568,6 +700,45 @@ class VideoDownloader:
                                         values=list(self.QUALITY_OPTIONS.keys()))
         quality_dropdown2.pack(side=tk.LEFT)
         
+        cut_mode_label = tk.Label(quality_frame, text="Cut mode:", 
+                                 font=('Arial', 11), fg='#f2f2f2', bg='#232323')
+        cut_mode_label.pack(side=tk.LEFT, padx=(15, 5))
+        
+        cut_mode_dropdown = ttk.Combobox(quality_frame, 
+                                        width=20, 
+                                        font=('Arial', 10),
+                                        textvariable=self.selected_cut_mode,
+                                        state="readonly",
+                                        values=list(self.CUT_MODE_OPTIONS.keys()))
+        cut_mode_dropdown.pack(side=tk.LEFT)
+        
+        # Multi-range options: queue several ranges, or split by chapters
+        ranges_frame = tk.Frame(bottom_section, bg='#232323')
+        ranges_frame.pack(pady=(0, 15))
+        
+        add_range_btn = tk.Button(ranges_frame,
+                                text="Add Range",
+                                font=('Arial', 10),
+                                bg='#393838', fg='#f2f2f2',
+                                activebackground='#f2f2f2', activeforeground='#232323',
+                                border=0, padx=12, pady=4,
+                                relief=tk.FLAT,
+                                command=self.add_clip_range)
+        add_range_btn.pack(side=tk.LEFT, padx=(0, 10))
+        self.add_hover_effect(add_range_btn, '#393838', '#f2f2f2', '#f2f2f2', '#232323')
+        
+        chapters_check = tk.Checkbutton(ranges_frame, text="Split by chapters",
+                                        variable=self.split_chapters,
+                                        font=('Arial', 10),
+                                        fg='#f2f2f2', bg='#232323',
+                                        selectcolor='#393838',
+                                        activebackground='#232323', activeforeground='#f2f2f2')
+        chapters_check.pack(side=tk.LEFT)
+        
+        self.ranges_label = tk.Label(bottom_section, text="",
+                                    font=('Arial', 9), fg='#f2f2f2', bg='#232323')
+        self.ranges_label.pack(pady=(0, 10))
+        
         # Download clip button 
         clip_btn = tk.Button(bottom_section,
                            text="Download Clip",
@@ -601,6 +772,18 @@ class VideoDownloader:
                            cursor='hand2')
         close_btn.pack(side=tk.RIGHT)
         close_btn.bind('<Button-1>', lambda e: self.hide_progress())
+        
+        cancel_btn = tk.Label(progress_header, text="Cancel", 
+                            font=('Arial', 10, 'bold'), fg='#f2f2f2', bg='#232323',
+                            cursor='hand2')
+        cancel_btn.pack(side=tk.RIGHT, padx=(0, 15))
+        cancel_btn.bind('<Button-1>', lambda e: self.cancel_jobs())
+        
+        self.pause_btn = tk.Label(progress_header, text="Pause", 
+                                font=('Arial', 10, 'bold'), fg='#f2f2f2', bg='#232323',
+                                cursor='hand2')
+        self.pause_btn.pack(side=tk.RIGHT, padx=(0, 15))
+        self.pause_btn.bind('<Button-1>', lambda e: self.toggle_pause())
 
         # Progress bar
         progress_bar_frame = tk.Frame(progress_container, bg='#232323', height=25)
@@ -643,44 +826,43 @@ class VideoDownloader:
         self.draw_dotted_border()
         files = self.root.tk.splitlist(event.data)
         if files:
-            file_path = files[0]
-            if self.is_video_file(file_path):
-                self.current_file = file_path
-                filename = os.path.basename(file_path)
-                self.file_info.config(text=f"Selected: {filename}", fg='#f2f2f2')
+            video_files = engine.expand_video_paths(files)
+            if video_files:
+                self.set_local_files(video_files)
             else:
-                messagebox.showerror("Error", "Please drop a video file")
+                messagebox.showerror("Error", "Please drop video files or folders with videos")
                 
     def browse_local_file(self, event=None):
-        file_path = filedialog.askopenfilename(
-            title="Select Video File",
+        file_paths = filedialog.askopenfilenames(
+            title="Select Video Files",
             filetypes=[
                 ("Video files", "*.mp4 *.avi *.mkv *.mov *.wmv *.flv *.webm"),
                 ("All files", "*.*")
             ]
         )
-        if file_path:
-            self.current_file = file_path
-            filename = os.path.basename(file_path)
+        if file_paths:
+            self.set_local_files(list(file_paths))
+            
+    def set_local_files(self, file_paths):
+        self.current_files = file_paths
+        filename = os.path.basename(file_paths[0])
+        if len(file_paths) == 1:
             self.file_info.config(text=f"Selected: {filename}", fg='#f2f2f2')
+        else:
+            self.file_info.config(text=f"Selected: {len(file_paths)} files ({filename}, ...)", fg='#f2f2f2')
             
     def is_video_file(self, file_path):
-        video_extensions = ['.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.m4v']
-        return any(file_path.lower().endswith(ext) for ext in video_extensions)
+        return engine.is_video_file(file_path)
+        
+    def on_speed_limit_changed(self, event=None):
+        self.engine.bandwidth.set_total_rate(self.SPEED_LIMIT_OPTIONS[self.selected_speed_limit.get()])
         
     def clear_placeholder(self, event):
         if self.url_entry.get() == "Enter video URL...":
             self.url_entry.delete(0, tk.END)
             
     def validate_url(self, url):
-        # Support YouTube and Google Drive URLs
-        youtube_pattern = re.compile(
-            r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/'
-        )
-        drive_pattern = re.compile(
-            r'(https?://)?(drive\.google\.com|docs\.google\.com)'
-        )
-        return youtube_pattern.match(url) or drive_pattern.match(url)
+        return engine.validate_url(url)
         
     def get_time_in_seconds(self):
         start_total = int(self.start_hour.get()) * 3600 + int(self.start_min.get()) * 60 + int(self.start_sec.get())
@@ -688,8 +870,6 @@ class VideoDownloader:
         return start_total, end_total
         
     def update_progress(self, progress_percent):
-        # Ensure GUI layout is updated before getting width
-        self.progress_bg_frame.update_idletasks()
         canvas_width = self.progress_bg_frame.winfo_width()
         # Fallback if width is zero
         if canvas_width < 2:
@@ -704,7 +884,34 @@ class VideoDownloader:
             display_text = f"Download Progress ({progress_percent:.1f}%)"
         
         self.progress_label.config(text=display_text)
-        self.root.update_idletasks()
+        
+    def _unfinished_jobs(self):
+        return [job for job in self.jobs.jobs() if job.status in (Job.QUEUED, Job.RUNNING)]
+        
+    def toggle_pause(self):
+        jobs = self._unfinished_jobs()
+        if not jobs:
+            return
+        if any(job.control.paused for job in jobs):
+            for job in jobs:
+                self.jobs.resume(job)
+            self.pause_btn.config(text="Pause")
+            self.progress_text.set("Resumed")
+        else:
+            for job in jobs:
+                self.jobs.pause(job)
+            self.pause_btn.config(text="Resume")
+            self.progress_text.set(f"Paused {len(jobs)} job(s)")
+            
+    def cancel_jobs(self):
+        jobs = self._unfinished_jobs()
+        if not jobs:
+            return
+        if not messagebox.askyesno("Cancel", f"Cancel {len(jobs)} queued or running job(s)?"):
+            return
+        for job in jobs:
+            self.jobs.cancel(job)
+        self.pause_btn.config(text="Pause")
         
     def hide_progress(self):
         # Reset to minimal size but keep visible
@@ -722,189 +929,246 @@ class VideoDownloader:
             messagebox.showerror("Error", "Please enter a valid YouTube or Google Drive URL")
             return
             
+        if is_playlist_url(url):
+            # Playlists and channels only fetch what earlier syncs did not
+            save_path = filedialog.askdirectory(title="Select folder to sync the playlist into")
+            if save_path:
+                self.jobs.submit(Job(Job.SYNC, url, save_path, self.selected_quality.get()))
+            return
+            
         save_path = filedialog.askdirectory(title="Select folder to save video")
         if not save_path:
             return
             
-        threading.Thread(target=self._download_video, 
-                        args=(url, save_path, False), daemon=True).start()
+        self.jobs.submit(Job(Job.DOWNLOAD, url, save_path, self.selected_quality.get()))
         
     def download_clip(self):
         # Check if we have either URL or local file
         url = self.url_entry.get().strip()
         has_url = url and url != "Enter video URL..." and self.validate_url(url)
-        has_file = self.current_file is not None
+        has_file = bool(self.current_files)
         
         if not has_url and not has_file:
             messagebox.showerror("Error", "Please enter a URL or select a local video file")
             return
             
-        start_time, end_time = self.get_time_in_seconds()
-        
-        if start_time >= end_time:
-            messagebox.showerror("Error", "Start time must be less than end time")
-            return
+        chapters = self.split_chapters.get()
+        ranges = None
+        if not chapters:
+            # Use the added ranges, or the current spinbox values if none were added
+            ranges = list(self.clip_ranges)
+            if not ranges:
+                start_time, end_time = self.get_time_in_seconds()
+                
+                if start_time >= end_time:
+                    messagebox.showerror("Error", "Start time must be less than end time")
+                    return
+                ranges = [(start_time, end_time)]
             
         save_path = filedialog.askdirectory(title="Select folder to save clip")
         if not save_path:
             return
             
+        cut_mode = self.CUT_MODE_OPTIONS[self.selected_cut_mode.get()]
         if has_file:
-            threading.Thread(target=self._process_local_clip, 
-                           args=(self.current_file, save_path, start_time, end_time), 
-                           daemon=True).start()
+            # Every selected file gets the same ranges and cut mode
+            self.submit_batch([Job(Job.LOCAL_CLIP, file_path, save_path,
+                                   ranges=ranges, chapters=chapters, priority=1,
+                                   cut_mode=cut_mode or cutting.LOCAL_DEFAULT)
+                               for file_path in self.current_files])
         else:
-            threading.Thread(target=self._download_video, 
-                           args=(url, save_path, True, start_time, end_time), 
-                           daemon=True).start()
-            
-    def _download_video(self, url, save_path, is_clip=False, start_time=None, end_time=None):
-        try:
-            self.progress_text.set("Starting download..." if not is_clip else f"Downloading clip ({start_time}s to {end_time}s)...")
-            
-            # Get selected quality format string (AV1-excluded)
-            selected_quality = self.selected_quality.get()
-            format_string = self.QUALITY_OPTIONS.get(selected_quality, "(bv+ba/b)[vcodec!*=av01]")
-            
-            # Generate unique filename with timestamp to prevent overwrites
-            timestamp = int(time.time())
+            self.jobs.submit(Job(Job.CLIP, url, save_path, self.selected_quality.get(),
+                                 ranges=ranges, chapters=chapters, priority=1,
+                                 cut_mode=cut_mode or cutting.URL_DEFAULT))
+        self.clip_ranges = []
+        self.ranges_label.config(text="")
+        
+    def convert_local_files(self):
+        if not self.current_files:
+            messagebox.showerror("Error", "Please select or drop local video files first")
+            return
+        save_path = filedialog.askdirectory(title="Select folder to save converted videos")
+        if not save_path:
+            return
+        self.submit_batch([Job(Job.CONVERT, file_path, save_path, priority=1)
+                           for file_path in self.current_files])
+        
+    def submit_batch(self, jobs):
+        """Queue jobs that belong together; a batch reports once when all are done"""
+        for job in jobs:
+            job.batch = jobs
+            self.jobs.submit(job)
             
-            if is_clip:
-                # Unique filename for clips with timestamp
-                filename = f"clip_{start_time}s_to_{end_time}s_{timestamp}.%(ext)s"
-                ydl_opts = {
-                    'format': format_string,
-                    'outtmpl': os.path.join(save_path, filename),
-                    'download_ranges': download_range_func(None, [(start_time, end_time)]),
-                    'force_keyframes_at_cuts': True,
-                    'merge_output_format': 'mp4',
-                    'concurrent_fragments': 4,
-                    'fragment_retries': 10,
-                    'retries': 10,
-                    'writesubtitles': False,
-                    'writeautomaticsub': False,
-                    # Force overwrite to ensure new file is created
-                    'overwrites': True,
-                    # Force AAC audio codec during merge (fixes 720p Opus issue)
-                    'postprocessor_args': {'ffmpeg': ['-c:v', 'copy', '-c:a', 'aac', '-b:a', '192k']},
-                }
-            else:
-                # Unique filename for regular downloads with timestamp
-                filename = f"%(title)s_{timestamp}.%(ext)s"
-                ydl_opts = {
-                    'format': format_string,
-                    'outtmpl': os.path.join(save_path, filename),
-                    'merge_output_format': 'mp4',
-                    'concurrent_fragments': 4,
-                    'fragment_retries': 10,
-                    'retries': 10,
-                    'writesubtitles': False,
-                    'writeautomaticsub': False,
-                    # Force overwrite to ensure new file is created
-                    'overwrites': True,
-                    # Force AAC audio codec during merge (fixes 720p Opus issue)
-                    'postprocessor_args': {'ffmpeg': ['-c:v', 'copy', '-c:a', 'aac', '-b:a', '192k']},
-                }
-                
-            # Add progress hook
-            ydl_opts['progress_hooks'] = [self.progress_hook]
+    def _batch_of(self, job):
+        if not job.batch or len(job.batch) < 2:
+            return None
+        return self.batches.setdefault(id(job.batch), {'jobs': job.batch, 'done': 0, 'failed': [],
+                                                       'cancelled': 0})
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-                
-            self.progress_text.set("Download completed!")
-            self.update_progress(100)
-            messagebox.showinfo("Success", f"{'Clip' if is_clip else 'Video'} downloaded successfully in {selected_quality} quality!")
+    def add_clip_range(self):
+        start_time, end_time = self.get_time_in_seconds()
+        
+        if start_time >= end_time:
+            messagebox.showerror("Error", "Start time must be less than end time")
+            return
             
-        except Exception as e:
-            self.progress_text.set("Download failed!")
-            messagebox.showerror("Error", f"Download failed: {str(e)}")
+        self.clip_ranges.append((start_time, end_time))
+        ranges_text = ", ".join(f"{start}s-{end}s" for start, end in self.clip_ranges)
+        self.ranges_label.config(text=f"Ranges: {ranges_text}")
+        
+    def resume_unfinished_jobs(self):
+        """Requeue jobs a crash or an early close left unfinished"""
+        self.journal.prune()
+        unfinished = self.journal.unfinished()
+        for job in unfinished:
+            self.jobs.submit(job)
+        if unfinished:
+            self.progress_text.set(f"Resuming {len(unfinished)} unfinished job(s)...")
             
-    def _process_local_clip(self, file_path, save_path, start_time, end_time):
+    def on_job_state(self, job):
+        # Called from worker threads
+        self.ui_events.put(('state', job))
+        
+    def process_ui_events(self):
+        """Apply queued progress and state events on the Tk thread"""
         try:
-            self.progress_text.set(f"Processing clip ({start_time}s to {end_time}s)...")
-            self.update_progress(50)
-            
-            # Get FFmpeg path from bundled executable
-            ffmpeg_path = self.get_ffmpeg_path()
-            if not ffmpeg_path:
-                messagebox.showerror("Error", "FFmpeg not found! Please make sure ffmpeg.exe is in the same folder as this app.")
-                return
-                
-            # Generate unique filename for local clips to prevent overwrites
-            timestamp = int(time.time())
-            base_name = os.path.splitext(os.path.basename(file_path))[0]
-            filename = f"{base_name}_clip_{start_time}s_to_{end_time}s_{timestamp}.mp4"
-            output_path = os.path.join(save_path, filename)
-            
-            # Ensure the output path is unique
-            counter = 1
-            while os.path.exists(output_path):
-                filename = f"{base_name}_clip_{start_time}s_to_{end_time}s_{timestamp}_{counter}.mp4"
-                output_path = os.path.join(save_path, filename)
-                counter += 1
-            
-            cmd = [
-                ffmpeg_path,
-                '-i', file_path,
-                '-ss', str(start_time),
-                '-t', str(end_time - start_time),
-                '-c:v', 'copy',     
-                '-c:a', 'aac',      
-                '-b:a', '192k',     
-                '-avoid_negative_ts', 'make_zero', 
-                output_path,
-                '-y'  
-            ]
+            while True:
+                kind, item = self.ui_events.get_nowait()
+                if kind == 'progress':
+                    batch = self._batch_of(item.job)
+                    if batch is not None:
+                        self._show_batch_progress(batch, item)
+                        continue
+                    if item.percent is not None:
+                        self.update_progress(item.percent)
+                    text = describe_progress(item)
+                    if text:
+                        self.progress_text.set(text)
+                elif item.status == Job.QUEUED:
+                    self.progress_text.set(f"Queued: {item.describe()}")
+                elif item.status in (Job.DONE, Job.FAILED, Job.CANCELLED) and self._batch_of(item):
+                    self.progress_bus.forget(item)
+                    self._batch_job_completed(item)
+                elif item.status == Job.DONE:
+                    self.progress_bus.forget(item)
+                    self._job_finished(item)
+                elif item.status == Job.FAILED:
+                    self.progress_bus.forget(item)
+                    self._job_failed(item, item.error)
+                elif item.status == Job.CANCELLED:
+                    self.progress_bus.forget(item)
+                    self.progress_text.set(f"Cancelled: {item.describe()}")
+        except queue.Empty:
+            pass
+        self.root.after(100, self.process_ui_events)
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+    def _show_batch_progress(self, batch, event):
+        jobs = batch['jobs']
+        self.update_progress(sum(job.progress for job in jobs) / len(jobs))
+        text = describe_progress(event)
+        finished = batch['done'] + len(batch['failed']) + batch['cancelled']
+        self.progress_text.set(f"[{finished}/{len(jobs)}] {os.path.basename(event.job.source)}: {text}")
+        
+    def _batch_job_completed(self, job):
+        batch = self._batch_of(job)
+        if job.status == Job.DONE:
+            batch['done'] += 1
+        elif job.status == Job.CANCELLED:
+            batch['cancelled'] += 1
+        else:
+            batch['failed'].append(job)
+        jobs = batch['jobs']
+        items = "files" if jobs[0].is_local else "videos"
+        finished = batch['done'] + len(batch['failed']) + batch['cancelled']
+        self.update_progress(sum(j.progress for j in jobs) / len(jobs))
+        self.progress_text.set(f"Processed {finished} of {len(jobs)} {items}...")
+        if finished < len(jobs):
+            return
+        self.batches.pop(id(jobs), None)
+        
+        if batch['cancelled'] and not batch['failed']:
+            self.progress_text.set(f"{batch['done']} of {len(jobs)} {items} processed, "
+                                   f"{batch['cancelled']} cancelled")
+            return
+        if not batch['failed']:
+            messagebox.showinfo("Success", f"All {len(jobs)} {items} processed successfully!\n\n"
+                                           f"Saved in: {jobs[0].save_path}")
+            return
+        self.progress_text.set(f"{len(batch['failed'])} of {len(jobs)} {items} failed")
+        failures = "\n".join(f"{os.path.basename(j.source)}: {(j.error or '').strip()[-200:]}"
+                             for j in batch['failed'][:10])
+        messagebox.showerror("Error", f"{batch['done']} of {len(jobs)} {items} processed, "
+                                      f"{len(batch['failed'])} failed:\n\n{failures}")
             
-            if result.returncode == 0:
-                self.progress_text.set("Clip created successfully!")
-                self.update_progress(100)
-                messagebox.showinfo("Success", f"Clip created successfully!\n\nSaved as: {filename}")
+    def _job_finished(self, job):
+        if job.kind == Job.SYNC:
+            # The new videos report as a batch once they are downloaded
+            if not job.children:
+                messagebox.showinfo("Success", "Playlist is up to date, no new videos.")
             else:
-                raise Exception(result.stderr)
-                
-        except Exception as e:
-            self.progress_text.set("Processing failed!")
-            messagebox.showerror("Error", f"Failed to create clip: {str(e)}")
+                self.progress_text.set(f"{len(job.children)} new video(s) queued from the playlist")
+        elif job.kind == Job.CONVERT:
+            messagebox.showinfo("Success", f"Converted successfully!\n\nSaved as: {os.path.basename(job.output)}")
+        elif job.kind == Job.LOCAL_CLIP:
+            saved = "\n".join(os.path.basename(output) for output in job.outputs)
+            messagebox.showinfo("Success", f"Clip created successfully!\n\nSaved as: {saved}")
+        else:
+            message = f"{'Clip' if job.is_clip else 'Video'} downloaded successfully in {job.quality} quality!"
+            if job.formats:
+                # Which formats the preset ranked best, and why
+                reasons = "\n".join(f"• {reason}" for reason in job.formats['reasons'])
+                message += f"\n\nFormats {job.formats['spec']}:\n{reasons}"
+            messagebox.showinfo("Success", message)
             
-    def get_ffmpeg_path(self):
-        if getattr(sys, 'frozen', False):
-            ffmpeg_path = resource_path('ffmpeg.exe')
-            if os.path.exists(ffmpeg_path):
-                return ffmpeg_path
-                
-        if os.path.exists('ffmpeg.exe'):
-            return os.path.abspath('ffmpeg.exe')
+    def _job_failed(self, job, error):
+        if job.is_local:
+            self.progress_text.set("Processing failed!")
+            messagebox.showerror("Error", f"Failed to create clip: {error}")
+        else:
+            self.progress_text.set("Download failed!")
+            messagebox.showerror("Error", f"Download failed: {error}")
+
+def run_startup_benchmark(root, report_path, url, get_app):
+    """Write startup milestones (name and wall-clock time) to ``report_path``,
+    download ``url`` right after the window appears if given, then quit"""
+    def report(name):
+        with open(report_path, 'a', encoding='utf-8') as f:
+            f.write(f"{name} {time.time():.6f}\n")
             
+    def download(download_engine):
         try:
-            result = subprocess.run(['where', 'ffmpeg'], capture_output=True, text=True, shell=True)
-            if result.returncode == 0:
-                return result.stdout.strip().split('\n')[0]
-        except:
-            pass
+            download_engine.run(Job(Job.DOWNLOAD, url, tempfile.mkdtemp(prefix='startup_benchmark_'), 'best'))
+            report('first_download')
+        except engine.DownloadError as e:
+            report('download_failed')
+            print(f"Benchmark download failed: {e}")
             
-        return None
-        
-    def progress_hook(self, d):
-        if d['status'] == 'downloading':
-            if 'total_bytes' in d and d['total_bytes']:
-                progress = (d['downloaded_bytes'] / d['total_bytes']) * 100
-                self.root.after(0, lambda: self.update_progress(progress))
-                self.progress_text.set(f"Downloading... {progress:.1f}%")
-            elif '_percent_str' in d:
-                percent_str = d['_percent_str'].replace('%', '').strip()
-                try:
-                    progress = float(percent_str)
-                    self.root.after(0, lambda: self.update_progress(progress))
-                    self.progress_text.set(f"Downloading... {progress:.1f}%")
-                except:
-                    self.progress_text.set("Downloading...")
+    def wait_for(thread):
+        if thread.is_alive():
+            root.after(20, wait_for, thread)
+        else:
+            get_app().on_close()
+            
+    def first_window():
+        report('first_window')
+        if not url:
+            get_app().on_close()
+            return
+        # Opened here on the Tk thread; the download thread only gets the engine
+        thread = threading.Thread(target=download, args=(get_app().open_engine(),), daemon=True)
+        thread.start()
+        wait_for(thread)
+        
+    root.after(0, lambda: root.after_idle(first_window))
 
 def main():
     root = TkinterDnD.Tk()
+    app = None
+    if os.environ.get(BENCHMARK_ENV):
+        # Hooked in before the app is built, so it fires ahead of the app's
+        # own after-first-paint work
+        run_startup_benchmark(root, os.environ[BENCHMARK_ENV], os.environ.get(BENCHMARK_URL_ENV),
+                              lambda: app)
     app = VideoDownloader(root)
     root.mainloop()
 